@@ -1,15 +1,42 @@
 from django.contrib import admin
-from .models import Category, Product, ProductImage, Brand
+from .models import Category, Product, ProductImage, Brand, ImageBlob, ProductImport, Vehicle
 
 
 @admin.register(ProductImage)
 class ProductImageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'product', 'alt_text', 'is_feature', 'created_at')
-    list_filter = ('is_feature', 'created_at')
+    list_display = ('id', 'product', 'alt_text', 'is_feature', 'width', 'height', 'file_size', 'created_at')
+    list_filter = ('is_feature', 'format', 'created_at')
     search_fields = ('alt_text', 'product__name')
     ordering = ('-created_at',)
 
 
+@admin.register(ImageBlob)
+class ImageBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'file', 'ref_count', 'created_at')
+    search_fields = ('sha256',)
+    ordering = ('-created_at',)
+    readonly_fields = ('sha256', 'file', 'ref_count', 'created_at')
+
+
+@admin.register(ProductImport)
+class ProductImportAdmin(admin.ModelAdmin):
+    list_display = ('original_name', 'status', 'dry_run', 'processed_rows', 'created_count',
+                    'updated_count', 'error_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'dry_run')
+    ordering = ('-created_at',)
+    readonly_fields = ('status', 'processed_rows', 'created_count', 'updated_count', 'error_count',
+                       'errors', 'detail', 'created_by', 'started_at', 'finished_at')
+
+
+@admin.register(Vehicle)
+class VehicleAdmin(admin.ModelAdmin):
+    list_display = ('make', 'model', 'generation', 'year_from', 'year_to', 'bolt_count', 'pcd',
+                    'center_bore', 'et_min', 'et_max')
+    list_filter = ('make', 'bolt_count')
+    search_fields = ('make', 'model', 'generation')
+    ordering = ('make', 'model', 'year_from')
+
+
 @admin.register(Brand)
 class BrandAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at')
@@ -19,14 +46,14 @@ class BrandAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'brand', 'category', 'price', 'old_price', 'diameter', 'width', 'profile', 'in_stock', 'quantity', 'created_at')
+    list_display = ('name', 'sku', 'brand', 'category', 'price', 'old_price', 'diameter', 'width', 'profile', 'in_stock', 'quantity', 'created_at')
     list_filter = ('category', 'brand', 'in_stock', 'diameter', 'created_at')
-    search_fields = ('name', 'description', 'brand__name')
+    search_fields = ('name', 'sku', 'description', 'brand__name')
     ordering = ('-created_at',)
     
     fieldsets = (
         (None, {
-            'fields': ('category', 'brand', 'name', 'description')
+            'fields': ('category', 'brand', 'name', 'sku', 'description')
         }),
         ('Tire Specifications', {
             'fields': ('diameter', 'width', 'profile')
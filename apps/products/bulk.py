@@ -0,0 +1,150 @@
+"""
+Массовые изменения товаров одним SQL UPDATE на операцию.
+Product.save() и full_clean() не вызываются, поэтому инварианты модели
+(бренд из той же категории, in_stock по остатку) поддерживаются здесь же.
+"""
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .cache import invalidate_catalog_cache
+from .models import Brand, Product
+
+
+def bulk_update_products(queryset, operation, params):
+    """
+    Применяет операцию к товарам из queryset в одной транзакции и один раз
+    сбрасывает кэш каталога после коммита. Возвращает словарь со счетчиками.
+    """
+    handler = BULK_HANDLERS[operation]
+    with transaction.atomic():
+        result = handler(queryset, **params)
+        if result.get('updated'):
+            transaction.on_commit(invalidate_catalog_cache)
+    return result
+
+
+def _update(queryset, **values):
+    # update() не трогает auto_now, а по updated_at работают выгрузки
+    return queryset.update(updated_at=timezone.now(), **values)
+
+
+def set_price(queryset, price):
+    return {'updated': _update(queryset, price=price)}
+
+
+def adjust_price(queryset, percent, keep_old_price=False):
+    """
+    Изменение цены на percent процентов (отрицательный - скидка).
+    keep_old_price сохраняет текущую цену в old_price (перечеркнутая цена в акции);
+    все выражения UPDATE вычисляются по значениям строки до изменения.
+    """
+    factor = Value(1 + Decimal(percent) / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+    values = {
+        'price': Round(F('price') * factor, 2, output_field=DecimalField(max_digits=10, decimal_places=2)),
+    }
+    if keep_old_price:
+        values['old_price'] = F('price')
+    return {'updated': _update(queryset, **values)}
+
+
+def set_old_price(queryset, old_price):
+    return {'updated': _update(queryset, old_price=old_price)}
+
+
+def set_stock(queryset, quantity, in_stock=None):
+    if in_stock is None:
+        in_stock = quantity > 0
+    return {'updated': _update(queryset, quantity=quantity, in_stock=in_stock)}
+
+
+def move_category(queryset, category):
+    """
+    Перенос в категорию. Бренд, который не принадлежит новой категории,
+    сбрасывается в том же UPDATE (как требует Product.clean).
+    """
+    brand_in_category = Exists(Brand.objects.filter(pk=OuterRef('brand_id'), category=category))
+    brands_cleared = queryset.exclude(brand=None).exclude(brand__category=category).count()
+    updated = _update(
+        queryset,
+        category=category,
+        brand=Case(When(brand_in_category, then=F('brand')), default=None),
+    )
+    return {'updated': updated, 'brands_cleared': brands_cleared}
+
+
+def move_brand(queryset, brand):
+    """Смена бренда; категория товара приводится к категории бренда"""
+    if brand is None:
+        return {'updated': _update(queryset, brand=None)}
+    return {'updated': _update(queryset, brand=brand, category_id=brand.category_id)}
+
+
+BULK_HANDLERS = {
+    'set_price': set_price,
+    'adjust_price': adjust_price,
+    'set_old_price': set_old_price,
+    'set_stock': set_stock,
+    'move_category': move_category,
+    'move_brand': move_brand,
+}
+
+
+# Построчные цены и остатки: одна команда UPDATE ... FROM (VALUES ...) на пачку.
+# NULL в price/quantity означает "не менять"; old_price меняется только при
+# set_old_price; in_stock берется явно или пересчитывается из quantity.
+PRODUCT_VALUES_UPDATE_SQL = """
+UPDATE {table} AS p SET
+    price = COALESCE(v.price, p.price),
+    old_price = CASE WHEN v.set_old_price THEN v.old_price ELSE p.old_price END,
+    quantity = COALESCE(v.quantity, p.quantity),
+    in_stock = COALESCE(v.in_stock, v.quantity > 0, p.in_stock),
+    updated_at = %s
+FROM (VALUES {values}) AS v(id, price, set_old_price, old_price, quantity, in_stock)
+WHERE p.id = v.id AND (
+    p.price IS DISTINCT FROM COALESCE(v.price, p.price)
+    OR (v.set_old_price AND p.old_price IS DISTINCT FROM v.old_price)
+    OR p.quantity IS DISTINCT FROM COALESCE(v.quantity, p.quantity)
+    OR p.in_stock IS DISTINCT FROM COALESCE(v.in_stock, v.quantity > 0, p.in_stock)
+)
+"""
+PRODUCT_VALUES_ROW = '(%s::uuid, %s::numeric, %s::boolean, %s::numeric, %s::integer, %s::boolean)'
+
+
+def apply_product_updates(rows, chunk_size=1000):
+    """
+    Применяет цены и остатки к товарам по id.
+    rows - словари с id и любыми из price, old_price, quantity, in_stock.
+    Строки, в которых ничего не изменилось, не переписываются.
+    Возвращает число измененных товаров; кэш каталога не сбрасывает.
+    """
+    rows = iter(rows)
+    sql_template = PRODUCT_VALUES_UPDATE_SQL.replace('{table}', connection.ops.quote_name(Product._meta.db_table))
+    updated = 0
+    now = timezone.now()
+    with transaction.atomic(), connection.cursor() as cursor:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            params = [now]
+            for row in chunk:
+                params.extend((
+                    str(row['id']),
+                    row.get('price'),
+                    'old_price' in row,
+                    row.get('old_price'),
+                    row.get('quantity'),
+                    row.get('in_stock'),
+                ))
+            cursor.execute(
+                sql_template.replace('{values}', ', '.join([PRODUCT_VALUES_ROW] * len(chunk))),
+                params
+            )
+            updated += cursor.rowcount
+    return updated
+
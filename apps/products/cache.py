@@ -0,0 +1,38 @@
+import logging
+import time
+
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# key_prefix для cache_page публичного каталога: все закэшированные ответы
+# каталога можно сбросить одним delete_pattern, не трогая остальной кэш
+CATALOG_CACHE_PREFIX = 'catalog'
+
+# Версия дерева типоразмеров (size_tree): входит в ключ, поэтому сброс - один INCR
+SIZE_TREE_VERSION_KEY = 'catalog:sizes:version'
+
+
+def get_size_tree_version():
+    return cache.get_or_set(SIZE_TREE_VERSION_KEY, 1, timeout=None)
+
+
+def bump_size_tree_version():
+    try:
+        cache.incr(SIZE_TREE_VERSION_KEY)
+    except ValueError:
+        # Ключ версии вытеснен: новая версия не должна совпасть со старыми ключами деревьев
+        cache.set(SIZE_TREE_VERSION_KEY, int(time.time()), timeout=None)
+    except RedisError:
+        logger.warning('Could not invalidate size tree cache')
+
+
+def invalidate_catalog_cache():
+    """Сбрасывает закэшированные ответы каталога (тела и заголовки cache_page) и дерево типоразмеров"""
+    bump_size_tree_version()
+    try:
+        return cache.delete_pattern(f'views.decorators.cache.cache_*.{CATALOG_CACHE_PREFIX}.*')
+    except RedisError:
+        logger.warning('Could not invalidate catalog cache')
+        return 0
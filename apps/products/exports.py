@@ -0,0 +1,92 @@
+"""
+Потоковая выгрузка каталога (CSV / NDJSON).
+
+Товары читаются через values_list().iterator(): в PostgreSQL это серверный
+курсор, строки приходят пачками по chunk_size, модели и сериализаторы не
+создаются. Каждая строка сразу отдается в StreamingHttpResponse, поэтому
+память не зависит от размера каталога.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .sizes import format_tire_size, format_wheel_size
+
+# Поле queryset -> колонка выгрузки. Названия колонок совпадают с
+# COLUMN_ALIASES импорта, так что CSV можно загрузить обратно
+# (лишние колонки импорт пропускает).
+EXPORT_FIELDS = (
+    ('id', 'id'),
+    ('sku', 'sku'),
+    ('name', 'name'),
+    ('category_id', 'category_id'),
+    ('category__name', 'category'),
+    ('brand__name', 'brand'),
+    ('price', 'price'),
+    ('old_price', 'old_price'),
+    ('quantity', 'quantity'),
+    ('in_stock', 'in_stock'),
+    ('diameter', 'diameter'),
+    ('width', 'width'),
+    ('profile', 'profile'),
+    ('wheel_width', 'wheel_width'),
+    ('et_offset', 'et_offset'),
+    ('pcd', 'pcd'),
+    ('bolt_count', 'bolt_count'),
+    ('center_bore', 'center_bore'),
+    ('description', 'description'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+)
+EXPORT_COLUMNS = [column for _field, column in EXPORT_FIELDS] + ['tire_size', 'wheel_size']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """Файловый объект для csv.writer, который возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, chunk_size=2000):
+    """Словари колонок выгрузки по одному товару"""
+    rows = queryset.order_by('id').values_list(
+        *(field for field, _column in EXPORT_FIELDS)
+    ).iterator(chunk_size=chunk_size)
+
+    columns = [column for _field, column in EXPORT_FIELDS]
+    for values in rows:
+        row = dict(zip(columns, values))
+        row['tire_size'] = format_tire_size(row['width'], row['profile'], row['diameter'])
+        row['wheel_size'] = format_wheel_size(
+            row['diameter'], row['wheel_width'], row['et_offset'],
+            row['pcd'], row['bolt_count'], row['center_bore']
+        )
+        yield row
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл UTF-8 без мастера импорта
+    yield '﻿' + writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([
+            '' if row[column] is None else row[column] for column in EXPORT_COLUMNS
+        ])
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORT_RENDERERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
@@ -0,0 +1,176 @@
+"""
+Синхронизация цен и остатков с фидами поставщиков (YML и похожий XML).
+
+Фид разбирается через iterparse: обработанные предложения удаляются из
+дерева, поэтому память не растет с размером файла. Предложения
+сопоставляются с товарами по sku, для пачки одним запросом читаются текущие
+значения, и в БД пишутся только изменившиеся строки (apply_product_updates).
+"""
+import time
+import urllib.request
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from xml.etree.ElementTree import ParseError, iterparse
+
+from .bulk import apply_product_updates
+from .cache import invalidate_catalog_cache
+from .models import Product
+
+# Теги записи и полей (без учета регистра); первый найденный выигрывает
+OFFER_TAGS = {'offer', 'item', 'product'}
+SKU_TAGS = ('vendorcode', 'sku', 'article')
+PRICE_TAGS = ('price',)
+OLD_PRICE_TAGS = ('oldprice', 'old_price')
+QUANTITY_TAGS = ('count', 'quantity', 'stock')
+FALSE_VALUES = {'false', '0', 'no'}
+
+PRICE_QUANT = Decimal('0.01')
+
+
+class FeedError(Exception):
+    pass
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1].lower()
+
+
+def parse_decimal(text):
+    if text is None or not text.strip():
+        return None
+    try:
+        return Decimal(text.strip().replace(',', '.')).quantize(PRICE_QUANT)
+    except InvalidOperation:
+        return None
+
+
+def parse_offer(elem, sku_field=None):
+    """
+    Предложение фида -> словарь sku, price, old_price, quantity, in_stock.
+    sku_field='id' берет артикул из атрибута id предложения (как в YML без vendorCode).
+    """
+    children = {}
+    outlets_quantity = None
+    for child in elem:
+        name = local_name(child.tag)
+        if name == 'outlets':
+            # YML: <outlets><outlet id="1" instock="5"/></outlets>
+            outlets_quantity = sum(
+                int(outlet.get('instock', 0) or 0) for outlet in child
+                if (outlet.get('instock') or '').strip().isdigit()
+            )
+        elif name not in children:
+            children[name] = (child.text or '').strip()
+
+    def first(tags):
+        return next((children[tag] for tag in tags if children.get(tag)), None)
+
+    sku = elem.get('id') if sku_field == 'id' else first((sku_field.lower(),) if sku_field else SKU_TAGS)
+    quantity_text = first(QUANTITY_TAGS)
+    quantity = int(quantity_text) if quantity_text and quantity_text.isdigit() else outlets_quantity
+    available = elem.get('available')
+
+    return {
+        'sku': (sku or '').strip(),
+        'price': parse_decimal(first(PRICE_TAGS)),
+        'old_price': parse_decimal(first(OLD_PRICE_TAGS)),
+        'quantity': quantity,
+        'in_stock': None if available is None else available.strip().lower() not in FALSE_VALUES,
+    }
+
+
+def iter_offers(source, sku_field=None):
+    """Потоковый разбор фида; source - путь или файловый объект"""
+    stack = []
+    try:
+        for event, elem in iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                continue
+            stack.pop()
+            if local_name(elem.tag) in OFFER_TAGS:
+                yield parse_offer(elem, sku_field)
+                # Убираем обработанное предложение из родителя, чтобы дерево не росло
+                if stack:
+                    stack[-1].remove(elem)
+                elem.clear()
+    except ParseError as e:
+        raise FeedError(f'Invalid feed XML: {e}')
+
+
+def open_feed(location, timeout=60):
+    if location.startswith(('http://', 'https://')):
+        return urllib.request.urlopen(location, timeout=timeout)
+    return open(location, 'rb')
+
+
+def diff_offers(offers):
+    """
+    Сравнивает пачку предложений с текущими значениями товаров (один запрос).
+    Возвращает (изменения для apply_product_updates, число найденных товаров).
+    """
+    by_sku = {offer['sku']: offer for offer in offers if offer['sku']}
+    current = Product.objects.filter(sku__in=list(by_sku)).values_list(
+        'id', 'sku', 'price', 'old_price', 'quantity', 'in_stock'
+    )
+
+    changes = []
+    matched = 0
+    for product_id, sku, price, old_price, quantity, in_stock in current:
+        matched += 1
+        offer = by_sku[sku]
+        new_price = offer['price'] if offer['price'] is not None else price
+        new_quantity = offer['quantity'] if offer['quantity'] is not None else quantity
+        if offer['quantity'] is not None:
+            new_in_stock = offer['quantity'] > 0
+        elif offer['in_stock'] is not None:
+            new_in_stock = offer['in_stock']
+        else:
+            new_in_stock = in_stock
+
+        if (new_price, offer['old_price'], new_quantity, new_in_stock) == (price, old_price, quantity, in_stock):
+            continue
+
+        change = {'id': product_id, 'old_price': offer['old_price']}
+        if offer['price'] is not None:
+            change['price'] = offer['price']
+        if offer['quantity'] is not None:
+            change['quantity'] = offer['quantity']
+        else:
+            change['in_stock'] = new_in_stock
+        changes.append(change)
+    return changes, matched
+
+
+def sync_feed(source, sku_field=None, batch_size=1000, dry_run=False):
+    """
+    Синхронизирует цены и остатки с фидом. Фид считается полным состоянием
+    предложения: отсутствие oldprice снимает старую цену. Товары, которых
+    нет в каталоге, не создаются. Возвращает статистику прогона.
+    """
+    started = time.monotonic()
+    stats = {'rows': 0, 'matched': 0, 'changed': 0, 'skipped': 0}
+    offers = iter_offers(source, sku_field)
+
+    # Каждая пачка - своя транзакция, чтобы не держать блокировки на весь фид
+    while True:
+        batch = list(islice(offers, batch_size))
+        if not batch:
+            break
+        stats['rows'] += len(batch)
+        stats['skipped'] += sum(1 for offer in batch if not offer['sku'])
+
+        changes, matched = diff_offers(batch)
+        stats['matched'] += matched
+        if dry_run:
+            stats['changed'] += len(changes)
+        elif changes:
+            stats['changed'] += apply_product_updates(changes)
+
+    if stats['changed'] and not dry_run:
+        invalidate_catalog_cache()
+
+    elapsed = time.monotonic() - started
+    stats['elapsed'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows'] / elapsed) if elapsed else stats['rows']
+    return stats
@@ -0,0 +1,253 @@
+"""
+Сборщик мусора изображений (mark-and-sweep).
+
+1. Удаляет непривязанные к товарам ProductImage старше grace-периода
+   и blob'ы, на которые больше никто не ссылается.
+2. Mark: пачками собирает пути, на которые ссылаются ProductImage (оригинал
+   и варианты), ImageBlob, Category.image и Brand.logo.
+3. Sweep: обходит каталоги загрузок в MEDIA_ROOT через os.scandir и удаляет
+   файлы без ссылок, измененные раньше grace-периода.
+"""
+import os
+import posixpath
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .images import (
+    RENDITION_FORMATS,
+    RENDITION_SIZES,
+    category_image_paths,
+    delete_product_images,
+    rendition_path,
+)
+from .models import Brand, Category, ImageBlob, ProductImage
+
+PROGRESS_KEY = 'image_gc:progress'
+LOCK_KEY = 'image_gc:lock'
+LOCK_TIMEOUT = 60 * 60
+
+# Каталоги MEDIA_ROOT, в которые пишут ImageField каталога
+SWEEP_DIRECTORIES = ('products', 'categories', 'brands')
+
+
+class GarbageCollectionInProgress(Exception):
+    pass
+
+
+def is_running():
+    """Запуск идет, пока жива блокировка; у нее есть TTL, поэтому упавший воркер ее не удержит"""
+    return cache.get(LOCK_KEY) is not None
+
+
+def get_progress():
+    progress = cache.get(PROGRESS_KEY)
+    # Воркер был убит посреди запуска и не успел записать итог
+    if progress and progress.get('status') == 'running' and not is_running():
+        progress = dict(progress, status='failed', error='Interrupted')
+    return progress
+
+
+class ImageGarbageCollector:
+
+    def __init__(self, grace_hours=None, batch_size=None, dry_run=False, media_root=None):
+        if grace_hours is None:
+            grace_hours = getattr(settings, 'IMAGE_GC_GRACE_HOURS', 24)
+        self.cutoff = timezone.now() - timedelta(hours=grace_hours)
+        self.batch_size = batch_size or getattr(settings, 'IMAGE_GC_BATCH_SIZE', 1000)
+        self.dry_run = dry_run
+        self.media_root = str(media_root or settings.MEDIA_ROOT)
+        self.lock_token = uuid.uuid4().hex
+        self.stats = {
+            'status': 'running',
+            'phase': 'rows',
+            'dry_run': dry_run,
+            'grace_hours': grace_hours,
+            'started_at': timezone.now().isoformat(),
+            'finished_at': None,
+            'rows_deleted': 0,
+            'blobs_deleted': 0,
+            'referenced_paths': 0,
+            'files_scanned': 0,
+            'files_deleted': 0,
+            'bytes_freed': 0,
+        }
+
+    def report(self, **changes):
+        self.stats.update(changes)
+        cache.set(PROGRESS_KEY, self.stats, timeout=None)
+        if self.stats['status'] == 'running':
+            self.extend_lock()
+
+    def extend_lock(self):
+        """
+        Продлевает блокировку после каждой пачки. Если она истекла и ее занял
+        другой запуск, этот останавливается: решения об удалении нельзя
+        принимать по двум разным снимкам.
+        """
+        if cache.get(LOCK_KEY) != self.lock_token or not cache.touch(LOCK_KEY, LOCK_TIMEOUT):
+            raise GarbageCollectionInProgress('Image garbage collection lock was lost')
+
+    def release_lock(self):
+        if cache.get(LOCK_KEY) == self.lock_token:
+            cache.delete(LOCK_KEY)
+
+    def run(self):
+        if not cache.add(LOCK_KEY, self.lock_token, timeout=LOCK_TIMEOUT):
+            raise GarbageCollectionInProgress('Image garbage collection is already running')
+        try:
+            self.report(phase='rows')
+            self.delete_orphan_rows()
+            self.delete_orphan_blobs()
+            self.report(phase='mark')
+            referenced = self.mark()
+            self.report(phase='sweep', referenced_paths=len(referenced))
+            self.sweep(referenced)
+            self.report(status='finished', phase=None, finished_at=timezone.now().isoformat())
+        except GarbageCollectionInProgress:
+            # Блокировку занял другой запуск, прогресс теперь его
+            raise
+        except Exception as e:
+            self.report(status='failed', error=str(e), finished_at=timezone.now().isoformat())
+            raise
+        finally:
+            self.release_lock()
+        return self.stats
+
+    def _iter_id_batches(self, queryset):
+        """id пачками по возрастанию, без OFFSET"""
+        last_id = None
+        while True:
+            page = queryset.order_by('id')
+            if last_id is not None:
+                page = page.filter(id__gt=last_id)
+            ids = list(page.values_list('id', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def delete_orphan_rows(self):
+        """
+        Непривязанные изображения удаляются пачками (см. delete_product_images).
+        В dry-run строки не удаляются, поэтому их файлы на sweep еще
+        считаются используемыми (оценка консервативная).
+        """
+        orphans = ProductImage.objects.filter(
+            product__isnull=True,
+            created_at__lt=self.cutoff,
+        ).exclude(image__in=category_image_paths())
+
+        for ids in self._iter_id_batches(orphans):
+            if self.dry_run:
+                self.report(rows_deleted=self.stats['rows_deleted'] + len(ids))
+                continue
+
+            deleted = delete_product_images(ProductImage.objects.filter(id__in=ids))
+            self.report(rows_deleted=self.stats['rows_deleted'] + deleted)
+
+    def delete_orphan_blobs(self):
+        """Blob'ы без ссылок (в том числе оставленные ради категории, которая их больше не использует)"""
+        orphans = ImageBlob.objects.filter(
+            ref_count=0,
+            created_at__lt=self.cutoff,
+            images__isnull=True,
+        ).exclude(file__in=category_image_paths())
+
+        for ids in self._iter_id_batches(orphans):
+            if self.dry_run:
+                self.report(blobs_deleted=self.stats['blobs_deleted'] + len(ids))
+                continue
+            deleted, _by_model = ImageBlob.objects.filter(
+                id__in=ids, ref_count=0, images__isnull=True
+            ).delete()
+            self.report(blobs_deleted=self.stats['blobs_deleted'] + deleted)
+
+    def mark(self):
+        """Множество путей (относительно MEDIA_ROOT), на которые есть ссылки в БД"""
+        referenced = set()
+
+        def add_with_renditions(name):
+            referenced.add(name)
+            # Варианты могут быть уже записаны на диск, но еще не в БД
+            for size_name in RENDITION_SIZES:
+                for suffix in RENDITION_FORMATS:
+                    referenced.add(rendition_path(name, size_name, suffix))
+
+        rows = ProductImage.objects.exclude(image='').values_list(
+            'image', 'renditions'
+        ).iterator(chunk_size=self.batch_size)
+        for index, (name, renditions) in enumerate(rows, start=1):
+            add_with_renditions(name)
+            referenced.update(path for path in (renditions or {}).values() if path)
+            if index % self.batch_size == 0:
+                self.report()
+
+        names = ImageBlob.objects.values_list('file', flat=True).iterator(chunk_size=self.batch_size)
+        for index, name in enumerate(names, start=1):
+            add_with_renditions(name)
+            if index % self.batch_size == 0:
+                self.report()
+
+        for name in Category.objects.exclude(image='').exclude(image__isnull=True).values_list(
+            'image', flat=True
+        ).iterator(chunk_size=self.batch_size):
+            referenced.add(name)
+
+        for name in Brand.objects.exclude(logo='').exclude(logo__isnull=True).values_list(
+            'logo', flat=True
+        ).iterator(chunk_size=self.batch_size):
+            referenced.add(name)
+
+        return referenced
+
+    def sweep(self, referenced):
+        cutoff = self.cutoff.timestamp()
+        for directory in SWEEP_DIRECTORIES:
+            path = os.path.join(self.media_root, directory)
+            if os.path.isdir(path):
+                self._sweep_directory(path, directory, referenced, cutoff, is_root=True)
+
+    def _sweep_directory(self, path, relative, referenced, cutoff, is_root=False):
+        """Возвращает True, если каталог после обхода пуст"""
+        remaining = 0
+        # mtime каталога до удаления файлов из него
+        directory_mtime = os.stat(path).st_mtime
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = posixpath.join(relative, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if not self._sweep_directory(entry.path, name, referenced, cutoff):
+                        remaining += 1
+                    continue
+
+                self.stats['files_scanned'] += 1
+                if self.stats['files_scanned'] % self.batch_size == 0:
+                    self.report()
+                stat = entry.stat(follow_symlinks=False)
+                if name in referenced or stat.st_mtime >= cutoff:
+                    remaining += 1
+                    continue
+
+                if not self.dry_run:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                self.stats['files_deleted'] += 1
+                self.stats['bytes_freed'] += stat.st_size
+
+        if is_root or remaining or self.dry_run:
+            return False
+        # Пустые каталоги (например, варианты удаленных изображений) убираем,
+        # только если они тоже старше grace-периода
+        try:
+            if directory_mtime < cutoff:
+                os.rmdir(path)
+                return True
+        except OSError:
+            pass
+        return False
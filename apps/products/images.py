@@ -0,0 +1,460 @@
+import base64
+import hashlib
+import io
+import os
+import posixpath
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from PIL import Image, ImageOps
+
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+
+# Сигнатуры допустимых форматов: формат -> проверка первых байт файла
+IMAGE_SIGNATURES = {
+    'JPEG': lambda header: header.startswith(b'\xff\xd8\xff'),
+    'PNG': lambda header: header.startswith(b'\x89PNG\r\n\x1a\n'),
+    'GIF': lambda header: header[:6] in (b'GIF87a', b'GIF89a'),
+}
+
+# Предрасчитанные варианты изображения товара: имя -> максимальный размер
+RENDITION_SIZES = {
+    'thumbnail': (300, 300),
+    'card': (600, 600),
+    'zoom': (1600, 1600),
+}
+
+# Форматы вариантов: суффикс имени -> (формат Pillow, расширение, параметры сохранения)
+RENDITION_FORMATS = {
+    '': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    '_webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+# Превью-заглушка, которая отдается прямо в JSON (data URI на пару сотен байт)
+PLACEHOLDER_SIZE = (16, 16)
+PLACEHOLDER_OPTIONS = {'quality': 40, 'method': 6}
+
+# EXIF Orientation, при которых ширина и высота меняются местами
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+RENDITION_NAMES = [
+    f'{name}{suffix}'
+    for name in RENDITION_SIZES
+    for suffix in RENDITION_FORMATS
+]
+
+
+def sniff_image(image_file):
+    """
+    Определяет формат по сигнатуре и читает размеры из заголовка.
+    Изображение целиком не декодируется: Image.open читает только заголовок.
+    Возвращает словарь с format, width, height (с учетом EXIF-поворота,
+    то есть в том виде, в каком изображение будет показано).
+    """
+    image_file.seek(0)
+    header = image_file.read(16)
+    image_format = next(
+        (name for name, matches in IMAGE_SIGNATURES.items() if matches(header)),
+        None
+    )
+    if image_format is None:
+        raise ValidationError('Unsupported file type. Only JPEG, PNG and GIF are allowed.')
+
+    image_file.seek(0)
+    try:
+        with Image.open(image_file) as img:
+            width, height = img.size
+            if img.getexif().get(EXIF_ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Invalid image file')
+    finally:
+        image_file.seek(0)
+
+    return {'format': image_format, 'width': width, 'height': height}
+
+
+BLOB_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+class HashingFile(File):
+    """Файл-обертка, считающая SHA-256 и размер по мере записи в хранилище"""
+
+    def __init__(self, file, name=None):
+        super().__init__(file, name=name or getattr(file, 'name', None))
+        self.sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def chunks(self, chunk_size=None):
+        self.file.seek(0)
+        for chunk in self.file.chunks(chunk_size):
+            self.sha256.update(chunk)
+            self.bytes_written += len(chunk)
+            yield chunk
+
+    def __iter__(self):
+        return self.chunks()
+
+    @property
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def stage_upload(image_file, image_format, storage=default_storage):
+    """
+    Пишет загрузку во временный путь, считая хэш в том же проходе.
+    Возвращает (путь, sha256, размер). Если хранилище читало файл мимо
+    chunks(), хэш досчитывается отдельным проходом по загрузке.
+    Брошенные временные файлы убирает сборщик мусора изображений.
+    """
+    content = HashingFile(image_file)
+    name = storage.save(
+        posixpath.join('products', 'uploads', f'{uuid.uuid4().hex}.{BLOB_EXTENSIONS[image_format]}'),
+        content
+    )
+    if content.bytes_written != image_file.size:
+        content = HashingFile(image_file)
+        for _chunk in content.chunks():
+            pass
+    image_file.seek(0)
+    return name, content.hexdigest, content.bytes_written
+
+
+def blob_path(sha256, image_format):
+    """Путь по содержимому: products/blobs/ab/abcdef....jpg"""
+    return posixpath.join('products', 'blobs', sha256[:2], f'{sha256}.{BLOB_EXTENSIONS[image_format]}')
+
+
+def move_staged_file(staged, name, storage=default_storage):
+    """Переносит временный файл на постоянный путь (на диске - переименованием)"""
+    try:
+        source, target = storage.path(staged), storage.path(name)
+    except NotImplementedError:
+        with storage.open(staged) as content:
+            storage.save(name, content)
+        storage.delete(staged)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+
+
+def acquire_blob(sha256, staged, image_format, storage=default_storage):
+    """
+    Возвращает blob для содержимого, увеличивая счетчик ссылок.
+    Временный файл из stage_upload становится файлом blob только если такого
+    содержимого еще нет, иначе удаляется.
+    """
+    from .models import ImageBlob
+
+    with transaction.atomic():
+        blob = ImageBlob.objects.select_for_update().filter(sha256=sha256).first()
+        if blob is not None:
+            ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            storage.delete(staged)
+            return blob
+
+        name = blob_path(sha256, image_format)
+        if storage.exists(name):
+            storage.delete(staged)
+        else:
+            move_staged_file(staged, name, storage=storage)
+
+        try:
+            with transaction.atomic():
+                return ImageBlob.objects.create(sha256=sha256, file=name, ref_count=1)
+        except IntegrityError:
+            # Такой же файл параллельно загрузили в другом запросе
+            ImageBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+            return ImageBlob.objects.get(sha256=sha256)
+
+
+def release_blob(blob_id, storage=default_storage):
+    """
+    Уменьшает счетчик ссылок. Когда ссылок не осталось (и файл не используется
+    категорией), удаляет blob, его файл и все варианты после коммита.
+    """
+    from .models import Category, ImageBlob
+
+    with transaction.atomic():
+        ImageBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+        blob = ImageBlob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None or blob.ref_count > 0:
+            return False
+        if Category.objects.filter(image=blob.file.name).exists():
+            return False
+
+        name = blob.file.name
+        blob.delete()
+        transaction.on_commit(lambda: delete_image_files(name, storage=storage))
+        return True
+
+
+def category_image_paths():
+    """Пути файлов, используемых категориями (подзапрос)"""
+    from .models import Category
+
+    # NULL в подзапросе превратил бы NOT IN в пустой результат
+    return Category.objects.exclude(image='').exclude(image__isnull=True).values('image')
+
+
+def release_category_image(name, storage=default_storage):
+    """
+    Освобождает файл, который перестала использовать категория. Файл может
+    принадлежать общему blob товаров, поэтому удаляется только если на него
+    не ссылаются ни другие категории, ни изображения товаров.
+    """
+    from .models import Category, ImageBlob, ProductImage
+
+    if not name:
+        return False
+    with transaction.atomic():
+        if Category.objects.filter(image=name).exists():
+            return False
+        if ProductImage.objects.filter(image=name).exists():
+            return False
+        blob = ImageBlob.objects.select_for_update().filter(file=name).first()
+        if blob is not None:
+            if blob.ref_count > 0:
+                return False
+            blob.delete()
+        transaction.on_commit(lambda: delete_image_files(name, storage=storage))
+        return True
+
+
+def recount_blob_references(blob_ids):
+    """Пересчитывает ref_count по фактическому числу ProductImage одним UPDATE"""
+    from .models import ImageBlob, ProductImage
+
+    ImageBlob.objects.filter(pk__in=blob_ids).update(
+        ref_count=Coalesce(
+            Subquery(
+                ProductImage.objects.filter(blob=OuterRef('pk'))
+                .order_by()
+                .values('blob')
+                .annotate(count=Count('id'))
+                .values('count'),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+    )
+
+
+def delete_rows(model, ids, chunk_size=1000):
+    """
+    DELETE по первичным ключам без сборщика Django: без сигналов и каскадов.
+    Подходит только моделям, на которые никто не ссылается внешним ключом.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = model._meta.pk
+    column = connection.ops.quote_name(pk.column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), chunk_size):
+            chunk = [pk.get_db_prep_value(value, connection) for value in ids[start:start + chunk_size]]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})",
+                chunk
+            )
+            deleted += cursor.rowcount
+    return deleted
+
+
+def delete_product_images(queryset, storage=default_storage):
+    """
+    Удаляет изображения одним DELETE без сигналов на каждую строку.
+    Счетчики ссылок blob'ов пересчитываются пачкой; blob'ы без ссылок и файлы
+    старых изображений без blob (если путь не занят категорией) удаляются
+    после коммита. Возвращает число удаленных строк.
+    """
+    from .models import Category, ImageBlob, ProductImage
+
+    with transaction.atomic():
+        rows = list(queryset.values_list('id', 'blob_id', 'image'))
+        if not rows:
+            return 0
+
+        blob_ids = {blob_id for _id, blob_id, _name in rows if blob_id}
+        names = {name for _id, blob_id, name in rows if not blob_id and name}
+
+        deleted = delete_rows(ProductImage, [image_id for image_id, _blob_id, _name in rows])
+
+        if blob_ids:
+            recount_blob_references(blob_ids)
+            released = ImageBlob.objects.filter(
+                pk__in=blob_ids, ref_count=0
+            ).exclude(file__in=category_image_paths())
+            names.update(released.values_list('file', flat=True))
+            released.delete()
+
+        names -= set(Category.objects.filter(image__in=names).values_list('image', flat=True))
+        if names:
+            transaction.on_commit(lambda: [delete_image_files(name, storage=storage) for name in names])
+    return deleted
+
+
+def delete_image_files(name, storage=default_storage):
+    """Удаляет оригинал и все его варианты"""
+    paths = [name] + [
+        rendition_path(name, size_name, suffix)
+        for size_name in RENDITION_SIZES
+        for suffix in RENDITION_FORMATS
+    ]
+    for path in paths:
+        if storage.exists(path):
+            storage.delete(path)
+
+
+def build_placeholder(image_file):
+    """
+    Крошечное размытое превью в виде data URI (WebP).
+    JPEG декодируется в уменьшенном масштабе (draft), поэтому это дешево
+    даже для больших фотографий. Заодно проверяет, что файл декодируется целиком.
+    """
+    image_file.seek(0)
+    try:
+        with Image.open(image_file) as img:
+            img.draft('RGB', (PLACEHOLDER_SIZE[0] * 8, PLACEHOLDER_SIZE[1] * 8))
+            img = ImageOps.exif_transpose(img)
+            content = render_image(img, PLACEHOLDER_SIZE, 'WEBP', **PLACEHOLDER_OPTIONS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError('Invalid image file')
+    finally:
+        image_file.seek(0)
+    return 'data:image/webp;base64,' + base64.b64encode(content).decode('ascii')
+
+
+def prepare_image_upload(image_file):
+    """
+    Проверка загруженного файла без обращения к БД: размер, сигнатура,
+    размеры и превью-заглушка. Безопасно вызывать из потоков.
+    """
+    if image_file.size > MAX_UPLOAD_SIZE:
+        raise ValidationError('File size too large. Maximum size is 5MB.')
+
+    info = sniff_image(image_file)
+    info['placeholder'] = build_placeholder(image_file)
+    return info
+
+
+def create_product_image(image_file, info):
+    """
+    Создает ProductImage по результату prepare_image_upload со ссылкой на
+    общий ImageBlob. Файл читается один раз: хэш считается при записи во
+    временный путь. Повторная загрузка того же файла оставляет только
+    существующий blob и переиспользует уже готовые варианты.
+    """
+    from .models import ProductImage
+
+    staged, sha256, file_size = stage_upload(image_file, info['format'])
+    with transaction.atomic():
+        blob = acquire_blob(sha256, staged, info['format'])
+        renditions = ProductImage.objects.filter(
+            blob=blob
+        ).exclude(renditions={}).values_list('renditions', flat=True).first()
+
+        return ProductImage.objects.create(
+            image=blob.file.name,
+            blob=blob,
+            renditions=renditions or {},
+            alt_text=image_file.name,
+            width=info['width'],
+            height=info['height'],
+            file_size=file_size,
+            format=info['format'],
+            sha256=sha256,
+            placeholder=info['placeholder'],
+        )
+
+
+def save_image_upload(image_file):
+    """Загрузка одного изображения товара: проверка и сохранение"""
+    return create_product_image(image_file, prepare_image_upload(image_file))
+
+
+def rendition_path(image_name, size_name, suffix):
+    """products/abc.jpg -> products/renditions/abc/card.webp"""
+    directory, filename = posixpath.split(image_name)
+    stem = posixpath.splitext(filename)[0]
+    extension = RENDITION_FORMATS[suffix][1]
+    return posixpath.join(directory, 'renditions', stem, f'{size_name}.{extension}')
+
+
+def render_image(img, max_size, image_format, **save_options):
+    """Уменьшает изображение с сохранением пропорций и кодирует его в нужный формат"""
+    img = img.copy()
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+    if image_format == 'JPEG' and img.mode != 'RGB':
+        # JPEG не поддерживает прозрачность: подкладываем белый фон
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1])
+        else:
+            background.paste(img.convert('RGB'))
+        img = background
+    elif image_format == 'WEBP' and img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+
+def generate_renditions(image_name, storage=default_storage):
+    """
+    Генерирует все варианты для файла изображения и кладет их рядом с оригиналом.
+    Уже существующие файлы вариантов не пересоздаются.
+    Возвращает словарь {имя варианта: путь в хранилище}.
+    """
+    renditions = {}
+    source = None
+    try:
+        for size_name, max_size in RENDITION_SIZES.items():
+            for suffix, (image_format, _extension, options) in RENDITION_FORMATS.items():
+                path = rendition_path(image_name, size_name, suffix)
+                if not storage.exists(path):
+                    if source is None:
+                        with storage.open(image_name, 'rb') as image_file:
+                            source = ImageOps.exif_transpose(Image.open(image_file))
+                            source.load()
+                    content = render_image(source, max_size, image_format, **options)
+                    path = storage.save(path, ContentFile(content))
+                renditions[f'{size_name}{suffix}'] = path
+    finally:
+        if source is not None:
+            source.close()
+    return renditions
+
+
+def delete_renditions(renditions, storage=default_storage):
+    for path in (renditions or {}).values():
+        if path and storage.exists(path):
+            storage.delete(path)
+
+
+def rendition_urls(product_image, request=None):
+    """
+    Абсолютные URL всех вариантов изображения.
+    Пока варианты не сгенерированы, вместо них отдается оригинал.
+    """
+    if not product_image.image:
+        return None
+
+    def absolute(url):
+        return request.build_absolute_uri(url) if request else url
+
+    original = absolute(product_image.image.url)
+    renditions = product_image.renditions or {}
+    urls = {'original': original}
+    for name in RENDITION_NAMES:
+        path = renditions.get(name)
+        urls[name] = absolute(default_storage.url(path)) if path else original
+    return urls
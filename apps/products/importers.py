@@ -0,0 +1,335 @@
+"""
+Импорт товаров из CSV/XLSX.
+
+Файл читается потоково (csv.reader, openpyxl в режиме read_only), строки
+обрабатываются пачками: категории и бренды берутся из справочников,
+загруженных один раз на импорт, каждая строка проверяется clean_fields()
+без запросов к БД, а пачка записывается одним
+bulk_create(update_conflicts=True) по sku.
+"""
+import csv
+import io
+import posixpath
+import uuid
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from .cache import invalidate_catalog_cache
+from .models import Brand, Category, Product, ProductImport
+from .sizes import overall_diameter_expression
+
+# Заголовок колонки (без учета регистра) -> поле Product
+COLUMN_ALIASES = {
+    'sku': 'sku', 'артикул': 'sku',
+    'name': 'name', 'название': 'name', 'наименование': 'name',
+    'category': 'category', 'категория': 'category',
+    'brand': 'brand', 'бренд': 'brand', 'производитель': 'brand',
+    'price': 'price', 'цена': 'price',
+    'old_price': 'old_price', 'старая цена': 'old_price',
+    'quantity': 'quantity', 'количество': 'quantity', 'остаток': 'quantity',
+    'in_stock': 'in_stock', 'в наличии': 'in_stock',
+    'description': 'description', 'описание': 'description',
+    'diameter': 'diameter', 'диаметр': 'diameter',
+    'width': 'width', 'ширина': 'width',
+    'profile': 'profile', 'профиль': 'profile',
+    'wheel_width': 'wheel_width', 'ширина диска': 'wheel_width',
+    'et_offset': 'et_offset', 'et': 'et_offset', 'вылет': 'et_offset',
+    'pcd': 'pcd',
+    'bolt_count': 'bolt_count', 'количество отверстий': 'bolt_count',
+    'center_bore': 'center_bore', 'dia': 'center_bore', 'ступица': 'center_bore',
+}
+REQUIRED_COLUMNS = ('sku', 'name', 'category', 'price')
+DECIMAL_FIELDS = ('price', 'old_price', 'width', 'wheel_width', 'pcd', 'center_bore')
+INTEGER_FIELDS = ('quantity', 'diameter', 'profile', 'et_offset', 'bolt_count')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', '+'}
+
+# Поля, которые не проверяются clean_fields: служебные и FK, уже
+# разрешенные по справочникам (проверка FK сделала бы запрос на строку)
+CLEAN_EXCLUDE = ['id', 'category', 'brand', 'overall_diameter', 'created_at', 'updated_at']
+
+# Поля, от которых зависит полный диаметр шины (Product.overall_diameter)
+TIRE_SIZE_FIELDS = ('width', 'profile', 'diameter')
+
+
+class ImportFileError(Exception):
+    """Файл нельзя импортировать целиком (формат, заголовок)"""
+
+
+def iter_csv_rows(f):
+    raw = getattr(f, 'file', f)
+    sample = raw.read(4096).decode('utf-8-sig', errors='ignore')
+    raw.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''), dialect)
+
+
+def iter_xlsx_rows(f):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('XLSX import requires openpyxl')
+
+    workbook = load_workbook(getattr(f, 'file', f), read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(f, filename):
+    extension = posixpath.splitext(filename.lower())[1]
+    if extension == '.csv':
+        return iter_csv_rows(f)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(f)
+    raise ImportFileError('Unsupported file type. Only CSV and XLSX are allowed.')
+
+
+def to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def to_decimal(value):
+    text = to_text(value).replace('\xa0', '').replace(' ', '').replace(',', '.')
+    if not text:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise ValidationError('Enter a number.')
+
+
+def to_integer(value):
+    number = to_decimal(value)
+    if number is None:
+        return None
+    if number != number.to_integral_value():
+        raise ValidationError('Enter a whole number.')
+    return int(number)
+
+
+class ProductImporter:
+    """
+    Импорт товаров с upsert по sku.
+    Новые бренды создаются пачкой в категории товара (create_brands=True),
+    неизвестная категория - ошибка строки. Ошибки строк копятся в отчете
+    и не останавливают импорт.
+    """
+
+    def __init__(self, job=None, batch_size=None, dry_run=False, create_brands=True):
+        self.job = job
+        self.batch_size = batch_size or getattr(settings, 'PRODUCT_IMPORT_BATCH_SIZE', 500)
+        self.max_errors = getattr(settings, 'PRODUCT_IMPORT_MAX_ERRORS', 1000)
+        self.dry_run = dry_run
+        self.create_brands = create_brands
+        self.stats = {
+            'processed_rows': 0,
+            'created_count': 0,
+            'updated_count': 0,
+            'error_count': 0,
+        }
+        self.errors = []
+
+    def load_lookups(self):
+        """Справочники категорий и брендов: по одному запросу на импорт"""
+        self.categories = {}
+        ambiguous = set()
+        for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+            self.categories[str(category_id)] = category_id
+            if slug:
+                self.categories[slug.lower()] = category_id
+            key = name.strip().lower()
+            if key in self.categories and self.categories[key] != category_id:
+                ambiguous.add(key)
+            self.categories.setdefault(key, category_id)
+        self.ambiguous_categories = ambiguous
+
+        self.brands = {
+            (category_id, name.strip().lower()): brand_id
+            for brand_id, category_id, name in Brand.objects.values_list('id', 'category_id', 'name')
+        }
+
+    def map_header(self, header):
+        columns = {}
+        for index, title in enumerate(header or ()):
+            field = COLUMN_ALIASES.get(to_text(title).lower())
+            if field and field not in columns:
+                columns[field] = index
+
+        missing = [field for field in REQUIRED_COLUMNS if field not in columns]
+        if missing:
+            raise ImportFileError(f"Missing required columns: {', '.join(missing)}")
+
+        self.columns = columns
+        # Обновляются только поля, которые есть в файле
+        fields = [field for field in columns if field != 'sku']
+        if 'quantity' in columns and 'in_stock' not in columns:
+            fields.append('in_stock')
+        self.update_fields = fields + ['updated_at']
+
+    def add_error(self, row_number, sku, errors):
+        self.stats['error_count'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'sku': sku, 'errors': errors})
+
+    def resolve_category(self, value):
+        key = to_text(value).lower()
+        if key in self.ambiguous_categories:
+            raise ValidationError('Category name is ambiguous, use slug or id.')
+        category_id = self.categories.get(key)
+        if category_id is None:
+            raise ValidationError(f'Unknown category: {to_text(value)}')
+        return category_id
+
+    def parse_row(self, row):
+        """Значения полей из строки файла и ошибки конвертации"""
+        values, errors = {}, {}
+        for field, index in self.columns.items():
+            raw = row[index] if index < len(row) else None
+            try:
+                if field in DECIMAL_FIELDS:
+                    values[field] = to_decimal(raw)
+                elif field in INTEGER_FIELDS:
+                    values[field] = to_integer(raw)
+                elif field == 'in_stock':
+                    values[field] = to_text(raw).lower() in TRUE_VALUES
+                elif field == 'category':
+                    values['category_id'] = self.resolve_category(raw)
+                elif field == 'brand':
+                    values['brand'] = to_text(raw)
+                else:
+                    values[field] = to_text(raw) or None
+            except ValidationError as e:
+                errors[field] = e.messages
+        return values, errors
+
+    def process_batch(self, rows):
+        parsed = {}
+        missing_brands = set()
+        for row_number, row in rows:
+            self.stats['processed_rows'] += 1
+            if not any(to_text(cell) for cell in row):
+                continue
+
+            values, errors = self.parse_row(row)
+            sku = values.get('sku')
+            if not sku:
+                errors['sku'] = ['This field is required.']
+            if errors:
+                self.add_error(row_number, sku, errors)
+                continue
+
+            brand_name = values.get('brand')
+            if brand_name and (values['category_id'], brand_name.lower()) not in self.brands:
+                missing_brands.add((values['category_id'], brand_name))
+            # Повтор sku в пачке: побеждает последняя строка
+            parsed[sku] = (row_number, values)
+
+        self.create_missing_brands(missing_brands)
+
+        products = []
+        for sku, (row_number, values) in parsed.items():
+            if 'brand' in self.columns:
+                brand_name = values.pop('brand')
+                brand_id = None
+                if brand_name:
+                    brand_id = self.brands.get((values['category_id'], brand_name.lower()))
+                    if brand_id is None:
+                        self.add_error(row_number, sku, {'brand': [f'Unknown brand: {brand_name}']})
+                        continue
+                values['brand_id'] = brand_id
+            if 'quantity' in values:
+                values['quantity'] = values['quantity'] or 0
+                if 'in_stock' not in self.columns:
+                    values['in_stock'] = values['quantity'] > 0
+
+            product = Product(**values)
+            try:
+                product.clean_fields(exclude=CLEAN_EXCLUDE)
+            except ValidationError as e:
+                self.add_error(row_number, sku, e.message_dict)
+                continue
+            products.append(product)
+
+        if not products:
+            return
+
+        existing = set(
+            Product.objects.filter(sku__in=[product.sku for product in products]).values_list('sku', flat=True)
+        )
+        if not self.dry_run:
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create(
+                        products,
+                        update_conflicts=True,
+                        unique_fields=['sku'],
+                        update_fields=self.update_fields,
+                    )
+                    batch = Product.objects.filter(sku__in=[product.sku for product in products])
+                    if 'category' in self.columns and 'brand' not in self.columns:
+                        # Бренда в файле нет, а категория могла смениться: бренд чужой
+                        # категории сбрасываем (как move_category, см. Product.clean)
+                        batch.exclude(brand=None).exclude(brand__category_id=F('category_id')).update(brand=None)
+                    if any(field in self.columns for field in TIRE_SIZE_FIELDS):
+                        # bulk_create обходит save(); в файле может быть только часть
+                        # типоразмера, поэтому диаметр считается по итоговым значениям строк
+                        batch.update(overall_diameter=overall_diameter_expression())
+            except DatabaseError as e:
+                for product in products:
+                    self.add_error(parsed[product.sku][0], product.sku, {'__all__': [str(e)]})
+                return
+
+        self.stats['updated_count'] += len(existing)
+        self.stats['created_count'] += len(products) - len(existing)
+
+    def create_missing_brands(self, missing):
+        if not missing or not self.create_brands:
+            return
+        if not self.dry_run:
+            Brand.objects.bulk_create(
+                [Brand(name=name, category_id=category_id) for category_id, name in missing],
+                ignore_conflicts=True,
+            )
+            lookup = Brand.objects.filter(
+                category_id__in={category_id for category_id, _name in missing}
+            ).values_list('id', 'category_id', 'name')
+            for brand_id, category_id, name in lookup:
+                self.brands[(category_id, name.strip().lower())] = brand_id
+        else:
+            # В dry-run бренды не создаются, но строки с ними считаются корректными
+            for category_id, name in missing:
+                self.brands[(category_id, name.lower())] = uuid.uuid4()
+
+    def report_progress(self):
+        if self.job is not None:
+            ProductImport.objects.filter(pk=self.job.pk).update(errors=self.errors, **self.stats)
+
+    def run(self, f, filename):
+        rows = iter_rows(f, filename)
+        self.map_header(next(rows, None))
+        self.load_lookups()
+
+        numbered = enumerate(rows, start=2)  # первая строка - заголовок
+        while True:
+            batch = list(islice(numbered, self.batch_size))
+            if not batch:
+                break
+            self.process_batch(batch)
+            self.report_progress()
+
+        if not self.dry_run and (self.stats['created_count'] or self.stats['updated_count']):
+            invalidate_catalog_cache()
+        return self.stats
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.market import MarketFeedBuilder, MarketFeedInProgress, feed_path
+
+
+class Command(BaseCommand):
+    help = 'Собирает YML-фид каталога для маркетплейсов (перестраивает только изменившиеся предложения)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Перестроить все предложения')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        builder = MarketFeedBuilder(batch_size=options['batch_size'], full=options['full'])
+        try:
+            stats = builder.run()
+        except MarketFeedInProgress as e:
+            raise CommandError(str(e))
+
+        state = 'written' if stats['written'] else 'unchanged'
+        self.stdout.write(self.style.SUCCESS(
+            f"Offers: {stats['offers']}, re-rendered: {stats['rendered']}, file {state}: {feed_path()}"
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from apps.products.similarity import SimilarityBuilder
+from apps.products.tasks import build_product_similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие товары (тот же размер других брендов, ближайшие размеры бренда)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Сколько соседей показывать в карусели')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--async', action='store_true', dest='run_async',
+                            help='Поставить задачу в очередь Celery')
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            build_product_similarity.delay()
+            self.stdout.write(self.style.SUCCESS('Product similarity build queued'))
+            return
+
+        stats = SimilarityBuilder(limit=options['limit'], batch_size=options['batch_size']).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Products: {stats['products']}, with same size: {stats['with_same_size']}, "
+            f"with nearby sizes: {stats['with_nearby_sizes']}"
+        ))
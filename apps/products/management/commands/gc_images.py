@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.gc import GarbageCollectionInProgress, ImageGarbageCollector
+from apps.products.tasks import collect_orphan_images
+
+
+class Command(BaseCommand):
+    help = 'Удаляет непривязанные изображения товаров и файлы в MEDIA_ROOT без записей в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, ничего не удалять')
+        parser.add_argument('--grace-hours', type=int, default=None,
+                            help='Не трогать файлы и записи моложе указанного числа часов')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--async', action='store_true', dest='run_async',
+                            help='Поставить задачу в очередь Celery')
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            collect_orphan_images.delay(grace_hours=options['grace_hours'], dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS('Image garbage collection queued'))
+            return
+
+        collector = ImageGarbageCollector(
+            grace_hours=options['grace_hours'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            stats = collector.run()
+        except GarbageCollectionInProgress as e:
+            raise CommandError(str(e))
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Rows: {stats['rows_deleted']}, blobs: {stats['blobs_deleted']}, "
+            f"files: {stats['files_deleted']} of {stats['files_scanned']} scanned, "
+            f"freed {stats['bytes_freed']} bytes"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.products.models import ProductImage
+from apps.products.tasks import generate_image_renditions
+
+
+class Command(BaseCommand):
+    help = 'Ставит в очередь генерацию вариантов и превью для изображений, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Перегенерировать для всех изображений')
+        parser.add_argument('--sync', action='store_true', help='Генерировать в текущем процессе')
+
+    def handle(self, *args, **options):
+        queryset = ProductImage.objects.exclude(image='')
+        if not options['all']:
+            queryset = queryset.filter(Q(renditions={}) | Q(placeholder=''))
+
+        count = 0
+        for image_id in queryset.values_list('id', flat=True).iterator():
+            if options['sync']:
+                generate_image_renditions(str(image_id))
+            else:
+                generate_image_renditions.delay(str(image_id))
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} images'))
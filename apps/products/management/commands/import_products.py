@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.importers import ImportFileError, ProductImporter
+
+
+class Command(BaseCommand):
+    help = 'Импорт товаров из CSV/XLSX с upsert по артикулу (sku)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не записывать')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--no-create-brands', action='store_true',
+                            help='Считать ошибкой бренды, которых нет в категории')
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            create_brands=not options['no_create_brands'],
+        )
+        try:
+            with open(options['path'], 'rb') as f:
+                stats = importer.run(f, options['path'])
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in importer.errors[:20]:
+            self.stderr.write(f"Row {error['row']} ({error['sku'] or '-'}): {error['errors']}")
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Rows: {stats['processed_rows']}, created: {stats['created_count']}, "
+            f"updated: {stats['updated_count']}, errors: {stats['error_count']}"
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.feeds import FeedError, open_feed, sync_feed
+
+
+class Command(BaseCommand):
+    help = 'Синхронизирует цены и остатки с фидом поставщика (YML/XML, путь или URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('location', help='Путь к файлу фида или URL')
+        parser.add_argument('--sku-field', default=None,
+                            help="Тег с артикулом (по умолчанию vendorCode/sku/article) или 'id' для атрибута offer")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать изменения')
+
+    def handle(self, *args, **options):
+        try:
+            with open_feed(options['location']) as source:
+                stats = sync_feed(
+                    source,
+                    sku_field=options['sku_field'],
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, FeedError) as e:
+            raise CommandError(str(e))
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Rows: {stats['rows']}, matched: {stats['matched']}, changed: {stats['changed']}, "
+            f"without sku: {stats['skipped']}, {stats['rows_per_second']} rows/s ({stats['elapsed']}s)"
+        ))
@@ -0,0 +1,225 @@
+"""
+Фид каталога для маркетплейсов (YML Яндекс Маркета).
+
+Каждое предложение хранится готовым XML-фрагментом в MarketFeedOffer.
+Сборка перестраивает только фрагменты товаров, изменившихся с прошлого раза
+(updated_at товара, его бренда или категории новее сохраненной версии),
+удаленные товары уходят из фида вместе с фрагментом (CASCADE). Файл
+склеивается из фрагментов потоком во временный файл рядом с фидом и
+подменяется через os.replace, поэтому роботы никогда не видят недописанный фид.
+Если ничего не изменилось, файл не переписывается и его ETag остается прежним.
+"""
+import os
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Category, MarketFeedOffer, Product, ProductImage
+
+STATE_KEY = 'market_feed:state'
+LOCK_KEY = 'market_feed:lock'
+LOCK_TIMEOUT = 60 * 60
+
+MAX_PICTURES = 10
+MAX_DESCRIPTION_LENGTH = 3000
+
+# Поле товара -> (название параметра, единица измерения)
+OFFER_PARAMS = (
+    ('width', 'Ширина', 'мм'),
+    ('profile', 'Профиль', '%'),
+    ('diameter', 'Диаметр', 'дюйм'),
+    ('wheel_width', 'Ширина диска', 'дюйм'),
+    ('et_offset', 'Вылет (ET)', 'мм'),
+    ('pcd', 'PCD', 'мм'),
+    ('bolt_count', 'Количество отверстий', None),
+    ('center_bore', 'Диаметр ступицы (DIA)', 'мм'),
+)
+
+
+class MarketFeedInProgress(Exception):
+    pass
+
+
+def feed_path():
+    return os.path.join(str(settings.MEDIA_ROOT), settings.MARKET_FEED_PATH)
+
+
+def category_feed_id(category_id):
+    # YML требует числовой id категории (до 18 цифр), у нас UUID
+    return str(category_id.int % 10 ** 18)
+
+
+def offer_feed_id(product_id):
+    # id предложения в YML - до 20 латинских букв и цифр; 80 бит UUID хватает для уникальности
+    return product_id.hex[:20]
+
+
+def absolute_media_url(name):
+    return f"{settings.SITE_URL.rstrip('/')}/{settings.MEDIA_URL.strip('/')}/{name}"
+
+
+def element(tag, value):
+    return f'<{tag}>{escape(str(value))}</{tag}>'
+
+
+def render_offer(product, pictures):
+    """XML-фрагмент <offer> для товара с загруженными category и brand"""
+    parts = [
+        f'<offer id="{offer_feed_id(product.id)}" available="{"true" if product.is_available else "false"}">',
+        element('url', settings.MARKET_FEED_PRODUCT_URL.format(id=product.id)),
+        element('price', product.price),
+    ]
+    if product.has_discount:
+        parts.append(element('oldprice', product.old_price))
+    parts.append(element('currencyId', 'RUR'))
+    parts.append(element('categoryId', category_feed_id(product.category_id)))
+    parts.extend(element('picture', absolute_media_url(name)) for name in pictures[:MAX_PICTURES])
+    parts.append(element('name', product.name))
+    if product.brand_id:
+        parts.append(element('vendor', product.brand.name))
+    if product.sku:
+        parts.append(element('vendorCode', product.sku))
+    if product.description:
+        parts.append(element('description', product.description[:MAX_DESCRIPTION_LENGTH]))
+    parts.append(element('count', product.quantity))
+    for field, title, unit in OFFER_PARAMS:
+        value = getattr(product, field)
+        if value is None:
+            continue
+        unit_attr = f' unit={quoteattr(unit)}' if unit else ''
+        parts.append(f'<param name={quoteattr(title)}{unit_attr}>{escape(str(value))}</param>')
+    parts.append('</offer>')
+    return ''.join(parts)
+
+
+def get_state():
+    return cache.get(STATE_KEY)
+
+
+class MarketFeedBuilder:
+
+    def __init__(self, batch_size=None, full=False):
+        self.batch_size = batch_size or getattr(settings, 'MARKET_FEED_BATCH_SIZE', 1000)
+        self.full = full
+        self.stats = {'rendered': 0, 'offers': 0, 'written': False}
+
+    def run(self):
+        started_at = timezone.now()
+        if not cache.add(LOCK_KEY, started_at.isoformat(), timeout=LOCK_TIMEOUT):
+            raise MarketFeedInProgress('Market feed is already being built')
+        try:
+            self.refresh_offers()
+            signature = self.signature()
+            state = get_state() or {}
+            if self.stats['rendered'] or state.get('signature') != signature or not os.path.exists(feed_path()):
+                self.write_feed()
+                state = {'signature': signature, 'generated_at': started_at.isoformat()}
+                cache.set(STATE_KEY, state, timeout=None)
+                self.stats['written'] = True
+            self.stats['generated_at'] = state.get('generated_at')
+        finally:
+            cache.delete(LOCK_KEY)
+        return self.stats
+
+    def stale_products(self):
+        """Товары без фрагмента или с фрагментом старее товара, бренда или категории"""
+        queryset = Product.objects.annotate(
+            source_updated_at=Greatest(
+                'updated_at',
+                'category__updated_at',
+                Coalesce('brand__updated_at', 'updated_at'),
+            )
+        )
+        if not self.full:
+            queryset = queryset.filter(
+                Q(market_offer__isnull=True) | Q(market_offer__source_updated_at__lt=F('source_updated_at'))
+            )
+        return queryset
+
+    def refresh_offers(self):
+        ids = self.stale_products().order_by('id').values_list('id', flat=True).iterator(chunk_size=self.batch_size)
+        while True:
+            batch = list(islice(ids, self.batch_size))
+            if not batch:
+                break
+            self.render_batch(batch)
+
+    def render_batch(self, ids):
+        products = self.stale_products().filter(id__in=ids).select_related('category', 'brand')
+
+        pictures = {}
+        images = ProductImage.objects.filter(product_id__in=ids).exclude(image='').order_by(
+            '-is_feature', 'created_at'
+        ).values_list('product_id', 'image')
+        for product_id, name in images:
+            pictures.setdefault(product_id, []).append(name)
+
+        offers = [
+            MarketFeedOffer(
+                product=product,
+                fragment=render_offer(product, pictures.get(product.id, [])),
+                source_updated_at=product.source_updated_at,
+                rendered_at=timezone.now(),
+            )
+            for product in products
+        ]
+        MarketFeedOffer.objects.bulk_create(
+            offers,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['fragment', 'source_updated_at', 'rendered_at'],
+        )
+        self.stats['rendered'] += len(offers)
+
+    def signature(self):
+        """
+        Меняется при удалении товаров и изменении дерева категорий, которые
+        не видны по фрагментам; при его смене файл переписывается.
+        """
+        offers = MarketFeedOffer.objects.count()
+        categories = Category.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+        self.stats['offers'] = offers
+        return [
+            offers,
+            categories['count'],
+            categories['last'] and categories['last'].isoformat(),
+        ]
+
+    def write_header(self, out):
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write(f'<yml_catalog date="{timezone.localtime():%Y-%m-%dT%H:%M:%S%z}">\n<shop>\n')
+        out.write(element('name', settings.MARKET_FEED_SHOP_NAME) + '\n')
+        out.write(element('company', settings.MARKET_FEED_COMPANY) + '\n')
+        out.write(element('url', settings.STOREFRONT_URL) + '\n')
+        out.write('<currencies><currency id="RUR" rate="1"/></currencies>\n<categories>\n')
+        for category_id, name, parent_id in Category.objects.order_by('id').values_list('id', 'name', 'parent_id'):
+            parent = f' parentId="{category_feed_id(parent_id)}"' if parent_id else ''
+            out.write(f'<category id="{category_feed_id(category_id)}"{parent}>{escape(name)}</category>\n')
+        out.write('</categories>\n<offers>\n')
+
+    def write_feed(self):
+        path = feed_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        fragments = MarketFeedOffer.objects.order_by('product_id').values_list(
+            'fragment', flat=True
+        ).iterator(chunk_size=self.batch_size)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                self.write_header(out)
+                for fragment in fragments:
+                    out.write(fragment)
+                    out.write('\n')
+                out.write('</offers>\n</shop>\n</yml_catalog>\n')
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_add_wheel_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="renditions",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Paths of generated renditions keyed by rendition name",
+                verbose_name="renditions",
+            ),
+        ),
+    ]
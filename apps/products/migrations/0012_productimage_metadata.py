@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_productimage_renditions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name="width"),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name="height"),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="file_size",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="File size in bytes", null=True, verbose_name="file size"
+            ),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="format",
+            field=models.CharField(blank=True, max_length=10, verbose_name="format"),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="sha256",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="SHA-256 of the original file",
+                max_length=64,
+                verbose_name="SHA-256",
+            ),
+        ),
+    ]
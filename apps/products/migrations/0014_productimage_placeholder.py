@@ -0,0 +1,22 @@
+# Generated by Django 4.2.10 on 2026-10-19 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0013_image_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="placeholder",
+            field=models.TextField(
+                blank=True,
+                help_text="Tiny blurred preview as a data URI",
+                verbose_name="placeholder",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.10 on 2026-10-19 02:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0015_product_sku_productimport"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MarketFeedOffer",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="market_offer",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="product",
+                    ),
+                ),
+                ("fragment", models.TextField(verbose_name="XML fragment")),
+                (
+                    "source_updated_at",
+                    models.DateTimeField(verbose_name="source updated at"),
+                ),
+                (
+                    "rendered_at",
+                    models.DateTimeField(auto_now=True, verbose_name="rendered at"),
+                ),
+            ],
+            options={
+                "verbose_name": "market feed offer",
+                "verbose_name_plural": "market feed offers",
+            },
+        ),
+    ]
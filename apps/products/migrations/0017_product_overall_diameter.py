@@ -0,0 +1,56 @@
+# Generated by Django 4.2.10 on 2026-10-19 02:43
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+
+
+def populate_overall_diameter(apps, schema_editor):
+    """Полный диаметр существующих шин одним UPDATE (формула из sizes.overall_diameter_expression)"""
+    Product = apps.get_model("products", "Product")
+    Product.objects.filter(
+        width__isnull=False, profile__isnull=False, diameter__isnull=False
+    ).update(
+        overall_diameter=Round(
+            F("diameter") * Value(Decimal("25.4"))
+            + F("width") * F("profile") * Value(Decimal("0.02")),
+            1,
+            output_field=DecimalField(max_digits=6, decimal_places=1),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0016_marketfeedoffer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="overall_diameter",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=1,
+                editable=False,
+                help_text="Tire overall diameter in millimeters, computed from width, profile and diameter",
+                max_digits=6,
+                null=True,
+                verbose_name="overall diameter",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(
+                    ("in_stock", True), ("overall_diameter__isnull", False)
+                ),
+                fields=["overall_diameter"],
+                name="product_tire_od_in_stock_idx",
+            ),
+        ),
+        migrations.RunPython(populate_overall_diameter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.10 on 2026-10-19 02:44
+
+from django.db import migrations, models
+import django.db.models.functions.text
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0017_product_overall_diameter"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Vehicle",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("make", models.CharField(max_length=100, verbose_name="make")),
+                ("model", models.CharField(max_length=100, verbose_name="model")),
+                (
+                    "generation",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="generation"
+                    ),
+                ),
+                (
+                    "year_from",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="year from"
+                    ),
+                ),
+                (
+                    "year_to",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="year to"
+                    ),
+                ),
+                (
+                    "bolt_count",
+                    models.PositiveSmallIntegerField(verbose_name="bolt count"),
+                ),
+                (
+                    "pcd",
+                    models.DecimalField(
+                        decimal_places=1,
+                        help_text="Pitch Circle Diameter in millimeters",
+                        max_digits=5,
+                        verbose_name="PCD",
+                    ),
+                ),
+                (
+                    "center_bore",
+                    models.DecimalField(
+                        decimal_places=1,
+                        help_text="Hub bore diameter in millimeters",
+                        max_digits=5,
+                        verbose_name="center bore",
+                    ),
+                ),
+                ("et_min", models.SmallIntegerField(verbose_name="minimum ET offset")),
+                ("et_max", models.SmallIntegerField(verbose_name="maximum ET offset")),
+                (
+                    "min_diameter",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="minimum wheel diameter"
+                    ),
+                ),
+                (
+                    "max_diameter",
+                    models.PositiveSmallIntegerField(
+                        blank=True, null=True, verbose_name="maximum wheel diameter"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "vehicle",
+                "verbose_name_plural": "vehicles",
+                "ordering": ["make", "model", "year_from"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(
+                    ("bolt_count__isnull", False), ("pcd__isnull", False)
+                ),
+                fields=["bolt_count", "pcd", "diameter", "et_offset", "center_bore"],
+                name="product_wheel_fitment_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(
+                django.db.models.functions.text.Upper("make"),
+                django.db.models.functions.text.Upper("model"),
+                name="vehicle_make_model_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.10 on 2026-10-19 02:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0018_vehicle_wheel_fitment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSimilarity",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="similarity",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="product",
+                    ),
+                ),
+                (
+                    "same_size",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="same size, other brands"
+                    ),
+                ),
+                (
+                    "nearby_sizes",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        verbose_name="same brand, nearby sizes",
+                    ),
+                ),
+                (
+                    "built_at",
+                    models.DateTimeField(auto_now=True, verbose_name="built at"),
+                ),
+            ],
+            options={
+                "verbose_name": "product similarity",
+                "verbose_name_plural": "product similarities",
+            },
+        ),
+    ]
@@ -1,9 +1,17 @@
 import uuid
+from django.conf import settings
 from django.db import models
+from django_cleanup import cleanup
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 
+from .sizes import tire_overall_diameter
 
+
+# Изображение категории может указывать на общий blob товаров, поэтому
+# django_cleanup его не трогает: файл освобождают сигналы products.signals
+@cleanup.ignore
 class Category(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(_('name'), max_length=255)
@@ -44,14 +52,53 @@ class Brand(models.Model):
         return f"{self.name} ({self.category.name})"
 
 
+@cleanup.ignore
+class ImageBlob(models.Model):
+    """
+    Файл изображения, адресуемый по SHA-256 содержимого.
+    Одинаковые загрузки ссылаются на один blob; файл и его варианты
+    удаляются, когда исчезает последняя ссылка (ref_count == 0).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, unique=True)
+    file = models.ImageField(_('file'), upload_to='products/blobs/')
+    ref_count = models.PositiveIntegerField(_('reference count'), default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('image blob')
+        verbose_name_plural = _('image blobs')
+
+    def __str__(self):
+        return self.sha256
+
+
+# Файлы изображений товаров могут быть общими (ImageBlob), поэтому
+# django_cleanup их не трогает: удалением управляют сигналы products.signals
+@cleanup.ignore
 class ProductImage(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     product = models.ForeignKey('Product', verbose_name=_('product'), 
                               on_delete=models.CASCADE, related_name='images',
                               null=True, blank=True)
     image = models.ImageField(_('image'), upload_to='products/')
+    blob = models.ForeignKey(ImageBlob, verbose_name=_('blob'),
+                           on_delete=models.PROTECT, related_name='images',
+                           null=True, blank=True)
     alt_text = models.CharField(_('alternative text'), max_length=255, blank=True)
     is_feature = models.BooleanField(_('feature image'), default=False)
+    renditions = models.JSONField(_('renditions'), default=dict, blank=True,
+                                help_text=_('Paths of generated renditions keyed by rendition name'))
+    # Метаданные оригинала, записываются при загрузке
+    width = models.PositiveIntegerField(_('width'), null=True, blank=True)
+    height = models.PositiveIntegerField(_('height'), null=True, blank=True)
+    file_size = models.PositiveIntegerField(_('file size'), null=True, blank=True,
+                                          help_text=_('File size in bytes'))
+    format = models.CharField(_('format'), max_length=10, blank=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, blank=True, db_index=True,
+                            help_text=_('SHA-256 of the original file'))
+    placeholder = models.TextField(_('placeholder'), blank=True,
+                                 help_text=_('Tiny blurred preview as a data URI'))
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -61,10 +108,16 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Image {self.id}"
 
+    @property
+    def renditions_ready(self):
+        return bool(self.renditions)
+
 
 class Product(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(_('name'), max_length=255)
+    sku = models.CharField(_('SKU'), max_length=64, unique=True, null=True, blank=True,
+                         help_text=_('Stable external article used by imports and supplier feeds'))
     description = models.TextField(_('description'), blank=True, null=True)
     price = models.DecimalField(_('price'), max_digits=10, decimal_places=2,
                               validators=[MinValueValidator(0)])
@@ -103,6 +156,10 @@ class Product(models.Model):
     center_bore = models.DecimalField(_('center bore'), max_digits=5, decimal_places=1,
                                     null=True, blank=True,
                                     help_text=_('Center bore diameter in millimeters'))
+    overall_diameter = models.DecimalField(_('overall diameter'), max_digits=6, decimal_places=1,
+                                         null=True, blank=True, editable=False,
+                                         help_text=_('Tire overall diameter in millimeters, '
+                                                     'computed from width, profile and diameter'))
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -111,6 +168,20 @@ class Product(models.Model):
         verbose_name = _('product')
         verbose_name_plural = _('products')
         ordering = ['-created_at']
+        indexes = [
+            # Подбор шин-аналогов по полному диаметру: диапазон только по шинам в наличии
+            models.Index(
+                fields=['overall_diameter'],
+                name='product_tire_od_in_stock_idx',
+                condition=models.Q(in_stock=True, overall_diameter__isnull=False),
+            ),
+            # Подбор дисков по автомобилю: точная разболтовка (и диаметр), затем диапазоны ET и DIA
+            models.Index(
+                fields=['bolt_count', 'pcd', 'diameter', 'et_offset', 'center_bore'],
+                name='product_wheel_fitment_idx',
+                condition=models.Q(bolt_count__isnull=False, pcd__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -124,6 +195,7 @@ class Product(models.Model):
             })
 
     def save(self, *args, **kwargs):
+        self.overall_diameter = tire_overall_diameter(self.width, self.profile, self.diameter)
         self.full_clean()
         super().save(*args, **kwargs)
 
@@ -161,3 +233,123 @@ class Product(models.Model):
         if self.has_discount:
             return int(((self.old_price - self.price) / self.old_price) * 100)
         return 0
+
+
+class ProductImport(models.Model):
+    """Фоновый импорт товаров из CSV/XLSX с прогрессом и отчетом об ошибках"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_RUNNING, _('Running')),
+        (STATUS_FINISHED, _('Finished')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(_('file'), upload_to='imports/')
+    original_name = models.CharField(_('original file name'), max_length=255, blank=True)
+    status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    dry_run = models.BooleanField(_('dry run'), default=False)
+    processed_rows = models.PositiveIntegerField(_('processed rows'), default=0)
+    created_count = models.PositiveIntegerField(_('created'), default=0)
+    updated_count = models.PositiveIntegerField(_('updated'), default=0)
+    error_count = models.PositiveIntegerField(_('errors'), default=0)
+    errors = models.JSONField(_('errors'), default=list, blank=True,
+                            help_text=_('First row errors: [{"row", "sku", "errors"}]'))
+    detail = models.TextField(_('detail'), blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name=_('created by'),
+                                 on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='product_imports')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('finished at'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('product import')
+        verbose_name_plural = _('product imports')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_name or self.file.name} ({self.status})"
+
+
+
+class MarketFeedOffer(models.Model):
+    """
+    Готовый XML-фрагмент <offer> товара для фида маркетплейсов.
+    source_updated_at - версия данных (товар, бренд, категория), по которой
+    фрагмент построен: при следующей сборке перестраиваются только товары,
+    у которых версия стала новее, а файл фида склеивается из готовых фрагментов.
+    """
+    product = models.OneToOneField(Product, verbose_name=_('product'), on_delete=models.CASCADE,
+                                   primary_key=True, related_name='market_offer')
+    fragment = models.TextField(_('XML fragment'))
+    source_updated_at = models.DateTimeField(_('source updated at'))
+    rendered_at = models.DateTimeField(_('rendered at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('market feed offer')
+        verbose_name_plural = _('market feed offers')
+
+    def __str__(self):
+        return f"Offer {self.product_id}"
+
+
+class ProductSimilarity(models.Model):
+    """
+    Предрасчитанные соседи товара для каруселей на странице товара:
+    тот же типоразмер других брендов и ближайшие размеры того же бренда.
+    Списки id строит задача build_product_similarity.
+    """
+    product = models.OneToOneField(Product, verbose_name=_('product'), on_delete=models.CASCADE,
+                                   primary_key=True, related_name='similarity')
+    same_size = models.JSONField(_('same size, other brands'), default=list, blank=True)
+    nearby_sizes = models.JSONField(_('same brand, nearby sizes'), default=list, blank=True)
+    built_at = models.DateTimeField(_('built at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('product similarity')
+        verbose_name_plural = _('product similarities')
+
+    def __str__(self):
+        return f"Similar to {self.product_id}"
+
+
+class Vehicle(models.Model):
+    """
+    Справочник автомобилей с параметрами посадки дисков: разболтовка,
+    диаметр ступицы, допустимый вылет и диаметры дисков.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    make = models.CharField(_('make'), max_length=100)
+    model = models.CharField(_('model'), max_length=100)
+    generation = models.CharField(_('generation'), max_length=100, blank=True)
+    year_from = models.PositiveSmallIntegerField(_('year from'), null=True, blank=True)
+    year_to = models.PositiveSmallIntegerField(_('year to'), null=True, blank=True)
+    bolt_count = models.PositiveSmallIntegerField(_('bolt count'))
+    pcd = models.DecimalField(_('PCD'), max_digits=5, decimal_places=1,
+                            help_text=_('Pitch Circle Diameter in millimeters'))
+    center_bore = models.DecimalField(_('center bore'), max_digits=5, decimal_places=1,
+                                    help_text=_('Hub bore diameter in millimeters'))
+    et_min = models.SmallIntegerField(_('minimum ET offset'))
+    et_max = models.SmallIntegerField(_('maximum ET offset'))
+    min_diameter = models.PositiveSmallIntegerField(_('minimum wheel diameter'), null=True, blank=True)
+    max_diameter = models.PositiveSmallIntegerField(_('maximum wheel diameter'), null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('vehicle')
+        verbose_name_plural = _('vehicles')
+        ordering = ['make', 'model', 'year_from']
+        indexes = [
+            # Поиск по марке и модели без учета регистра (iexact -> UPPER(...) = UPPER(...))
+            models.Index(Upper('make'), Upper('model'), name='vehicle_make_model_idx'),
+        ]
+
+    def __str__(self):
+        years = f" {self.year_from or ''}-{self.year_to or ''}" if self.year_from or self.year_to else ''
+        return f"{self.make} {self.model} {self.generation}".strip() + years
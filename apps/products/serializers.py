@@ -1,13 +1,21 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Category, Product, ProductImage, Brand
+from .sizes import format_tire_size, format_wheel_size
+from .images import rendition_urls
+from .models import Category, Product, ProductImage, Brand, Vehicle
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'alt_text', 'is_feature', 'created_at')
+        fields = (
+            'id', 'image', 'renditions', 'width', 'height', 'placeholder',
+            'alt_text', 'is_feature', 'created_at',
+        )
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -15,6 +23,10 @@ class ProductImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def get_renditions(self, obj):
+        """URL вариантов (thumbnail, card, zoom и их WebP); пока они не готовы - оригинал"""
+        return rendition_urls(obj, self.context.get('request'))
+
 
 class BrandSerializer(serializers.ModelSerializer):
     logo = serializers.SerializerMethodField()
@@ -73,29 +85,96 @@ class ProductListSerializer(serializers.ModelSerializer):
         return None
         
     def get_tire_size(self, obj):
-        """Return formatted tire size (width/profile R diameter)"""
-        if obj.width and obj.profile and obj.diameter:
-            return f"{obj.width}/{obj.profile} R{obj.diameter}"
-        return None
-        
+        return format_tire_size(obj.width, obj.profile, obj.diameter)
+
     def get_wheel_size(self, obj):
-        """Return formatted wheel size (diameter x wheel_width ET offset PCD bolt_count x center_bore)"""
-        if obj.diameter and obj.wheel_width:
-            size_parts = [f"{obj.diameter}x{obj.wheel_width}"]
-            
-            if obj.et_offset is not None:
-                size_parts.append(f"ET{obj.et_offset}")
-                
-            if obj.pcd and obj.bolt_count:
-                size_parts.append(f"{obj.bolt_count}x{obj.pcd}")
-                
-            if obj.center_bore:
-                size_parts.append(f"DIA{obj.center_bore}")
-                
-            return " ".join(size_parts)
-        return None
+        return format_wheel_size(
+            obj.diameter, obj.wheel_width, obj.et_offset, obj.pcd, obj.bolt_count, obj.center_bore
+        )
 
 
 class ProductDetailSerializer(ProductListSerializer):
     class Meta(ProductListSerializer.Meta):
-        fields = ProductListSerializer.Meta.fields + ('description',) 
\ No newline at end of file
+        fields = ProductListSerializer.Meta.fields + ('description',) 
+
+
+class ProductAlternativeSerializer(ProductListSerializer):
+    """Шина-аналог: полный диаметр и отклонение от исходной шины в процентах"""
+    deviation_percent = serializers.SerializerMethodField()
+
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ('overall_diameter', 'deviation_percent')
+
+    def get_deviation_percent(self, obj):
+        reference = self.context['reference_diameter']
+        return round(float((obj.overall_diameter - reference) / reference * 100), 2)
+
+
+class ProductAlternativesParamsSerializer(serializers.Serializer):
+    """Параметры подбора аналогов (query string); NaN и бесконечность DecimalField отклоняет"""
+    tolerance = serializers.DecimalField(
+        max_digits=4, decimal_places=2, min_value=Decimal('0.01'), max_value=Decimal('10'), default=Decimal('3')
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+
+
+class ProductUserStateSerializerMixin(serializers.Serializer):
+    """Поля состояния для текущего пользователя (избранное и корзина), берутся из аннотаций"""
+    is_favorite = serializers.BooleanField(read_only=True)
+    in_cart_quantity = serializers.IntegerField(read_only=True)
+
+
+class ProductListUserStateSerializer(ProductUserStateSerializerMixin, ProductListSerializer):
+    class Meta(ProductListSerializer.Meta):
+        fields = ProductListSerializer.Meta.fields + ('is_favorite', 'in_cart_quantity')
+
+
+class ProductDetailUserStateSerializer(ProductUserStateSerializerMixin, ProductDetailSerializer):
+    class Meta(ProductDetailSerializer.Meta):
+        fields = ProductDetailSerializer.Meta.fields + ('is_favorite', 'in_cart_quantity')
+
+
+class VehicleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Vehicle
+        fields = (
+            'id', 'make', 'model', 'generation', 'year_from', 'year_to',
+            'bolt_count', 'pcd', 'center_bore', 'et_min', 'et_max',
+            'min_diameter', 'max_diameter',
+        )
+
+
+class WheelFitmentSerializer(serializers.Serializer):
+    """
+    Параметры подбора дисков (query string). Можно передать vehicle - тогда
+    недостающие параметры берутся из справочника автомобилей.
+    center_bore - ступица автомобиля: подходят диски с DIA не меньше
+    (разница закрывается центровочными кольцами).
+    """
+    vehicle = serializers.PrimaryKeyRelatedField(queryset=Vehicle.objects.all(), required=False)
+    bolt_count = serializers.IntegerField(min_value=3, max_value=10, required=False)
+    pcd = serializers.DecimalField(max_digits=5, decimal_places=1, required=False)
+    center_bore = serializers.DecimalField(max_digits=5, decimal_places=1, required=False)
+    et_min = serializers.IntegerField(required=False)
+    et_max = serializers.IntegerField(required=False)
+    diameter = serializers.IntegerField(min_value=10, max_value=30, required=False)
+    in_stock = serializers.BooleanField(required=False, default=True)
+
+    VEHICLE_FIELDS = ('bolt_count', 'pcd', 'center_bore', 'et_min', 'et_max')
+
+    def validate(self, data):
+        vehicle = data.get('vehicle')
+        if vehicle:
+            for field in self.VEHICLE_FIELDS:
+                data.setdefault(field, getattr(vehicle, field))
+            if 'diameter' in data and not (
+                (vehicle.min_diameter or 0) <= data['diameter'] <= (vehicle.max_diameter or data['diameter'])
+            ):
+                raise serializers.ValidationError({'diameter': 'Diameter does not fit this vehicle.'})
+
+        missing = [field for field in ('bolt_count', 'pcd') if data.get(field) is None]
+        if missing:
+            raise serializers.ValidationError({field: 'This field is required.' for field in missing})
+        if data.get('et_min') is not None and data.get('et_max') is not None and data['et_min'] > data['et_max']:
+            raise serializers.ValidationError({'et_max': 'Must be greater than or equal to et_min.'})
+        return data
@@ -1,15 +1,26 @@
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 import json
-from .models import Product, Category, ProductImage, Brand
+import uuid
+from decimal import Decimal
+from .bulk import BULK_HANDLERS
+from .sizes import format_tire_size, format_wheel_size
+from .images import delete_product_images, rendition_urls
+from .models import Product, Category, ProductImage, Brand, ProductImport
 
 
 class AdminProductImageSerializer(serializers.ModelSerializer):
     thumbnail = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ('id', 'image', 'thumbnail', 'alt_text', 'is_feature')
+        fields = (
+            'id', 'image', 'thumbnail', 'renditions', 'width', 'height', 'placeholder',
+            'alt_text', 'is_feature',
+        )
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -18,10 +29,11 @@ class AdminProductImageSerializer(serializers.ModelSerializer):
         return obj.image.url if obj.image else None
 
     def get_thumbnail(self, obj):
-        request = self.context.get('request')
-        if obj.image and request:
-            return request.build_absolute_uri(obj.image.url)
-        return obj.image.url if obj.image else None
+        urls = rendition_urls(obj, self.context.get('request'))
+        return urls['thumbnail'] if urls else None
+
+    def get_renditions(self, obj):
+        return rendition_urls(obj, self.context.get('request'))
 
 
 class AdminBrandSerializer(serializers.ModelSerializer):
@@ -93,6 +105,71 @@ class AdminCategorySelectSerializer(serializers.ModelSerializer):
         return None
 
 
+def parse_uuid(value):
+    """UUID или None, если значение не похоже на UUID"""
+    try:
+        return uuid.UUID(str(value))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def check_images_exist(image_ids):
+    """Проверяет существование всех изображений одним запросом"""
+    parsed = []
+    for image_id in image_ids:
+        parsed_id = parse_uuid(image_id)
+        if parsed_id is None:
+            raise serializers.ValidationError(f"Invalid image ID: {image_id}")
+        parsed.append((image_id, parsed_id))
+
+    found = set(
+        ProductImage.objects.filter(id__in=[parsed_id for _, parsed_id in parsed]).values_list('id', flat=True)
+    )
+    for image_id, parsed_id in parsed:
+        if parsed_id not in found:
+            raise serializers.ValidationError(f"Invalid image ID: {image_id}")
+
+
+def attach_product_images(product, items, replace=False):
+    """
+    Привязывает изображения к товару: одна выборка всех id, расчет изменений
+    в памяти и один bulk_update. items - список {'id', 'is_feature', 'alt_text'},
+    alt_text=None оставляет текущую подпись. Главным становится последнее
+    отмеченное изображение, иначе первое из списка.
+    При replace=True изображения товара, которых нет в списке, удаляются
+    одним DELETE (см. delete_product_images).
+    """
+    items_by_id = {}
+    for item in items:
+        image_id = parse_uuid(item.get('id'))
+        if image_id is not None:
+            items_by_id[image_id] = item
+
+    images = ProductImage.objects.in_bulk(list(items_by_id))
+    attached = [image_id for image_id in items_by_id if image_id in images]
+    feature_id = next(
+        (image_id for image_id in reversed(attached) if items_by_id[image_id].get('is_feature')),
+        attached[0] if attached else None
+    )
+
+    for image_id in attached:
+        image = images[image_id]
+        item = items_by_id[image_id]
+        image.product = product
+        if item.get('alt_text') is not None:
+            image.alt_text = item['alt_text']
+        image.is_feature = image_id == feature_id
+
+    with transaction.atomic():
+        if replace:
+            delete_product_images(product.images.exclude(id__in=attached))
+        ProductImage.objects.bulk_update(
+            [images[image_id] for image_id in attached],
+            ['product', 'alt_text', 'is_feature']
+        )
+    return attached
+
+
 class AdminProductCreateSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
     brand = serializers.PrimaryKeyRelatedField(queryset=Brand.objects.all(), required=False)
@@ -159,32 +236,20 @@ class AdminProductCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Invalid format for images")
         
         # Проверяем каждый элемент
-        result = []
+        image_ids = []
         for img in images_list:
-            # Если это строка, считаем ее ID изображения
+            # Строка - ID изображения, объект - ID с метаданными
             if isinstance(img, str):
-                image_id = img
-                try:
-                    ProductImage.objects.get(id=image_id)
-                    result.append(img)  # Добавляем ID как есть
-                except (ProductImage.DoesNotExist, ValueError):
-                    raise serializers.ValidationError(f"Invalid image ID: {image_id}")
-            # Если это объект, извлекаем ID и проверяем
+                image_ids.append(img)
             elif isinstance(img, dict):
                 if 'id' not in img:
                     raise serializers.ValidationError("Each image object must have 'id' field")
-                
-                image_id = img['id']
-                try:
-                    ProductImage.objects.get(id=image_id)
-                    # Добавляем весь объект для последующей обработки
-                    result.append(img)
-                except (ProductImage.DoesNotExist, ValueError):
-                    raise serializers.ValidationError(f"Invalid image ID: {image_id}")
+                image_ids.append(img['id'])
             else:
                 raise serializers.ValidationError("Each image must be a string UUID or an object with id")
-            
-        return result
+
+        check_images_exist(image_ids)
+        return images_list
 
     def validate_images_metadata(self, value):
         if not value:
@@ -215,71 +280,34 @@ class AdminProductCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         images = validated_data.pop('images', [])
         images_metadata = validated_data.pop('images_metadata', [])
-        
-        print(f"create - images: {images}, type: {type(images)}")
-        
-        # Создаем продукт
-        product = super().create(validated_data)
-        
-        # Обрабатываем изображения
-        if images:
-            # Преобразуем images_metadata в словарь по image_id для быстрого доступа
-            metadata_dict = {
-                str(item['image_id']): item 
-                for item in images_metadata
-            } if images_metadata else {}
-            
-            feature_image = None
-            
-            for image_item in images:
-                try:
-                    # Определяем тип данных изображения (строка ID или объект)
+
+        with transaction.atomic():
+            product = super().create(validated_data)
+
+            if images:
+                # Метаданные для изображений, переданных строкой ID
+                metadata_dict = {
+                    str(item['image_id']): item
+                    for item in images_metadata
+                } if images_metadata else {}
+
+                items = []
+                for image_item in images:
                     if isinstance(image_item, str):
-                        # Если передан только ID
-                        image_id = image_item
-                        image = ProductImage.objects.get(id=image_id)
-                        # Берем метаданные из images_metadata
-                        metadata = metadata_dict.get(str(image_id), {})
-                        is_feature = metadata.get('is_feature', False)
-                        alt_text = metadata.get('alt_text', '')
+                        metadata = metadata_dict.get(image_item, {})
+                        items.append({
+                            'id': image_item,
+                            'is_feature': metadata.get('is_feature', False),
+                            'alt_text': metadata.get('alt_text', ''),
+                        })
                     else:
-                        # Если передан объект с ID и другими полями
-                        image_id = image_item['id']
-                        image = ProductImage.objects.get(id=image_id)
-                        is_feature = image_item.get('is_feature', False)
-                        alt_text = image_item.get('alt_text', image.alt_text)
-                    
-                    # Обновляем данные изображения
-                    image.product = product
-                    image.alt_text = alt_text
-                    image.is_feature = is_feature
-                    image.save()
-                    
-                    print(f"Added image to product: {image_id}, is_feature: {is_feature}")
-                    
-                    # Запоминаем главное изображение
-                    if is_feature:
-                        feature_image = image
-                        
-                except ProductImage.DoesNotExist:
-                    print(f"Image not found: {image_id if isinstance(image_item, str) else image_item.get('id')}")
-                    continue  # Пропускаем несуществующие изображения
-            
-            # Устанавливаем главное изображение
-            if feature_image:
-                product.set_feature_image(feature_image)
-                print(f"Set feature image: {feature_image.id}")
-            elif images:  # Если нет отмеченного главного изображения, используем первое
-                try:
-                    first_image_data = images[0]
-                    first_image_id = first_image_data if isinstance(first_image_data, str) else first_image_data['id']
-                    first_image = ProductImage.objects.get(id=first_image_id)
-                    product.set_feature_image(first_image)
-                    print(f"Set first image as feature: {first_image.id}")
-                except ProductImage.DoesNotExist:
-                    print(f"First image not found for feature")
-                    pass
-        
+                        items.append({
+                            'id': image_item['id'],
+                            'is_feature': image_item.get('is_feature', False),
+                            'alt_text': image_item.get('alt_text'),
+                        })
+                attach_product_images(product, items)
+
         return product
         
     def to_representation(self, instance):
@@ -327,27 +355,12 @@ class AdminProductDetailSerializer(serializers.ModelSerializer):
         )
         
     def get_tire_size(self, obj):
-        """Return formatted tire size (width/profile R diameter)"""
-        if obj.width and obj.profile and obj.diameter:
-            return f"{obj.width}/{obj.profile} R{obj.diameter}"
-        return None
-        
+        return format_tire_size(obj.width, obj.profile, obj.diameter)
+
     def get_wheel_size(self, obj):
-        """Return formatted wheel size (diameter x wheel_width ET offset PCD bolt_count x center_bore)"""
-        if obj.diameter and obj.wheel_width:
-            size_parts = [f"{obj.diameter}x{obj.wheel_width}"]
-            
-            if obj.et_offset is not None:
-                size_parts.append(f"ET{obj.et_offset}")
-                
-            if obj.pcd and obj.bolt_count:
-                size_parts.append(f"{obj.bolt_count}x{obj.pcd}")
-                
-            if obj.center_bore:
-                size_parts.append(f"DIA{obj.center_bore}")
-                
-            return " ".join(size_parts)
-        return None
+        return format_wheel_size(
+            obj.diameter, obj.wheel_width, obj.et_offset, obj.pcd, obj.bolt_count, obj.center_bore
+        )
 
 
 class AdminProductUpdateSerializer(serializers.ModelSerializer):
@@ -437,121 +450,48 @@ class AdminProductUpdateSerializer(serializers.ModelSerializer):
             
         # Проверяем формат каждого изображения
         result = []
+        image_ids = []
         for img in value:
             if isinstance(img, str):
-                # Пытаемся интерпретировать строку как UUID
-                try:
-                    image_id = img
-                    # Проверяем существование изображения
-                    try:
-                        ProductImage.objects.get(id=image_id)
-                    except (ProductImage.DoesNotExist, ValueError):
-                        raise serializers.ValidationError(f"Invalid image ID: {image_id}")
-                    # Преобразуем в формат словаря
-                    img = {'id': image_id, 'is_feature': False, 'alt_text': ''}
-                except Exception as e:
-                    raise serializers.ValidationError(f"Invalid image format: {str(e)}")
+                # Строка - ID изображения, преобразуем в формат словаря
+                image_ids.append(img)
+                img = {'id': img, 'is_feature': False, 'alt_text': ''}
             elif not isinstance(img, dict):
                 raise serializers.ValidationError("Each image must be an object or UUID string")
-                
+
             if 'id' not in img:
                 raise serializers.ValidationError("Each image must have an id")
-            
+
             result.append(img)
-                
+
+        check_images_exist(image_ids)
         return result
     
     def update(self, instance, validated_data):
-        # Обрабатываем изображения, если они переданы
-        images_data = validated_data.pop('images', [])
-        print(f"Update method received images_data: {images_data}")
-        
-        # Обновляем остальные поля
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Обрабатываем изображения
-        if images_data is not None:  # Проверяем на None, а не на пустоту, чтобы обрабатывать пустые списки
-            # Получаем текущие изображения продукта
-            current_images = {str(image.id): image for image in instance.images.all()}
-            new_image_ids = set()
-            feature_image = None
-            
-            for image_data in images_data:
-                # Если image_data - строка или словарь только с id, преобразуем его
-                if isinstance(image_data, str):
-                    image_id = image_data
-                    is_feature = False
-                    alt_text = ""
-                elif isinstance(image_data, dict) and len(image_data.keys()) == 1 and 'id' in image_data:
-                    image_id = image_data['id']
-                    is_feature = False
-                    alt_text = ""
-                else:
-                    image_id = image_data.get('id')
-                    is_feature = image_data.get('is_feature', False)
-                    alt_text = image_data.get('alt_text', '')
-                
-                try:
-                    # Пытаемся найти существующее изображение
-                    print(f"Looking for image with ID: {image_id}")
-                    image = ProductImage.objects.get(id=image_id)
-                    print(f"Found image: {image}")
-                    
-                    # Привязываем изображение к продукту
-                    image.product = instance
-                    image.alt_text = alt_text
-                    image.is_feature = is_feature
-                    image.save()
-                    
-                    new_image_ids.add(str(image.id))
-                    
-                    # Запоминаем главное изображение
-                    if is_feature:
-                        feature_image = image
-                except (ProductImage.DoesNotExist, ValueError) as e:
-                    # Пропускаем несуществующие изображения
-                    print(f"Error with image {image_id}: {e}")
-                    continue
-            
-            # Удаляем изображения, которые больше не связаны с продуктом
-            images_to_remove = set(current_images.keys()) - new_image_ids
-            if images_to_remove:
-                print(f"Removing images: {images_to_remove}")
-                images_to_delete = ProductImage.objects.filter(id__in=images_to_remove)
-                
-                # Удаляем файлы с диска и записи из БД
-                for image_to_delete in images_to_delete:
-                    print(f"Deleting image: {image_to_delete.id}, path: {image_to_delete.image.name}")
-                    
-                    # Удаляем файл с диска
-                    if image_to_delete.image:
-                        try:
-                            image_to_delete.image.delete(save=False)
-                            print(f"Deleted image file: {image_to_delete.image.name}")
-                        except Exception as e:
-                            print(f"Error deleting image file: {e}")
-                    
-                    # Удаляем запись из БД
-                    image_to_delete.delete()
-                    print(f"Deleted image record: {image_to_delete.id}")
-            
-            # Устанавливаем главное изображение
-            if feature_image:
-                # Сбрасываем is_feature у всех изображений, кроме выбранного
-                instance.images.exclude(id=feature_image.id).update(is_feature=False)
-                feature_image.is_feature = True
-                feature_image.save()
-            elif new_image_ids and not instance.images.filter(is_feature=True).exists():
-                # Если нет отмеченного главного изображения, используем первое
-                first_image = instance.images.first()
-                if first_image:
-                    first_image.is_feature = True
-                    first_image.save()
-        
-        # Возвращаем обновленный экземпляр продукта с сериализованными изображениями
-        # Используем DetailSerializer для полной сериализации всех полей
+        # None - изображения не переданы (PATCH без images), оставляем как есть
+        images_data = validated_data.pop('images', None)
+
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+
+            if images_data is not None:
+                # Изображения, которых нет в списке, удаляются; файлы освобождаются
+                # после коммита (общий файл - только вместе с последней ссылкой)
+                items = []
+                for image_data in images_data:
+                    if isinstance(image_data, str):
+                        image_data = {'id': image_data}
+                    elif not isinstance(image_data, dict):
+                        continue
+                    items.append({
+                        'id': image_data.get('id'),
+                        'is_feature': image_data.get('is_feature', False),
+                        'alt_text': image_data.get('alt_text', ''),
+                    })
+                attach_product_images(instance, items, replace=True)
+
         return instance
 
     def to_representation(self, instance):
@@ -592,20 +532,14 @@ class AdminCategoryUpdateSerializer(serializers.ModelSerializer):
             from .models import ProductImage
             try:
                 image = ProductImage.objects.get(id=data['image_id'])
-                print(f"Found image with id {data['image_id']}: {image.image.url}")
-                
-                # Вместо создания нового файла, просто копируем информацию о пути
-                # Прямое присваивание ImageField к полю категории
-                data.pop('image_id')
-                data['image'] = image.image
-                print(f"Using image path: {image.image}")
-                
-            except ProductImage.DoesNotExist:
+            except (ProductImage.DoesNotExist, DjangoValidationError):
                 raise serializers.ValidationError({"image_id": "Изображение с указанным ID не найдено"})
-            except Exception as e:
-                print(f"Error processing image_id: {str(e)}")
-                raise serializers.ValidationError({"image_id": f"Ошибка обработки изображения: {str(e)}"})
-                
+
+            # Вместо создания нового файла категория ссылается на тот же путь;
+            # файл освобождается только вместе с последней ссылкой (products.signals)
+            data.pop('image_id')
+            data['image'] = image.image
+
         return data
         
     def update(self, instance, validated_data):
@@ -620,4 +554,146 @@ class AdminCategoryUpdateSerializer(serializers.ModelSerializer):
         """
         Используем полный сериализатор для отображения результата.
         """
-        return AdminCategorySerializer(instance, context=self.context).data
\ No newline at end of file
+        return AdminCategorySerializer(instance, context=self.context).data
+
+
+class AdminProductBulkUpdateSerializer(serializers.Serializer):
+    """
+    Массовое изменение товаров: выборка (filters - параметры ProductFilter админки
+    и/или ids), операция и ее аргументы.
+    """
+    # Аргументы каждой операции и обязательные из них
+    OPERATION_PARAMS = {
+        'set_price': (('price',), ('price',)),
+        'adjust_price': (('percent', 'keep_old_price'), ('percent',)),
+        'set_old_price': (('old_price',), ('old_price',)),
+        'set_stock': (('quantity', 'in_stock'), ('quantity',)),
+        'move_category': (('category',), ('category',)),
+        'move_brand': (('brand',), ('brand',)),
+    }
+
+    filters = serializers.DictField(required=False)
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    operation = serializers.ChoiceField(choices=list(BULK_HANDLERS))
+    dry_run = serializers.BooleanField(default=False)
+
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    percent = serializers.DecimalField(
+        max_digits=6, decimal_places=2, min_value=Decimal('-99.99'), max_value=Decimal('1000'), required=False
+    )
+    keep_old_price = serializers.BooleanField(required=False)
+    old_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False, allow_null=True
+    )
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    in_stock = serializers.BooleanField(required=False)
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    brand = serializers.PrimaryKeyRelatedField(
+        queryset=Brand.objects.select_related('category'), required=False, allow_null=True
+    )
+
+    def validate_filters(self, value):
+        # Неизвестный ключ ProductFilter молча пропустил бы, и операция ушла бы на весь каталог
+        known = self.context.get('filter_names', ())
+        unknown = sorted(name for name in value if name not in known)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(unknown)}.")
+        return {name: item for name, item in value.items() if item not in (None, '', [])}
+
+    def validate(self, data):
+        if not data.get('filters') and not data.get('ids'):
+            raise serializers.ValidationError('Specify non-empty filters or ids to select products.')
+
+        allowed, required = self.OPERATION_PARAMS[data['operation']]
+        missing = [name for name in required if name not in data]
+        if missing:
+            raise serializers.ValidationError({
+                name: f"This field is required for operation '{data['operation']}'." for name in missing
+            })
+
+        data['params'] = {name: data[name] for name in allowed if name in data}
+        return data
+
+
+class AdminProductImportSerializer(serializers.ModelSerializer):
+    """Задание импорта товаров: загрузка файла и отчет о выполнении"""
+
+    class Meta:
+        model = ProductImport
+        fields = (
+            'id', 'file', 'original_name', 'status', 'dry_run',
+            'processed_rows', 'created_count', 'updated_count', 'error_count',
+            'errors', 'detail', 'created_at', 'started_at', 'finished_at',
+        )
+        read_only_fields = (
+            'original_name', 'status', 'processed_rows', 'created_count', 'updated_count',
+            'error_count', 'errors', 'detail', 'created_at', 'started_at', 'finished_at',
+        )
+
+    def validate_file(self, value):
+        if not value.name.lower().endswith(('.csv', '.xlsx')):
+            raise serializers.ValidationError('Unsupported file type. Only CSV and XLSX are allowed.')
+        return value
+
+
+class StockSyncSerializer(serializers.Serializer):
+    """
+    Остатки и цены со склада: items - список объектов {id или sku, quantity, price}
+    или компактных массивов [id или sku, quantity, price]; price необязательна.
+    """
+    items = serializers.ListField(child=serializers.JSONField(), allow_empty=False)
+
+    def validate_items(self, value):
+        from django.conf import settings
+
+        max_items = getattr(settings, 'STOCK_SYNC_MAX_ITEMS', 10000)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f'Too many items. Maximum is {max_items} per request.')
+
+        result = []
+        errors = {}
+        for index, item in enumerate(value):
+            if isinstance(item, (list, tuple)) and 2 <= len(item) <= 3:
+                key, quantity, price = (list(item) + [None])[:3]
+            elif isinstance(item, dict):
+                key = item.get('id') or item.get('sku')
+                quantity, price = item.get('quantity'), item.get('price')
+            else:
+                errors[index] = 'Expected an object or [id|sku, quantity, price]'
+                continue
+
+            if isinstance(key, int) and not isinstance(key, bool):
+                key = str(key)
+            if not key or not isinstance(key, str):
+                errors[index] = 'id or sku is required'
+                continue
+            if quantity is None and price is None:
+                errors[index] = 'quantity or price is required'
+                continue
+            try:
+                if quantity is not None:
+                    if isinstance(quantity, bool) or (isinstance(quantity, float) and not quantity.is_integer()):
+                        raise ValueError
+                    quantity = int(quantity)
+                    if quantity < 0:
+                        raise ValueError
+                if price is not None:
+                    price = Decimal(str(price)).quantize(Decimal('0.01'))
+                    if not Decimal('0') <= price < Decimal('100000000'):
+                        raise ValueError
+            except (TypeError, ValueError, ArithmeticError):
+                errors[index] = 'quantity must be a non-negative integer, price a non-negative number'
+                continue
+
+            row = {'quantity': quantity, 'price': price}
+            product_id = parse_uuid(key)
+            if product_id is not None:
+                row['id'] = product_id
+            else:
+                row['sku'] = key
+            result.append(row)
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return result
+
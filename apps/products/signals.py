@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_size_tree_version
+from .images import delete_image_files, release_blob, release_category_image
+from .models import Category, Product, ProductImage
+
+
+@receiver(post_save, sender=ProductImage)
+def schedule_image_renditions(sender, instance, created, **kwargs):
+    """После загрузки изображения ставим генерацию вариантов в очередь Celery"""
+    if created and instance.image and not instance.renditions:
+        from .tasks import generate_image_renditions
+        image_id = str(instance.id)
+        transaction.on_commit(lambda: generate_image_renditions.delay(image_id))
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_files(sender, instance, **kwargs):
+    """
+    Освобождает файл изображения. Общий blob удаляется только вместе с
+    последней ссылкой; у старых изображений без blob файл удаляется сразу,
+    если его путь не используется категорией.
+    """
+    if instance.blob_id:
+        release_blob(instance.blob_id)
+        return
+
+    name = instance.image.name if instance.image else None
+    if not name or Category.objects.filter(image=name).exists():
+        return
+    transaction.on_commit(lambda: delete_image_files(name))
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_image(sender, instance, **kwargs):
+    """Запоминает прежний файл изображения категории до сохранения"""
+    if instance._state.adding:
+        instance._previous_image = None
+        return
+    instance._previous_image = (
+        Category.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def release_replaced_category_image(sender, instance, **kwargs):
+    """
+    Category исключена из django_cleanup: ее файл может быть общим blob
+    изображений товаров, поэтому замененный файл освобождаем через проверку ссылок.
+    """
+    previous = getattr(instance, '_previous_image', None)
+    current = instance.image.name if instance.image else None
+    if previous and previous != current:
+        release_category_image(previous)
+
+
+@receiver(post_delete, sender=Category)
+def release_deleted_category_image(sender, instance, **kwargs):
+    if instance.image:
+        release_category_image(instance.image.name)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_size_tree(sender, **kwargs):
+    """Дерево типоразмеров в кэше устаревает с любым изменением товара"""
+    transaction.on_commit(bump_size_tree_version)
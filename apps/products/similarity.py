@@ -0,0 +1,163 @@
+"""
+Похожие товары: предрасчет соседей по типоразмеру.
+
+Весь каталог один раз читается в массивы NumPy (размерные поля, цена,
+категория, бренд), соседи считаются матрично по группам:
+
+- same_size: тот же типоразмер и категория, другой бренд, ближайшие по цене;
+- nearby_sizes: тот же бренд и категория, другой размер, ближайшие по
+  взвешенному расстоянию между размерами.
+
+Соседями становятся только товары в наличии. Списки id записываются в
+ProductSimilarity пачками upsert'ов, страница товара получает их одной
+выборкой по списку первичных ключей.
+"""
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Product, ProductSimilarity
+
+SIZE_FIELDS = ('diameter', 'width', 'profile', 'wheel_width', 'et_offset', 'pcd', 'bolt_count', 'center_bore')
+
+# Разница в поле, равная масштабу, дает единицу расстояния: 1" диаметра
+# примерно как 10 мм ширины шины. Разболтовка весит много - диск с другой
+# разболтовкой не подойдет, поэтому такие соседи уходят в конец списка.
+SIZE_SCALES = np.array([1.0, 10.0, 5.0, 0.5, 5.0, 0.1, 0.2, 1.0])
+
+# Поле заполнено только у одного из товаров (шина против диска)
+MISSING_PENALTY = 10.0
+
+# Сколько элементов матрицы расстояний считать за раз
+MAX_MATRIX_CELLS = 2_000_000
+
+
+def group_slices(keys):
+    """Индексы строк, сгруппированные по одинаковым ключам (строкам матрицы keys)"""
+    if not len(keys):
+        return
+    _unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+    for members in np.split(order, bounds):
+        if len(members) > 1:
+            yield members
+
+
+def nearest(scores, limit):
+    """Для каждой строки - индексы столбцов с наименьшим конечным score (по возрастанию)"""
+    count = min(limit, scores.shape[1])
+    if count < scores.shape[1]:
+        candidates = np.argpartition(scores, count - 1, axis=1)[:, :count]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(candidate_scores, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+    return [row[np.isfinite(row_scores)] for row, row_scores in zip(candidates, candidate_scores)]
+
+
+class SimilarityBuilder:
+
+    def __init__(self, limit=None, batch_size=None):
+        # Храним с запасом: часть соседей к показу может закончиться на складе
+        self.limit = (limit or getattr(settings, 'PRODUCT_SIMILARITY_LIMIT', 12)) * 2
+        self.batch_size = batch_size or getattr(settings, 'PRODUCT_SIMILARITY_BATCH_SIZE', 1000)
+        self.stats = {'products': 0, 'with_same_size': 0, 'with_nearby_sizes': 0}
+
+    def load(self):
+        rows = list(
+            Product.objects.order_by().values_list(
+                'id', 'category_id', 'brand_id', 'price', 'in_stock', 'quantity', *SIZE_FIELDS
+            ).iterator(chunk_size=self.batch_size)
+        )
+        self.ids = [row[0] for row in rows]
+        _categories, self.categories = np.unique([str(row[1]) for row in rows], return_inverse=True)
+        brand_names = [str(row[2]) if row[2] else '' for row in rows]
+        brand_values, brands = np.unique(brand_names, return_inverse=True)
+        # Товары без бренда не считаются одним брендом
+        if len(brand_values) and brand_values[0] == '':
+            brands = brands - 1
+        self.brands = brands
+        self.prices = np.array([float(row[3]) for row in rows], dtype=float)
+        self.available = np.array([bool(row[4] and row[5] > 0) for row in rows], dtype=bool)
+        self.sizes = np.array(
+            [[np.nan if value is None else float(value) for value in row[6:]] for row in rows],
+            dtype=float,
+        ).reshape(len(rows), len(SIZE_FIELDS))
+        self.has_size = ~np.isnan(self.sizes).all(axis=1)
+        self.stats['products'] = len(rows)
+
+    def row_chunks(self, members):
+        step = max(1, MAX_MATRIX_CELLS // (len(members) * len(SIZE_FIELDS)))
+        for start in range(0, len(members), step):
+            yield start, members[start:start + step]
+
+    def same_size(self):
+        """Тот же размер и категория, другой бренд; ближайшие по цене"""
+        result = {}
+        sized = np.flatnonzero(self.has_size)
+        keys = np.column_stack([self.categories[sized], np.nan_to_num(self.sizes[sized], nan=-1e9)])
+        for group in group_slices(keys):
+            members = sized[group]
+            brands = self.brands[members]
+            for start, rows in self.row_chunks(members):
+                row_brands = self.brands[rows][:, None]
+                scores = np.abs(self.prices[rows][:, None] - self.prices[members][None, :])
+                scores[(row_brands == brands[None, :]) & (row_brands >= 0)] = np.inf
+                scores[:, ~self.available[members]] = np.inf
+                scores[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+                for row, neighbors in zip(rows, nearest(scores, self.limit)):
+                    result[row] = members[neighbors]
+        return result
+
+    def nearby_sizes(self):
+        """Тот же бренд и категория, другой размер; ближайшие по взвешенному расстоянию"""
+        result = {}
+        branded = np.flatnonzero(self.has_size & (self.brands >= 0))
+        keys = np.column_stack([self.categories[branded], self.brands[branded]])
+        for group in group_slices(keys):
+            members = branded[group]
+            member_sizes = self.sizes[members] / SIZE_SCALES
+            for start, rows in self.row_chunks(members):
+                row_sizes = member_sizes[start:start + len(rows)]
+                diff = row_sizes[:, None, :] - member_sizes[None, :, :]
+                both_missing = np.isnan(row_sizes)[:, None, :] & np.isnan(member_sizes)[None, :, :]
+                diff[np.isnan(diff)] = MISSING_PENALTY
+                diff[both_missing] = 0
+                scores = np.sqrt((diff ** 2).sum(axis=2))
+                # Тот же размер - это карусель same_size, а не "ближайшие размеры"
+                scores[scores == 0] = np.inf
+                scores[:, ~self.available[members]] = np.inf
+                for row, neighbors in zip(rows, nearest(scores, self.limit)):
+                    result[row] = members[neighbors]
+        return result
+
+    def run(self):
+        self.load()
+        same_size = self.same_size()
+        nearby_sizes = self.nearby_sizes()
+
+        def id_list(indexes):
+            return [str(self.ids[index]) for index in indexes]
+
+        now = timezone.now()
+        for start in range(0, len(self.ids), self.batch_size):
+            records = []
+            for index in range(start, min(start + self.batch_size, len(self.ids))):
+                same = id_list(same_size.get(index, ()))
+                nearby = id_list(nearby_sizes.get(index, ()))
+                self.stats['with_same_size'] += bool(same)
+                self.stats['with_nearby_sizes'] += bool(nearby)
+                records.append(ProductSimilarity(
+                    product_id=self.ids[index], same_size=same, nearby_sizes=nearby, built_at=now
+                ))
+            ProductSimilarity.objects.bulk_create(
+                records,
+                update_conflicts=True,
+                unique_fields=['product'],
+                update_fields=['same_size', 'nearby_sizes', 'built_at'],
+            )
+        return self.stats
@@ -0,0 +1,142 @@
+"""
+XML-карты сайта для товаров, категорий и брендов.
+
+Раздел делится на страницы по SITEMAP_PAGE_SIZE URL по диапазонам id
+(keyset): границы страниц - каждый N-й id, они считаются одним проходом
+по индексу и кэшируются. Подпись страницы (число строк и max(updated_at)
+в диапазоне) - один агрегирующий запрос; по ней страница берется из кэша
+или перестраивается, она же дает lastmod в индексе и ETag, так что роботы
+перезапрашивают только страницы с изменениями.
+"""
+import hashlib
+from datetime import timezone as dt_timezone
+from itertools import islice
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Brand, Category, Product
+
+# Ограничение протокола sitemaps.org
+MAX_URLS_PER_PAGE = 50000
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def w3c_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ') if value else None
+
+
+class SitemapSection:
+
+    def __init__(self, name, model, url_setting):
+        self.name = name
+        self.model = model
+        self.url_setting = url_setting
+
+    @property
+    def page_size(self):
+        return min(getattr(settings, 'SITEMAP_PAGE_SIZE', MAX_URLS_PER_PAGE), MAX_URLS_PER_PAGE)
+
+    def location(self, object_id):
+        return getattr(settings, self.url_setting).format(id=object_id)
+
+    def get_bounds(self, refresh=False):
+        """Первый id каждой страницы"""
+        key = f'sitemap:{self.name}:bounds'
+        bounds = None if refresh else cache.get(key)
+        if bounds is None:
+            ids = self.model.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=self.page_size)
+            bounds = []
+            while True:
+                page = list(islice(ids, self.page_size))
+                if not page:
+                    break
+                bounds.append(page[0])
+            cache.set(key, bounds, timeout=getattr(settings, 'SITEMAP_BOUNDS_TIMEOUT', 60 * 60))
+        return bounds
+
+    def page_queryset(self, bounds, page):
+        """Строки страницы page (с 1); первая страница начинается с минимального id"""
+        queryset = self.model.objects.all()
+        if page > 1:
+            queryset = queryset.filter(id__gte=bounds[page - 1])
+        if page < len(bounds):
+            queryset = queryset.filter(id__lt=bounds[page])
+        return queryset
+
+    def signature(self, bounds, page):
+        return self.page_queryset(bounds, page).aggregate(count=Count('id'), lastmod=Max('updated_at'))
+
+    def pages(self):
+        """[(номер, подпись)]; при переполнении страницы границы пересчитываются"""
+        bounds = self.get_bounds()
+        signatures = [self.signature(bounds, page) for page in range(1, len(bounds) + 1)]
+        if any(signature['count'] > MAX_URLS_PER_PAGE for signature in signatures):
+            bounds = self.get_bounds(refresh=True)
+            signatures = [self.signature(bounds, page) for page in range(1, len(bounds) + 1)]
+        return list(enumerate(signatures, start=1))
+
+    def page_signature(self, page):
+        bounds = self.get_bounds()
+        if not 1 <= page <= len(bounds):
+            return None
+        signature = self.signature(bounds, page)
+        if signature['count'] > MAX_URLS_PER_PAGE:
+            bounds = self.get_bounds(refresh=True)
+            if page > len(bounds):
+                return None
+            signature = self.signature(bounds, page)
+        signature['etag'] = hashlib.md5(
+            f"{bounds[page - 1]}:{signature['count']}:{signature['lastmod']}".encode()
+        ).hexdigest()
+        return signature
+
+    def render_page(self, page, signature):
+        """XML страницы; кэшируется по подписи, поэтому неизменные страницы не перестраиваются"""
+        key = f"sitemap:{self.name}:{page}:{signature['etag']}"
+        content = cache.get(key)
+        if content is not None:
+            return content
+
+        bounds = self.get_bounds()
+        rows = self.page_queryset(bounds, page).order_by('id').values_list(
+            'id', 'updated_at'
+        ).iterator(chunk_size=2000)
+        parts = [XML_HEADER, f'<urlset xmlns="{XMLNS}">\n']
+        for object_id, updated_at in rows:
+            parts.append(
+                f'<url><loc>{escape(self.location(object_id))}</loc>'
+                f'<lastmod>{w3c_datetime(updated_at)}</lastmod></url>\n'
+            )
+        parts.append('</urlset>\n')
+        content = ''.join(parts)
+        cache.set(key, content, timeout=getattr(settings, 'SITEMAP_PAGE_TIMEOUT', 24 * 60 * 60))
+        return content
+
+
+SITEMAP_SECTIONS = {
+    section.name: section
+    for section in (
+        SitemapSection('products', Product, 'STOREFRONT_PRODUCT_URL'),
+        SitemapSection('categories', Category, 'STOREFRONT_CATEGORY_URL'),
+        SitemapSection('brands', Brand, 'STOREFRONT_BRAND_URL'),
+    )
+}
+
+
+def render_index(page_url):
+    """Индекс карт сайта; page_url(section, page) -> абсолютный URL страницы"""
+    parts = [XML_HEADER, f'<sitemapindex xmlns="{XMLNS}">\n']
+    for section in SITEMAP_SECTIONS.values():
+        for page, signature in section.pages():
+            lastmod = w3c_datetime(signature['lastmod'])
+            parts.append(f'<sitemap><loc>{escape(page_url(section.name, page))}</loc>')
+            if lastmod:
+                parts.append(f'<lastmod>{lastmod}</lastmod>')
+            parts.append('</sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
@@ -0,0 +1,98 @@
+"""
+Деревья доступных типоразмеров для виджетов подбора шин и дисков.
+
+Все значения считаются одним GROUP BY по размерным полям товаров в наличии
+и раскладываются в деревья в Python. Результат лежит в кэше до следующего
+изменения товаров: ключ включает версию, которую увеличивают сигналы
+Product и invalidate_catalog_cache (массовые обновления обходят сигналы,
+но сбрасывают кэш каталога).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache import get_size_tree_version
+from .models import Product
+
+TREE_KEY = 'catalog:sizes:{version}:{category}'
+
+SIZE_FIELDS = ('diameter', 'width', 'profile', 'wheel_width', 'et_offset', 'pcd', 'bolt_count', 'center_bore')
+
+
+def plain(value):
+    # Десятичные значения отдаются строками, как в сериализаторах товаров
+    return str(value) if isinstance(value, Decimal) else value
+
+
+def counted(counts):
+    return [{'value': plain(value), 'count': count} for value, count in sorted(counts.items())]
+
+
+def build_size_tree(category_id=None):
+    queryset = Product.objects.filter(in_stock=True, quantity__gt=0)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    rows = queryset.order_by().values(*SIZE_FIELDS).annotate(count=Count('id'))
+
+    tires = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    tire_count = 0
+    wheel_count = 0
+    bolt_patterns = defaultdict(int)
+    wheel_values = {field: defaultdict(int) for field in ('diameter', 'wheel_width', 'et_offset', 'center_bore')}
+
+    for row in rows:
+        count = row['count']
+        if row['width'] is not None and row['profile'] is not None and row['diameter'] is not None:
+            tires[row['diameter']][row['width']][row['profile']] += count
+            tire_count += count
+        if row['bolt_count'] is not None and row['pcd'] is not None:
+            wheel_count += count
+            bolt_patterns[(row['bolt_count'], row['pcd'])] += count
+            for field, values in wheel_values.items():
+                if row[field] is not None:
+                    values[row[field]] += count
+
+    diameters = []
+    for diameter, widths in sorted(tires.items()):
+        width_nodes = []
+        for width, profiles in sorted(widths.items()):
+            width_nodes.append({
+                'value': plain(width),
+                'count': sum(profiles.values()),
+                'profiles': counted(profiles),
+            })
+        diameters.append({
+            'value': diameter,
+            'count': sum(node['count'] for node in width_nodes),
+            'widths': width_nodes,
+        })
+
+    return {
+        'tires': {
+            'count': tire_count,
+            'diameters': diameters,
+        },
+        'wheels': {
+            'count': wheel_count,
+            'bolt_patterns': [
+                {'bolt_count': bolt_count, 'pcd': plain(pcd), 'label': f'{bolt_count}x{pcd}', 'count': count}
+                for (bolt_count, pcd), count in sorted(bolt_patterns.items())
+            ],
+            'diameters': counted(wheel_values['diameter']),
+            'widths': counted(wheel_values['wheel_width']),
+            'et_offsets': counted(wheel_values['et_offset']),
+            'center_bores': counted(wheel_values['center_bore']),
+        },
+    }
+
+
+def get_size_tree(category_id=None):
+    key = TREE_KEY.format(version=get_size_tree_version(), category=category_id or 'all')
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_size_tree(category_id)
+        cache.set(key, tree, timeout=getattr(settings, 'SIZE_TREE_CACHE_TIMEOUT', 24 * 60 * 60))
+    return tree
@@ -0,0 +1,56 @@
+"""Типоразмеры шин и дисков: строковые представления и полный диаметр шины"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+
+MM_PER_INCH = Decimal('25.4')
+OVERALL_DIAMETER_QUANT = Decimal('0.1')
+
+
+def format_tire_size(width, profile, diameter):
+    """Return formatted tire size (width/profile R diameter)"""
+    if width and profile and diameter:
+        return f"{width}/{profile} R{diameter}"
+    return None
+
+
+def format_wheel_size(diameter, wheel_width, et_offset=None, pcd=None, bolt_count=None, center_bore=None):
+    """Return formatted wheel size (diameter x wheel_width ET offset PCD bolt_count x center_bore)"""
+    if diameter and wheel_width:
+        size_parts = [f"{diameter}x{wheel_width}"]
+
+        if et_offset is not None:
+            size_parts.append(f"ET{et_offset}")
+
+        if pcd and bolt_count:
+            size_parts.append(f"{bolt_count}x{pcd}")
+
+        if center_bore:
+            size_parts.append(f"DIA{center_bore}")
+
+        return " ".join(size_parts)
+    return None
+
+
+def tire_overall_diameter(width, profile, diameter):
+    """
+    Полный диаметр шины в мм: посадочный диаметр + две высоты профиля.
+    Для товаров без полного типоразмера шины - None.
+    """
+    if width is None or profile is None or diameter is None:
+        return None
+    sidewall = Decimal(width) * Decimal(profile) / 100
+    return (Decimal(diameter) * MM_PER_INCH + 2 * sidewall).quantize(OVERALL_DIAMETER_QUANT)
+
+
+def overall_diameter_expression():
+    """
+    То же вычисление в SQL для массовых UPDATE, которые обходят Product.save().
+    NULL в любом из полей дает NULL, как и None выше.
+    """
+    return Round(
+        F('diameter') * Value(MM_PER_INCH) + F('width') * F('profile') * Value(Decimal('0.02')),
+        1,
+        output_field=DecimalField(max_digits=6, decimal_places=1),
+    )
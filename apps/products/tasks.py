@@ -0,0 +1,134 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .feeds import FeedError, open_feed, sync_feed
+from .gc import GarbageCollectionInProgress, ImageGarbageCollector
+from .images import build_placeholder, generate_renditions, sniff_image
+from .importers import ImportFileError, ProductImporter
+from .market import MarketFeedBuilder, MarketFeedInProgress
+from .models import ProductImage, ProductImport
+from .similarity import SimilarityBuilder
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_image_renditions(self, image_id):
+    """Генерирует варианты изображения товара вне HTTP-запроса загрузки"""
+    try:
+        product_image = ProductImage.objects.get(id=image_id)
+    except ProductImage.DoesNotExist:
+        return None
+
+    if not product_image.image:
+        return None
+
+    try:
+        renditions = generate_renditions(product_image.image.name)
+    except OSError as exc:
+        raise self.retry(exc=exc)
+
+    fields = {'renditions': renditions}
+    if not product_image.placeholder:
+        # Изображения, загруженные до появления заглушек и размеров
+        try:
+            with product_image.image.open('rb') as image_file:
+                info = sniff_image(image_file)
+                fields.update(
+                    width=info['width'],
+                    height=info['height'],
+                    placeholder=build_placeholder(image_file),
+                )
+        except ValidationError:
+            pass
+
+    ProductImage.objects.filter(id=image_id).update(**fields)
+    return renditions
+
+
+@shared_task
+def collect_orphan_images(grace_hours=None, dry_run=False):
+    """Удаляет неиспользуемые изображения и файлы без записей в БД"""
+    try:
+        stats = ImageGarbageCollector(grace_hours=grace_hours, dry_run=dry_run).run()
+    except GarbageCollectionInProgress as e:
+        logger.info('Image garbage collection skipped: %s', e)
+        return None
+    logger.info('Image garbage collection finished: %s', stats)
+    return stats
+
+
+@shared_task
+def run_product_import(import_id):
+    """Выполняет импорт товаров из загруженного файла, прогресс пишется в ProductImport"""
+    job = ProductImport.objects.filter(id=import_id, status=ProductImport.STATUS_PENDING).first()
+    if job is None:
+        return None
+
+    ProductImport.objects.filter(pk=job.pk).update(
+        status=ProductImport.STATUS_RUNNING, started_at=timezone.now()
+    )
+    importer = ProductImporter(job=job, dry_run=job.dry_run)
+    try:
+        with job.file.open('rb') as f:
+            stats = importer.run(f, job.original_name or job.file.name)
+    except Exception as e:
+        ProductImport.objects.filter(pk=job.pk).update(
+            status=ProductImport.STATUS_FAILED,
+            detail=str(e),
+            finished_at=timezone.now(),
+            errors=importer.errors,
+            **importer.stats
+        )
+        if isinstance(e, ImportFileError):
+            return None
+        raise
+
+    ProductImport.objects.filter(pk=job.pk).update(
+        status=ProductImport.STATUS_FINISHED,
+        finished_at=timezone.now(),
+        errors=importer.errors,
+        **stats
+    )
+    return stats
+
+
+@shared_task
+def sync_supplier_feeds():
+    """Синхронизирует цены и остатки со всеми фидами из SUPPLIER_FEEDS"""
+    results = {}
+    for feed in getattr(settings, 'SUPPLIER_FEEDS', []):
+        name = feed.get('name') or feed['url']
+        try:
+            with open_feed(feed['url']) as source:
+                results[name] = sync_feed(source, sku_field=feed.get('sku_field'))
+        except (OSError, FeedError) as e:
+            logger.error('Supplier feed %s failed: %s', name, e)
+            results[name] = {'error': str(e)}
+            continue
+        logger.info('Supplier feed %s synced: %s', name, results[name])
+    return results
+
+
+@shared_task
+def build_market_feed(full=False):
+    """Пересобирает фид для маркетплейсов; full=True перестраивает все предложения"""
+    try:
+        stats = MarketFeedBuilder(full=full).run()
+    except MarketFeedInProgress:
+        logger.info('Market feed build skipped: previous build is still running')
+        return None
+    logger.info('Market feed built: %s', stats)
+    return stats
+
+
+@shared_task
+def build_product_similarity():
+    """Пересчитывает соседей для каруселей похожих товаров"""
+    stats = SimilarityBuilder().run()
+    logger.info('Product similarity built: %s', stats)
+    return stats
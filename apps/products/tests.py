@@ -1,3 +1,1150 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from xml.etree import ElementTree
 
-# Create your tests here.
+import numpy as np
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import throttling
+
+from . import feeds, gc, importers, market, views_admin
+from .cache import bump_size_tree_version
+from .exports import EXPORT_COLUMNS, iter_csv, iter_export_rows, iter_ndjson
+from .images import blob_path, delete_product_images, delete_rows, rendition_path, save_image_upload
+from .models import (
+    Brand, Category, ImageBlob, MarketFeedOffer, Product, ProductImage, ProductSimilarity, Vehicle,
+)
+from .similarity import SimilarityBuilder, group_slices, nearest
+from .sitemaps import SITEMAP_SECTIONS, render_index, w3c_datetime
+from .size_tree import build_size_tree, get_size_tree
+from .tasks import collect_orphan_images
+
+TESTDATA_DIR = Path(__file__).resolve().parent / 'testdata'
+SAMPLE_FEED = TESTDATA_DIR / 'supplier_feed_sample.xml'
+
+# apply_product_updates пишет одним UPDATE ... FROM (VALUES ...) с приведениями типов PostgreSQL
+requires_postgres = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='apply_product_updates uses PostgreSQL-specific SQL'
+)
+
+
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    """Кэш в памяти процесса: тестам не нужен Redis, и они не видят данные друг друга"""
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    cache.clear()
+
+
+@pytest.fixture
+def category(db):
+    return Category.objects.create(name='Шины', slug='tires')
+
+
+@pytest.fixture
+def catalog_invalidations(monkeypatch):
+    """Сброс кэша каталога требует Redis; в тестах только считаем вызовы"""
+    calls = []
+    monkeypatch.setattr(feeds, 'invalidate_catalog_cache', lambda: calls.append(True))
+    return calls
+
+
+@pytest.fixture
+def feed_products(category):
+    """Товары из sample-фида: первый уже совпадает с фидом, у двух других цена и остаток устарели"""
+    def create(sku, **fields):
+        return Product.objects.create(sku=sku, name=sku, category=category, **fields)
+
+    return {
+        'unchanged': create(
+            'NK-HKPL10-205-55-16', price=Decimal('8450.00'), old_price=Decimal('9100.00'), quantity=12, in_stock=True
+        ),
+        'price': create('MI-XICE-215-60-17', price=Decimal('10990.00'), quantity=5, in_stock=True),
+        'stock': create('RP-R17-7-5x114', price=Decimal('9200.50'), quantity=0, in_stock=False),
+        'not_in_feed': create('NOT-IN-FEED', price=Decimal('100.00'), quantity=1, in_stock=True),
+    }
+
+
+def make_product(category, **fields):
+    fields.setdefault('sku', uuid.uuid4().hex[:12])
+    fields.setdefault('name', fields['sku'])
+    fields.setdefault('price', Decimal('100.00'))
+    fields.setdefault('quantity', 4)
+    return Product.objects.create(category=category, **fields)
+
+
+def snapshot(product):
+    product.refresh_from_db()
+    return product.price, product.old_price, product.quantity, product.in_stock, product.updated_at
+
+
+def test_iter_offers_parses_sample_feed():
+    offers = list(feeds.iter_offers(str(SAMPLE_FEED)))
+
+    assert offers == [
+        {
+            'sku': 'NK-HKPL10-205-55-16',
+            'price': Decimal('8450.00'),
+            'old_price': Decimal('9100.00'),
+            'quantity': 12,
+            'in_stock': True,
+        },
+        {
+            'sku': 'MI-XICE-215-60-17',
+            'price': Decimal('11990.00'),
+            'old_price': None,
+            'quantity': None,
+            'in_stock': False,
+        },
+        # Остаток складывается по outlets, цена с запятой
+        {
+            'sku': 'RP-R17-7-5x114',
+            'price': Decimal('9200.50'),
+            'old_price': None,
+            'quantity': 7,
+            'in_stock': True,
+        },
+    ]
+
+
+def test_sync_feed_dry_run_reports_changes_without_writing(feed_products, catalog_invalidations):
+    before = {key: snapshot(product) for key, product in feed_products.items()}
+
+    stats = feeds.sync_feed(str(SAMPLE_FEED), dry_run=True)
+
+    assert (stats['rows'], stats['matched'], stats['changed'], stats['skipped']) == (3, 3, 2, 0)
+    assert {key: snapshot(product) for key, product in feed_products.items()} == before
+    assert catalog_invalidations == []
+
+
+@requires_postgres
+def test_sync_feed_updates_only_changed_products(feed_products, catalog_invalidations):
+    unchanged = snapshot(feed_products['unchanged'])
+    not_in_feed = snapshot(feed_products['not_in_feed'])
+
+    stats = feeds.sync_feed(str(SAMPLE_FEED))
+
+    assert (stats['rows'], stats['matched'], stats['changed']) == (3, 3, 2)
+    assert catalog_invalidations == [True]
+
+    # Совпадающая с фидом строка и товар вне фида не переписываются
+    assert snapshot(feed_products['unchanged']) == unchanged
+    assert snapshot(feed_products['not_in_feed']) == not_in_feed
+
+    # Количества в предложении нет: остаток прежний, наличие из available
+    price, old_price, quantity, in_stock, _updated_at = snapshot(feed_products['price'])
+    assert (price, old_price, quantity, in_stock) == (Decimal('11990.00'), None, 5, False)
+
+    price, old_price, quantity, in_stock, _updated_at = snapshot(feed_products['stock'])
+    assert (price, old_price, quantity, in_stock) == (Decimal('9200.50'), None, 7, True)
+
+
+@requires_postgres
+def test_sync_feed_second_run_changes_nothing(feed_products, catalog_invalidations):
+    feeds.sync_feed(str(SAMPLE_FEED))
+    after_first = {key: snapshot(product) for key, product in feed_products.items()}
+
+    stats = feeds.sync_feed(str(SAMPLE_FEED))
+
+    assert stats['changed'] == 0
+    assert catalog_invalidations == [True]
+    assert {key: snapshot(product) for key, product in feed_products.items()} == after_first
+
+
+# Массовое изменение товаров
+
+
+@pytest.fixture
+def bulk_update(admin_client):
+    def post(**data):
+        return admin_client.post(reverse('products-admin:admin-product-bulk-update'), data, format='json')
+    return post
+
+
+@pytest.mark.parametrize('filters', [{}, {'catgory': 'typo'}, {'category': ''}])
+def test_bulk_update_rejects_empty_or_unknown_filters(bulk_update, category, filters):
+    product = make_product(category, price=Decimal('100.00'))
+
+    response = bulk_update(filters=filters, operation='set_price', price='1')
+
+    assert response.status_code == 400
+    product.refresh_from_db()
+    assert product.price == Decimal('100.00')
+
+
+def test_bulk_update_rejects_missing_selection(bulk_update, category):
+    assert bulk_update(operation='set_price', price='1').status_code == 400
+    assert bulk_update(ids=[], operation='set_price', price='1').status_code == 400
+
+
+def test_bulk_update_dry_run_counts_filtered_products(bulk_update, category):
+    other = Category.objects.create(name='Диски', slug='wheels')
+    make_product(category)
+    make_product(category)
+    make_product(other)
+
+    response = bulk_update(filters={'category': str(category.id)}, operation='set_price', price='1', dry_run=True)
+
+    assert response.status_code == 200
+    assert response.data['matched'] == 2
+
+
+# Синхронизация остатков со складом (StockSyncView)
+
+
+@pytest.fixture
+def admin_client(db, monkeypatch):
+    # Троттлинг хранит окна в Redis
+    for view in (
+        views_admin.StockSyncView, views_admin.AdminProductBulkUpdateView, views_admin.BulkProductImageUploadView
+    ):
+        monkeypatch.setattr(view, 'throttle_classes', [])
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_superuser(email='admin@example.com', password='x'))
+    return client
+
+
+@pytest.fixture
+def stock_sync(admin_client):
+    def post(items):
+        return admin_client.post(reverse('products-admin:admin-stock-sync'), {'items': items}, format='json')
+    return post
+
+
+def test_stock_sync_resolves_sku_and_id_and_reports_unknown(stock_sync, category, monkeypatch):
+    by_sku = make_product(category, sku='SKU-1')
+    by_id = make_product(category, sku='SKU-2')
+    applied = []
+    monkeypatch.setattr(views_admin, 'apply_product_updates', lambda rows: applied.extend(rows) or len(applied))
+
+    response = stock_sync([
+        ['SKU-1', 3],
+        {'id': str(by_id.id), 'price': '150'},
+        ['UNKNOWN', 1],
+        [str(uuid.uuid4()), 1],
+        # Повтор товара: побеждает последняя позиция
+        {'sku': 'SKU-1', 'quantity': 5, 'price': 90},
+    ])
+
+    assert response.status_code == 200
+    assert response.data['received'] == 5
+    assert response.data['matched'] == 2
+    assert response.data['not_found'][0] == 'UNKNOWN'
+    assert len(response.data['not_found']) == 2
+    assert {row['id']: row for row in applied} == {
+        by_sku.id: {'id': by_sku.id, 'quantity': 5, 'price': Decimal('90.00')},
+        by_id.id: {'id': by_id.id, 'price': Decimal('150.00')},
+    }
+
+
+def test_stock_sync_only_unknown_items_writes_nothing(stock_sync, category):
+    product = make_product(category, sku='SKU-1', quantity=2)
+
+    response = stock_sync([['NOPE', 1], {'sku': 'ALSO-NOPE', 'quantity': 2}])
+
+    assert response.status_code == 200
+    assert (response.data['matched'], response.data['updated']) == (0, 0)
+    assert response.data['not_found'] == ['NOPE', 'ALSO-NOPE']
+    product.refresh_from_db()
+    assert product.quantity == 2
+
+
+def test_stock_sync_rejects_invalid_rows(stock_sync):
+    response = stock_sync([['SKU-1', -1], {'sku': 'SKU-2'}])
+
+    assert response.status_code == 400
+
+
+@requires_postgres
+def test_stock_sync_does_not_rewrite_unchanged_rows(stock_sync, category, monkeypatch):
+    monkeypatch.setattr(views_admin, 'invalidate_catalog_cache', lambda: None)
+    unchanged = make_product(category, sku='SKU-1', quantity=3, price=Decimal('100.00'))
+    changed = make_product(category, sku='SKU-2', quantity=3, in_stock=True)
+    unchanged_before = snapshot(unchanged)
+
+    response = stock_sync([['SKU-1', 3, '100'], ['SKU-2', 0]])
+
+    assert response.status_code == 200
+    assert (response.data['matched'], response.data['updated'], response.data['unchanged']) == (2, 1, 1)
+    assert snapshot(unchanged) == unchanged_before
+    _price, _old_price, quantity, in_stock, _updated_at = snapshot(changed)
+    assert (quantity, in_stock) == (0, False)
+
+
+# Выгрузка каталога
+
+
+def test_export_rows_include_size_strings(category):
+    brand = Brand.objects.create(name='Nokian', category=category)
+    tire = make_product(
+        category, sku='T-1', brand=brand, width=Decimal('205'), profile=55, diameter=16, price=Decimal('5200.50')
+    )
+    make_product(category, sku='W-1', diameter=17, wheel_width=Decimal('7'), et_offset=45, pcd=Decimal('114.3'),
+                 bolt_count=5, center_bore=Decimal('67.1'))
+
+    rows = {row['sku']: row for row in iter_export_rows(Product.objects.all(), chunk_size=1)}
+
+    assert rows['T-1']['id'] == tire.id
+    assert rows['T-1']['category'] == 'Шины'
+    assert rows['T-1']['brand'] == 'Nokian'
+    assert rows['T-1']['price'] == Decimal('5200.50')
+    assert rows['T-1']['tire_size'] == '205.0/55 R16'
+    assert rows['T-1']['wheel_size'] is None
+    assert rows['W-1']['brand'] is None
+    assert rows['W-1']['tire_size'] is None
+    assert rows['W-1']['wheel_size'] == '17x7.0 ET45 5x114.3 DIA67.1'
+
+
+def test_export_csv_has_bom_header_and_empty_cells_for_none(category):
+    make_product(category, sku='T-1', old_price=None)
+
+    content = ''.join(iter_csv(iter_export_rows(Product.objects.all())))
+
+    assert content.startswith('\ufeff')
+    rows = list(csv.DictReader(io.StringIO(content[1:])))
+    assert list(rows[0]) == EXPORT_COLUMNS
+    assert rows[0]['sku'] == 'T-1'
+    assert rows[0]['old_price'] == ''
+    assert rows[0]['in_stock'] == 'True'
+
+
+def test_export_ndjson_emits_one_object_per_line(category):
+    first = make_product(category, name='Шина')
+    make_product(category)
+
+    lines = list(iter_ndjson(iter_export_rows(Product.objects.all())))
+
+    assert len(lines) == 2
+    assert all(line.endswith('\n') for line in lines)
+    rows = {row['id']: row for row in map(json.loads, lines)}
+    assert rows[str(first.id)]['name'] == 'Шина'
+    assert rows[str(first.id)]['price'] == '100.00'
+
+
+# Карты сайта
+
+
+@pytest.fixture
+def sitemap_categories(db, settings):
+    settings.SITEMAP_PAGE_SIZE = 2
+    settings.STOREFRONT_CATEGORY_URL = 'https://shop.example/catalog/{id}'
+    return sorted(
+        (Category.objects.create(name=f'Категория {index}', slug=f'category-{index}') for index in range(5)),
+        key=lambda category: category.id,
+    )
+
+
+def test_sitemap_pages_split_by_id_ranges(sitemap_categories):
+    section = SITEMAP_SECTIONS['categories']
+
+    bounds = section.get_bounds()
+
+    assert bounds == [sitemap_categories[0].id, sitemap_categories[2].id, sitemap_categories[4].id]
+    pages = [
+        sorted(section.page_queryset(bounds, page).values_list('id', flat=True)) for page in range(1, len(bounds) + 1)
+    ]
+    assert pages == [[category.id for category in sitemap_categories[start:start + 2]] for start in (0, 2, 4)]
+
+
+def test_sitemap_page_lists_its_categories(sitemap_categories):
+    section = SITEMAP_SECTIONS['categories']
+
+    content = section.render_page(2, section.page_signature(2))
+
+    assert content.startswith('<?xml')
+    assert content.count('<url>') == 2
+    for category in sitemap_categories[2:4]:
+        assert f'<loc>https://shop.example/catalog/{category.id}</loc>' in content
+    assert str(sitemap_categories[0].id) not in content
+
+
+def test_sitemap_page_signature_changes_only_for_updated_page(sitemap_categories):
+    section = SITEMAP_SECTIONS['categories']
+    before = [section.page_signature(page)['etag'] for page in (1, 2, 3)]
+
+    updated = sitemap_categories[3]
+    Category.objects.filter(pk=updated.pk).update(updated_at=updated.updated_at + timedelta(days=1))
+
+    after = [section.page_signature(page)['etag'] for page in (1, 2, 3)]
+    assert after[0] == before[0]
+    assert after[1] != before[1]
+    assert after[2] == before[2]
+    assert section.page_signature(4) is None
+    assert section.page_signature(0) is None
+
+
+def test_sitemap_index_lists_non_empty_sections(sitemap_categories):
+    content = render_index(lambda section, page: f'https://api.example/sitemap-{section}-{page}.xml')
+
+    assert content.count('<sitemap>') == 3
+    assert 'sitemap-categories-3.xml' in content
+    assert 'sitemap-products-' not in content
+
+
+def test_w3c_datetime_is_utc():
+    value = datetime(2024, 3, 1, 15, 30, tzinfo=dt_timezone(timedelta(hours=3)))
+
+    assert w3c_datetime(value) == '2024-03-01T12:30:00Z'
+    assert w3c_datetime(None) is None
+
+
+# Дерево типоразмеров
+
+
+def test_size_tree_counts_only_available_products(category):
+    for width, profile, diameter in ((205, 55, 16), (205, 55, 16), (205, 60, 16), (225, 45, 17)):
+        make_product(category, width=Decimal(width), profile=profile, diameter=diameter)
+    make_product(category, width=Decimal('195'), profile=65, diameter=15, quantity=0)
+    make_product(category, diameter=17, wheel_width=Decimal('7'), pcd=Decimal('114.3'), bolt_count=5, et_offset=45)
+
+    tree = build_size_tree()
+
+    assert tree['tires']['count'] == 4
+    assert tree['tires']['diameters'] == [
+        {
+            'value': 16,
+            'count': 3,
+            'widths': [
+                {'value': '205.0', 'count': 3, 'profiles': [{'value': 55, 'count': 2}, {'value': 60, 'count': 1}]},
+            ],
+        },
+        {
+            'value': 17,
+            'count': 1,
+            'widths': [{'value': '225.0', 'count': 1, 'profiles': [{'value': 45, 'count': 1}]}],
+        },
+    ]
+    assert tree['wheels']['count'] == 1
+    assert tree['wheels']['bolt_patterns'] == [{'bolt_count': 5, 'pcd': '114.3', 'label': '5x114.3', 'count': 1}]
+    assert tree['wheels']['diameters'] == [{'value': 17, 'count': 1}]
+    assert tree['wheels']['et_offsets'] == [{'value': 45, 'count': 1}]
+
+
+def test_size_tree_filters_by_category(category):
+    other = Category.objects.create(name='Диски', slug='wheels')
+    make_product(category, width=Decimal('205'), profile=55, diameter=16)
+    make_product(other, width=Decimal('225'), profile=45, diameter=17)
+
+    tree = build_size_tree(category.id)
+
+    assert [node['value'] for node in tree['tires']['diameters']] == [16]
+
+
+def test_size_tree_is_cached_until_version_bump(category):
+    make_product(category, width=Decimal('205'), profile=55, diameter=16)
+    assert get_size_tree()['tires']['count'] == 1
+
+    # Сигналы увеличивают версию только после коммита, которого в тесте нет
+    make_product(category, width=Decimal('205'), profile=55, diameter=16)
+    assert get_size_tree()['tires']['count'] == 1
+
+    bump_size_tree_version()
+    assert get_size_tree()['tires']['count'] == 2
+
+
+# Похожие товары
+
+
+def test_group_slices_returns_groups_of_equal_keys():
+    keys = np.array([[1, 0], [2, 0], [1, 0], [3, 0], [2, 0]])
+
+    groups = sorted(sorted(group.tolist()) for group in group_slices(keys))
+
+    assert groups == [[0, 2], [1, 4]]
+    assert list(group_slices(np.empty((0, 2)))) == []
+
+
+def test_nearest_orders_by_score_and_drops_infinite():
+    scores = np.array([
+        [np.inf, 3.0, 1.0, 2.0],
+        [5.0, np.inf, np.inf, np.inf],
+    ])
+
+    first, second = nearest(scores, limit=2)
+
+    assert first.tolist() == [2, 3]
+    assert second.tolist() == [0]
+
+
+def test_similarity_builder_finds_same_size_and_nearby_sizes(category):
+    nokian = Brand.objects.create(name='Nokian', category=category)
+    michelin = Brand.objects.create(name='Michelin', category=category)
+    size = {'width': Decimal('205'), 'profile': 55, 'diameter': 16}
+    nokian_205 = make_product(category, brand=nokian, price=Decimal('100'), **size)
+    michelin_205 = make_product(category, brand=michelin, price=Decimal('120'), **size)
+    michelin_205_expensive = make_product(category, brand=michelin, price=Decimal('300'), **size)
+    michelin_205_sold_out = make_product(category, brand=michelin, price=Decimal('101'), quantity=0, **size)
+    nokian_215 = make_product(category, brand=nokian, width=Decimal('215'), profile=55, diameter=16)
+    nokian_225 = make_product(category, brand=nokian, width=Decimal('225'), profile=45, diameter=18)
+
+    stats = SimilarityBuilder(limit=5).run()
+
+    assert stats['products'] == 6
+    similar = {row.product_id: row for row in ProductSimilarity.objects.all()}
+    # Другие бренды того же размера, ближайшие по цене; закончившиеся не предлагаются
+    assert similar[nokian_205.id].same_size == [str(michelin_205.id), str(michelin_205_expensive.id)]
+    assert similar[michelin_205.id].same_size == [str(nokian_205.id)]
+    # Тот же бренд, ближайшие размеры первыми
+    assert similar[nokian_205.id].nearby_sizes == [str(nokian_215.id), str(nokian_225.id)]
+    assert similar[michelin_205.id].nearby_sizes == []
+    assert similar[michelin_205_sold_out.id].same_size == [str(nokian_205.id)]
+
+
+# Сборка мусора изображений
+
+
+@pytest.fixture
+def media(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    def write(name, age_hours=48):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'image')
+        mtime = time.time() - age_hours * 3600
+        os.utime(path, (mtime, mtime))
+        return name
+    write.root = tmp_path
+    return write
+
+
+@pytest.fixture
+def gc_catalog(media, category):
+    """Файлы и строки с ссылками и без; "старые" - старше grace-периода в 24 часа"""
+    old = datetime.now(dt_timezone.utc) - timedelta(hours=48)
+    blob = ImageBlob.objects.create(sha256='a' * 64, file=media('products/blobs/aa/blob.jpg'), ref_count=1)
+    product = make_product(category)
+    ProductImage.objects.create(product=product, image=blob.file.name, blob=blob)
+    old_orphan = ProductImage.objects.create(image=media('products/old-orphan.jpg'))
+    new_orphan = ProductImage.objects.create(image=media('products/new-orphan.jpg'))
+    ProductImage.objects.filter(pk=old_orphan.pk).update(created_at=old)
+    category.image = media('categories/category.jpg')
+    category.save()
+    return {
+        'blob': blob,
+        'old_orphan': old_orphan,
+        'new_orphan': new_orphan,
+        'stray_old': media('products/stray-old.jpg'),
+        'stray_new': media('products/stray-new.jpg', age_hours=1),
+    }
+
+
+def media_files(media):
+    return sorted(
+        str(path.relative_to(media.root)).replace(os.sep, '/') for path in media.root.rglob('*') if path.is_file()
+    )
+
+
+def test_gc_deletes_only_unreferenced_files_older_than_grace(media, gc_catalog):
+    stats = gc.ImageGarbageCollector(grace_hours=24).run()
+
+    assert stats['status'] == 'finished'
+    assert stats['rows_deleted'] == 1
+    assert not ProductImage.objects.filter(pk=gc_catalog['old_orphan'].pk).exists()
+    assert ProductImage.objects.filter(pk=gc_catalog['new_orphan'].pk).exists()
+    # Файл удаленной строки и старый файл без строки уходят; blob с ссылкой,
+    # изображение категории и свежие файлы остаются
+    assert media_files(media) == [
+        'categories/category.jpg',
+        'products/blobs/aa/blob.jpg',
+        'products/new-orphan.jpg',
+        'products/stray-new.jpg',
+    ]
+    assert ImageBlob.objects.filter(pk=gc_catalog['blob'].pk).exists()
+    assert gc.get_progress()['status'] == 'finished'
+    assert not gc.is_running()
+
+
+def test_gc_dry_run_deletes_nothing(media, gc_catalog):
+    before = media_files(media)
+
+    stats = gc.ImageGarbageCollector(grace_hours=24, dry_run=True).run()
+
+    assert stats['rows_deleted'] == 1
+    # Строка в dry-run не удалена, поэтому ее файл еще считается используемым
+    assert stats['files_deleted'] == 1
+    assert media_files(media) == before
+    assert ProductImage.objects.filter(pk=gc_catalog['old_orphan'].pk).exists()
+
+
+def test_gc_deletes_blob_without_references(media, category):
+    blob = ImageBlob.objects.create(sha256='b' * 64, file=media('products/blobs/bb/blob.jpg'), ref_count=0)
+    ImageBlob.objects.filter(pk=blob.pk).update(created_at=datetime.now(dt_timezone.utc) - timedelta(hours=48))
+
+    stats = gc.ImageGarbageCollector(grace_hours=24).run()
+
+    assert stats['blobs_deleted'] == 1
+    assert 'products/blobs/bb/blob.jpg' not in media_files(media)
+
+
+def test_gc_refuses_to_run_twice(media, db):
+    cache.set(gc.LOCK_KEY, 'other-run', timeout=60)
+
+    with pytest.raises(gc.GarbageCollectionInProgress):
+        gc.ImageGarbageCollector().run()
+    # Задача Celery пропускает запуск вместо ошибки
+    assert collect_orphan_images() is None
+    assert cache.get(gc.LOCK_KEY) == 'other-run'
+
+
+def test_gc_stops_when_lock_is_taken_over(media, db):
+    collector = gc.ImageGarbageCollector()
+    cache.set(gc.LOCK_KEY, collector.lock_token, timeout=60)
+    collector.extend_lock()
+
+    cache.set(gc.LOCK_KEY, 'other-run', timeout=60)
+    with pytest.raises(gc.GarbageCollectionInProgress):
+        collector.extend_lock()
+    collector.release_lock()
+    assert cache.get(gc.LOCK_KEY) == 'other-run'
+
+
+def test_gc_progress_of_killed_run_is_reported_failed(db):
+    cache.set(gc.PROGRESS_KEY, {'status': 'running'}, timeout=None)
+
+    assert gc.get_progress()['status'] == 'failed'
+
+
+# Загрузка изображений
+
+
+def jpeg_upload(name='photo.jpg', color=(200, 30, 30)):
+    content = io.BytesIO()
+    Image.new('RGB', (40, 20), color).save(content, 'JPEG')
+    return SimpleUploadedFile(name, content.getvalue(), content_type='image/jpeg')
+
+
+def test_upload_is_hashed_in_the_pass_that_writes_it(media, db, monkeypatch):
+    upload = jpeg_upload()
+    data = upload.read()
+    passes = []
+    chunks = upload.chunks
+
+    def counting_chunks(*args, **kwargs):
+        passes.append(1)
+        return chunks(*args, **kwargs)
+
+    monkeypatch.setattr(upload, 'chunks', counting_chunks)
+
+    image = save_image_upload(upload)
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert len(passes) == 1
+    assert (image.sha256, image.file_size) == (sha256, len(data))
+    assert (image.width, image.height, image.format) == (40, 20, 'JPEG')
+    assert image.placeholder.startswith('data:image/webp;base64,')
+    # Временный файл стал файлом blob, на диске больше ничего нет
+    assert media_files(media) == [blob_path(sha256, 'JPEG')]
+    assert image.blob.file.name == blob_path(sha256, 'JPEG')
+
+
+# Лимиты запросов каталога
+
+
+@pytest.fixture
+def catalog_throttles(fake_redis, monkeypatch):
+    """Маленькие лимиты каталога поверх fakeredis со скриптами Lua"""
+    monkeypatch.setattr(throttling, '_script', None)
+    monkeypatch.setattr(throttling.AnonCatalogRateThrottle, 'rate', '3/min', raising=False)
+    monkeypatch.setattr(throttling.SearchRateThrottle, 'rate', '1/min', raising=False)
+    return fake_redis
+
+
+def test_catalog_throttle_denies_anonymous_client_with_retry_after(catalog_throttles, category):
+    client = APIClient()
+    url = reverse('products:category-list')
+
+    assert [client.get(url).status_code for _ in range(3)] == [200, 200, 200]
+    response = client.get(url)
+
+    assert response.status_code == 429
+    assert 0 < int(response['Retry-After']) <= 60
+    # Другой IP считается отдельно
+    assert client.get(url, REMOTE_ADDR='10.0.0.2').status_code == 200
+
+
+def test_catalog_search_has_its_own_budget(catalog_throttles, category):
+    client = APIClient()
+    url = reverse('products:category-list')
+
+    assert client.get(url, {'search': 'шины'}).status_code == 200
+    assert client.get(url, {'search': 'диски'}).status_code == 429
+    # Просмотр без поиска расходует только общий лимит
+    assert client.get(url).status_code == 200
+
+
+
+# Общие blob'ы изображений
+
+
+def test_duplicate_upload_reuses_blob_and_its_renditions(media, db):
+    first = save_image_upload(jpeg_upload('first.jpg'))
+    renditions = {'card': 'products/blobs/aa/renditions/card.jpg'}
+    ProductImage.objects.filter(pk=first.pk).update(renditions=renditions)
+
+    second = save_image_upload(jpeg_upload('second.jpg'))
+
+    assert second.blob_id == first.blob_id
+    assert second.image.name == first.image.name
+    assert second.renditions == renditions
+    assert ImageBlob.objects.get().ref_count == 2
+    # Вторая загрузка не оставила ни своей копии, ни временного файла
+    assert media_files(media) == [first.image.name]
+
+
+def test_different_upload_gets_its_own_blob(media, db):
+    first = save_image_upload(jpeg_upload(color=(200, 30, 30)))
+    second = save_image_upload(jpeg_upload(color=(30, 30, 200)))
+
+    assert second.blob_id != first.blob_id
+    assert media_files(media) == sorted([first.image.name, second.image.name])
+
+
+def test_releasing_last_reference_deletes_blob_and_file(media, db, django_capture_on_commit_callbacks):
+    first = save_image_upload(jpeg_upload('first.jpg'))
+    second = save_image_upload(jpeg_upload('second.jpg'))
+    name = first.image.name
+    rendition = media(rendition_path(name, 'card', '_webp'))
+
+    with django_capture_on_commit_callbacks(execute=True):
+        first.delete()
+    assert ImageBlob.objects.get().ref_count == 1
+    assert media_files(media) == sorted([name, rendition])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not ImageBlob.objects.exists()
+    # Вместе с оригиналом удаляются и варианты
+    assert media_files(media) == []
+
+
+def test_blob_used_by_category_survives_last_reference(media, category, django_capture_on_commit_callbacks):
+    image = save_image_upload(jpeg_upload())
+    category.image = image.image.name
+    category.save()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        image.delete()
+
+    assert ImageBlob.objects.get().ref_count == 0
+    assert media_files(media) == [image.image.name]
+
+
+def test_delete_product_images_recounts_blobs_and_deletes_released_files(
+    media, category, django_capture_on_commit_callbacks
+):
+    product = make_product(category)
+    shared = save_image_upload(jpeg_upload(color=(200, 30, 30)))
+    kept = save_image_upload(jpeg_upload(color=(200, 30, 30)))
+    single = save_image_upload(jpeg_upload(color=(30, 30, 200)))
+    legacy = ProductImage.objects.create(image=media('products/legacy.jpg'))
+    ProductImage.objects.filter(pk__in=[shared.pk, single.pk, legacy.pk]).update(product=product)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        deleted = delete_product_images(ProductImage.objects.filter(product=product))
+
+    assert deleted == 3
+    assert list(ProductImage.objects.values_list('pk', flat=True)) == [kept.pk]
+    # Blob, на который еще ссылается изображение, остается со счетчиком 1
+    assert list(ImageBlob.objects.values_list('pk', 'ref_count')) == [(kept.blob_id, 1)]
+    assert media_files(media) == [kept.image.name]
+
+
+def test_delete_rows_deletes_in_chunks_without_signals(media, db):
+    images = [ProductImage.objects.create(image=media(f'products/{index}.jpg')) for index in range(3)]
+
+    deleted = delete_rows(ProductImage, [image.pk for image in images[:2]], chunk_size=1)
+
+    assert deleted == 2
+    assert list(ProductImage.objects.values_list('pk', flat=True)) == [images[2].pk]
+    # Сигналы не срабатывают, файлы остаются сборщику мусора
+    assert len(media_files(media)) == 3
+
+
+# Импорт товаров
+
+
+IMPORT_FILE = TESTDATA_DIR / 'products_import.csv'
+MOVE_FILE = TESTDATA_DIR / 'products_move.csv'
+
+
+@pytest.fixture
+def import_invalidations(monkeypatch):
+    calls = []
+    monkeypatch.setattr(importers, 'invalidate_catalog_cache', lambda: calls.append(True))
+    return calls
+
+
+def run_import(path, **options):
+    with open(path, 'rb') as f:
+        return importers.ProductImporter(**options).run(f, path.name)
+
+
+def test_import_upserts_by_sku_and_reports_bad_rows(category, import_invalidations):
+    existing = make_product(category, sku='NK-HKPL10-205-55-16', description='Описание из админки')
+
+    importer = importers.ProductImporter()
+    with open(IMPORT_FILE, 'rb') as f:
+        stats = importer.run(f, IMPORT_FILE.name)
+
+    assert stats == {'processed_rows': 4, 'created_count': 1, 'updated_count': 1, 'error_count': 2}
+    assert [(error['row'], error['sku'], list(error['errors'])) for error in importer.errors] == [
+        (4, 'BAD-PRICE', ['price']),
+        (5, 'NO-CATEGORY', ['category']),
+    ]
+    existing.refresh_from_db()
+    assert (existing.price, existing.quantity, existing.in_stock) == (Decimal('8450.00'), 12, True)
+    assert existing.brand.name == 'Nokian'
+    assert existing.overall_diameter == Decimal('631.9')
+    # Колонки description в файле нет, поле не перезаписано
+    assert existing.description == 'Описание из админки'
+    # Категория найдена по названию, бренд создан в ней
+    created = Product.objects.get(sku='MI-XICE-215-60-17')
+    assert (created.category, created.brand.category, created.in_stock) == (category, category, False)
+    assert sorted(Brand.objects.values_list('name', flat=True)) == ['Michelin', 'Nokian']
+    assert len(import_invalidations) == 1
+
+
+def test_import_second_run_updates_without_duplicates(category, import_invalidations):
+    run_import(IMPORT_FILE)
+
+    stats = run_import(IMPORT_FILE)
+
+    assert (stats['created_count'], stats['updated_count']) == (0, 2)
+    assert Product.objects.count() == 2
+    assert Brand.objects.count() == 2
+
+
+def test_import_dry_run_writes_nothing(category, import_invalidations):
+    stats = run_import(IMPORT_FILE, dry_run=True)
+
+    assert (stats['created_count'], stats['error_count']) == (2, 2)
+    assert not Product.objects.exists()
+    assert not Brand.objects.exists()
+    assert import_invalidations == []
+
+
+def test_import_moving_product_clears_brand_of_old_category(category, import_invalidations):
+    wheels = Category.objects.create(name='Диски', slug='wheels')
+    brand = Brand.objects.create(name='Nokian', category=category)
+    moved = make_product(category, sku='MOVED', brand=brand)
+    stayed = make_product(category, sku='STAYED', brand=brand)
+
+    stats = run_import(MOVE_FILE)
+
+    assert stats['updated_count'] == 2
+    moved.refresh_from_db()
+    stayed.refresh_from_db()
+    assert (moved.category, moved.brand) == (wheels, None)
+    # Бренда в файле нет: у товара, оставшегося в категории, он сохраняется
+    assert (stayed.category, stayed.brand) == (category, brand)
+
+
+# Фид Яндекс Маркета
+
+
+@pytest.fixture
+def market_catalog(settings, tmp_path, category):
+    settings.MEDIA_ROOT = str(tmp_path)
+    brand = Brand.objects.create(name='Nokian', category=category)
+    return {
+        'brand': brand,
+        'tire': make_product(category, sku='NK-1', name='Nokian Hakkapeliitta & Co <R16>', brand=brand, width=205),
+        'other': make_product(category, sku='MI-1', price=Decimal('10990.00'), quantity=0),
+    }
+
+
+def read_market_feed():
+    root = ElementTree.parse(market.feed_path()).getroot()
+    offers = {offer.findtext('vendorCode'): offer for offer in root.iter('offer')}
+    return root, offers
+
+
+def test_market_feed_is_valid_yml_with_all_offers(market_catalog, category):
+    stats = market.MarketFeedBuilder().run()
+
+    assert (stats['rendered'], stats['offers'], stats['written']) == (2, 2, True)
+    root, offers = read_market_feed()
+    assert root.tag == 'yml_catalog'
+    assert [item.text for item in root.iter('category')] == [category.name]
+    tire = offers['NK-1']
+    # Спецсимволы в названии экранированы, фрагмент разбирается как XML
+    assert tire.findtext('name') == 'Nokian Hakkapeliitta & Co <R16>'
+    assert tire.findtext('vendor') == 'Nokian'
+    assert tire.findtext('categoryId') == market.category_feed_id(category.id)
+    assert tire.find("param[@name='Ширина']").text == '205.0'
+    assert (offers['MI-1'].get('available'), offers['MI-1'].findtext('price')) == ('false', '10990.00')
+
+
+def test_market_feed_without_changes_is_not_rewritten(market_catalog):
+    market.MarketFeedBuilder().run()
+    mtime = os.stat(market.feed_path()).st_mtime_ns
+
+    stats = market.MarketFeedBuilder().run()
+
+    assert (stats['rendered'], stats['written']) == (0, False)
+    assert os.stat(market.feed_path()).st_mtime_ns == mtime
+
+
+def test_market_feed_rerenders_only_changed_products(market_catalog):
+    market.MarketFeedBuilder().run()
+    other_rendered_at = MarketFeedOffer.objects.get(product=market_catalog['other']).rendered_at
+    tire = market_catalog['tire']
+    tire.price = Decimal('7990.00')
+    tire.save()
+
+    stats = market.MarketFeedBuilder().run()
+
+    assert (stats['rendered'], stats['written']) == (1, True)
+    assert read_market_feed()[1]['NK-1'].findtext('price') == '7990.00'
+    assert MarketFeedOffer.objects.get(product=market_catalog['other']).rendered_at == other_rendered_at
+
+
+def test_market_feed_rerenders_products_of_changed_brand(market_catalog):
+    market.MarketFeedBuilder().run()
+    brand = market_catalog['brand']
+    brand.name = 'Nokian Tyres'
+    brand.save()
+
+    stats = market.MarketFeedBuilder().run()
+
+    assert stats['rendered'] == 1
+    assert read_market_feed()[1]['NK-1'].findtext('vendor') == 'Nokian Tyres'
+
+
+def test_market_feed_drops_deleted_products(market_catalog):
+    market.MarketFeedBuilder().run()
+    market_catalog['other'].delete()
+
+    stats = market.MarketFeedBuilder().run()
+
+    assert (stats['rendered'], stats['offers'], stats['written']) == (0, 1, True)
+    assert list(read_market_feed()[1]) == ['NK-1']
+
+
+# Шины-аналоги
+
+
+@pytest.fixture
+def catalog_client(fake_redis, monkeypatch):
+    """Анонимный клиент каталога; лимиты запросов работают на fakeredis"""
+    monkeypatch.setattr(throttling, '_script', None)
+    return APIClient()
+
+
+@pytest.fixture
+def alternatives(category):
+    def tire(sku, width, profile, diameter, **fields):
+        return make_product(category, sku=sku, width=width, profile=profile, diameter=diameter, **fields)
+
+    return {
+        # 205/55 R16: полный диаметр 631.9 мм
+        'reference': tire('REF', 205, 55, 16, quantity=0, in_stock=False),
+        'same_size': tire('SAME', 205, 55, 16, quantity=0, in_stock=False),
+        'close_small': tire('R17', 225, 45, 17, price=Decimal('120.00')),  # 634.3, +0.38%
+        'close_large': tire('R15', 195, 65, 15, price=Decimal('90.00')),  # 634.5, +0.41%
+        'edge': tire('WIDE', 215, 55, 16),  # 642.9, +1.74%
+        'far': tire('FAR', 235, 60, 18),  # 739.2, +16.98%
+    }
+
+
+def get_alternatives(client, product, **params):
+    return client.get(reverse('products:product-alternatives', kwargs={'id': product.id}), params)
+
+
+def test_alternatives_are_in_stock_within_tolerance_nearest_first(catalog_client, alternatives):
+    response = get_alternatives(catalog_client, alternatives['reference'])
+
+    assert response.status_code == 200
+    assert [(item['name'], item['deviation_percent']) for item in response.data] == [
+        ('R17', 0.38),
+        ('R15', 0.41),
+        ('WIDE', 1.74),
+    ]
+    assert response.data[0]['overall_diameter'] == '634.3'
+
+
+def test_alternatives_tolerance_narrows_the_band(catalog_client, alternatives):
+    response = get_alternatives(catalog_client, alternatives['reference'], tolerance='1')
+
+    assert [item['name'] for item in response.data] == ['R17', 'R15']
+    response = get_alternatives(catalog_client, alternatives['reference'], tolerance='1.75')
+    assert [item['name'] for item in response.data] == ['R17', 'R15', 'WIDE']
+
+
+def test_alternatives_limit(catalog_client, alternatives):
+    response = get_alternatives(catalog_client, alternatives['reference'], limit=1)
+
+    assert [item['name'] for item in response.data] == ['R17']
+
+
+@pytest.mark.parametrize('params', [{'tolerance': '0'}, {'tolerance': '11'}, {'tolerance': 'nan'}, {'limit': '0'}])
+def test_alternatives_reject_invalid_params(catalog_client, alternatives, params):
+    response = get_alternatives(catalog_client, alternatives['reference'], **params)
+
+    assert response.status_code == 400
+
+
+def test_alternatives_need_full_tire_size(catalog_client, category):
+    wheel = make_product(category, diameter=16)
+
+    assert get_alternatives(catalog_client, wheel).status_code == 404
+
+
+# Подбор дисков
+
+
+@pytest.fixture
+def vehicle(db):
+    return Vehicle.objects.create(
+        make='Toyota', model='Camry', generation='XV70', year_from=2017, year_to=2023,
+        bolt_count=5, pcd=Decimal('114.3'), center_bore=Decimal('60.1'), et_min=35, et_max=45,
+        min_diameter=16, max_diameter=18,
+    )
+
+
+@pytest.fixture
+def wheels(category):
+    def wheel(name, bolt_count=5, pcd='114.3', center_bore='67.1', et_offset=40, diameter=17, **fields):
+        return make_product(
+            category, name=name, bolt_count=bolt_count, pcd=Decimal(pcd), center_bore=Decimal(center_bore),
+            et_offset=et_offset, diameter=diameter, **fields
+        )
+
+    return {
+        'fits': wheel('FITS', price=Decimal('300.00')),
+        'small_bore': wheel('SMALL-BORE', center_bore='56.1'),
+        'exact_bore': wheel('EXACT-BORE', center_bore='60.1', et_offset=35, diameter=15, price=Decimal('200.00')),
+        'high_et': wheel('HIGH-ET', et_offset=50),
+        'other_pcd': wheel('OTHER-PCD', pcd='112'),
+        'four_bolts': wheel('FOUR-BOLTS', bolt_count=4),
+        'sold_out': wheel('SOLD-OUT', quantity=0, in_stock=False),
+    }
+
+
+def get_fitment(client, **params):
+    return client.get(reverse('products:wheel-fitment'), params)
+
+
+def fitment_names(response):
+    assert response.status_code == 200, response.data
+    return [item['name'] for item in response.data['results']]
+
+
+def test_fitment_matches_bolt_pattern_bore_and_offset(catalog_client, wheels):
+    response = get_fitment(catalog_client, bolt_count=5, pcd='114.3', center_bore='60.1', et_min=35, et_max=45)
+
+    # DIA не меньше ступицы, ET включительно по границам; дешевле первыми
+    assert fitment_names(response) == ['EXACT-BORE', 'FITS']
+
+
+def test_fitment_can_include_sold_out_wheels(catalog_client, wheels):
+    response = get_fitment(catalog_client, bolt_count=5, pcd='114.3', et_max=45, diameter=17, in_stock='false')
+
+    assert sorted(fitment_names(response)) == ['FITS', 'SMALL-BORE', 'SOLD-OUT']
+
+
+def test_fitment_takes_missing_params_from_vehicle(catalog_client, wheels, vehicle):
+    response = get_fitment(catalog_client, vehicle=vehicle.id)
+
+    # 15" диск вне диапазона диаметров автомобиля
+    assert fitment_names(response) == ['FITS']
+    # Явный параметр важнее справочника
+    response = get_fitment(catalog_client, vehicle=vehicle.id, et_max=50, ordering='-price')
+    assert fitment_names(response) == ['FITS', 'HIGH-ET']
+
+
+@pytest.mark.parametrize('params, field', [
+    ({'pcd': '114.3'}, 'bolt_count'),
+    ({'bolt_count': 5, 'pcd': '114.3', 'et_min': 45, 'et_max': 35}, 'et_max'),
+])
+def test_fitment_rejects_invalid_params(catalog_client, params, field):
+    response = get_fitment(catalog_client, **params)
+
+    assert response.status_code == 400
+    assert field in response.data
+
+
+def test_fitment_rejects_diameter_outside_vehicle_range(catalog_client, vehicle):
+    response = get_fitment(catalog_client, vehicle=vehicle.id, diameter=15)
+
+    assert response.status_code == 400
+    assert 'diameter' in response.data
+
+
+def test_vehicle_lookup_by_make_model_and_year(catalog_client, vehicle):
+    Vehicle.objects.create(
+        make='Toyota', model='Camry', generation='XV50', year_from=2011, year_to=2017,
+        bolt_count=5, pcd=Decimal('114.3'), center_bore=Decimal('60.1'), et_min=35, et_max=50,
+    )
+    Vehicle.objects.create(
+        make='Kia', model='Rio', bolt_count=4, pcd=Decimal('100'), center_bore=Decimal('54.1'), et_min=40, et_max=48,
+    )
+    url = reverse('products:vehicle-list')
+
+    response = catalog_client.get(url, {'make': 'toyota', 'model': 'CAMRY', 'year': 2020})
+    assert [item['generation'] for item in response.data['results']] == ['XV70']
+    # Год на стыке поколений подходит обоим
+    response = catalog_client.get(url, {'make': 'toyota', 'year': 2017})
+    assert [item['generation'] for item in response.data['results']] == ['XV50', 'XV70']
+    response = catalog_client.get(url, {'search': 'rio'})
+    assert [item['make'] for item in response.data['results']] == ['Kia']
+
+
+# Пакетная загрузка изображений
+
+
+def bulk_upload(client, *files):
+    return client.post(reverse('products-admin:admin-product-image-bulk-upload'), {'images': list(files)}, format='multipart')
+
+
+def test_bulk_upload_reports_each_file(admin_client, media):
+    text = SimpleUploadedFile('notes.txt', b'not an image', content_type='text/plain')
+
+    response = bulk_upload(admin_client, jpeg_upload('photo.jpg'), text)
+
+    assert response.status_code == 201
+    ok, failed = response.data['results']
+    assert (ok['filename'], ok['ok'], ok['width'], ok['height']) == ('photo.jpg', True, 40, 20)
+    assert response.data['ids'] == [ok['id']]
+    assert failed == {
+        'filename': 'notes.txt',
+        'ok': False,
+        'error': 'Unsupported file type. Only JPEG, PNG and GIF are allowed.',
+    }
+
+
+def test_bulk_upload_reports_unreadable_file(admin_client, media, monkeypatch):
+    def unreadable(image_file):
+        raise OSError('read error')
+
+    monkeypatch.setattr(views_admin, 'prepare_image_upload', unreadable)
+
+    response = bulk_upload(admin_client, jpeg_upload())
+
+    assert response.status_code == 400
+    assert response.data['results'][0]['error'] == 'Invalid image file'
+
+
+def test_bulk_upload_does_not_hide_bugs(admin_client, media, monkeypatch):
+    def broken(image_file):
+        raise KeyError('format')
+
+    monkeypatch.setattr(views_admin, 'prepare_image_upload', broken)
+
+    with pytest.raises(KeyError):
+        bulk_upload(admin_client, jpeg_upload())
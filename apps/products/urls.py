@@ -4,8 +4,14 @@ from .views import (
     CategoryDetailView,
     ProductListView,
     ProductDetailView,
+    ProductAlternativesView,
+    ProductSimilarView,
+    WheelFitmentView,
+    ProductSizesView,
+    VehicleListView,
     BrandListView,
     BrandDetailView,
+    market_feed,
 )
 
 app_name = 'products'
@@ -20,7 +26,19 @@ urlpatterns = [
     path('brands/', BrandListView.as_view(), name='brand-list'),
     path('brands/<uuid:id>/', BrandDetailView.as_view(), name='brand-detail'),
     
+    # Marketplace feed (YML)
+    path('feeds/market.yml', market_feed, name='market-feed'),
+
+    # Size selector values (tires and wheels)
+    path('sizes/', ProductSizesView.as_view(), name='product-sizes'),
+
+    # Wheel fitment by vehicle
+    path('vehicles/', VehicleListView.as_view(), name='vehicle-list'),
+    path('fitment/', WheelFitmentView.as_view(), name='wheel-fitment'),
+
     # Product endpoints
     path('', ProductListView.as_view(), name='product-list'),
     path('<uuid:id>/', ProductDetailView.as_view(), name='product-detail'),
+    path('<uuid:id>/alternatives/', ProductAlternativesView.as_view(), name='product-alternatives'),
+    path('<uuid:id>/similar/', ProductSimilarView.as_view(), name='product-similar'),
 ] 
\ No newline at end of file
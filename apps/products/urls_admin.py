@@ -3,12 +3,18 @@ from .views_admin import (
     DashboardView,
     AdminProductListView,
     AdminProductDetailView,
+    AdminProductBulkUpdateView,
+    AdminProductExportView,
+    ProductImportListView,
+    StockSyncView,
+    ProductImportDetailView,
     ImageUploadView,
     CategoryImageUploadView,
     AdminCategoryListView,
     AdminCategorySelectView,
     AdminCategoryDetailView,
     ProductImageUploadView,
+    BulkProductImageUploadView,
     AdminBrandListView,
     ProductImageDeleteView,
     AdminProductImageListView,
@@ -20,9 +26,15 @@ app_name = 'products-admin'
 urlpatterns = [
     path('dashboard/', DashboardView.as_view(), name='admin-dashboard'),
     path('products/', AdminProductListView.as_view(), name='admin-product-list'),
+    path('products/bulk/', AdminProductBulkUpdateView.as_view(), name='admin-product-bulk-update'),
+    path('products/export/', AdminProductExportView.as_view(), name='admin-product-export'),
     path('products/<uuid:pk>/', AdminProductDetailView.as_view(), name='admin-product-detail'),
+    path('stock/sync/', StockSyncView.as_view(), name='admin-stock-sync'),
+    path('imports/', ProductImportListView.as_view(), name='admin-product-import-list'),
+    path('imports/<uuid:pk>/', ProductImportDetailView.as_view(), name='admin-product-import-detail'),
     path('upload/image/', ImageUploadView.as_view(), name='admin-image-upload'),
     path('upload/product-image/', ProductImageUploadView.as_view(), name='admin-product-image-upload'),
+    path('upload/product-images/', BulkProductImageUploadView.as_view(), name='admin-product-image-bulk-upload'),
     path('upload/category-image/', CategoryImageUploadView.as_view(), name='admin-category-image-upload'),
     path('categories/', AdminCategoryListView.as_view(), name='admin-category-list'),
     path('categories/select/', AdminCategorySelectView.as_view(), name='admin-category-select'),
@@ -1,19 +1,51 @@
-from django.shortcuts import render
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Abs, Coalesce
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
-from django.db import models
+from django.views.decorators.http import condition, require_safe
 from django_filters import rest_framework as filters
 from rest_framework import generics, permissions
+from rest_framework.exceptions import NotFound
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Category, Product, Brand
+from apps.shopping.models import CartItem
+from apps.wishlist.models import Favorite
+from core.throttling import (
+    AnonCatalogRateThrottle,
+    SearchRateThrottle,
+    UserSlidingWindowRateThrottle,
+)
+
+from .cache import CATALOG_CACHE_PREFIX
+from .market import feed_path
+from .models import Category, Product, ProductSimilarity, Brand, Vehicle
 from .serializers import (
     CategorySerializer,
     ProductListSerializer,
     ProductDetailSerializer,
+    ProductListUserStateSerializer,
+    ProductDetailUserStateSerializer,
+    ProductAlternativeSerializer,
+    ProductAlternativesParamsSerializer,
+    VehicleSerializer,
+    WheelFitmentSerializer,
     BrandSerializer,
 )
-
+from .sitemaps import SITEMAP_SECTIONS, render_index
+from .size_tree import get_size_tree
 
 class CategoryFilter(filters.FilterSet):
     class Meta:
@@ -87,29 +119,83 @@ class ProductFilter(filters.FilterSet):
         return queryset
 
 
-class CategoryListView(generics.ListAPIView):
+class ProductUserStateMixin:
+    """
+    По запросу (?with_user_state=true) добавляет к товарам is_favorite и
+    in_cart_quantity для авторизованного пользователя через Exists/Subquery.
+    Такие ответы персональные, поэтому они идут мимо cache_page и помечаются
+    как private; анонимные ответы по-прежнему кэшируются общим кэшем.
+    """
+    user_state_param = 'with_user_state'
+    user_state_serializer_class = None
+
+    def wants_user_state(self):
+        value = self.request.query_params.get(self.user_state_param, '')
+        return value.lower() in ('1', 'true') and self.request.user.is_authenticated
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.wants_user_state():
+            return queryset
+
+        user = self.request.user
+        return queryset.annotate(
+            is_favorite=Exists(
+                Favorite.objects.filter(user=user, product=OuterRef('pk'))
+            ),
+            in_cart_quantity=Coalesce(
+                Subquery(
+                    CartItem.objects.filter(
+                        user=user, product=OuterRef('pk')
+                    ).values('quantity')[:1]
+                ),
+                Value(0)
+            ),
+        )
+
+    def get_serializer_class(self):
+        if self.wants_user_state():
+            return self.user_state_serializer_class
+        return super().get_serializer_class()
+
+    def get(self, request, *args, **kwargs):
+        if not self.wants_user_state():
+            return self.cached_get(request, *args, **kwargs)
+
+        response = super().get(request, *args, **kwargs)
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class CatalogThrottleMixin:
+    """Лимиты для публичного каталога: анонимный просмотр по IP и отдельный бюджет на поиск"""
+    throttle_classes = (AnonCatalogRateThrottle, UserSlidingWindowRateThrottle, SearchRateThrottle)
+
+
+class CategoryListView(CatalogThrottleMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (permissions.AllowAny,)
     filterset_class = CategoryFilter
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
     def get(self, *args, **kwargs):
         return super().get(*args, **kwargs)
 
 
-class CategoryDetailView(generics.RetrieveAPIView):
+class CategoryDetailView(CatalogThrottleMixin, generics.RetrieveAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = (permissions.AllowAny,)
     lookup_field = 'id'
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
     def get(self, *args, **kwargs):
         return super().get(*args, **kwargs)
 
 
-class BrandListView(generics.ListAPIView):
+class BrandListView(CatalogThrottleMixin, generics.ListAPIView):
     queryset = Brand.objects.select_related('category').all()
     serializer_class = BrandSerializer
     permission_classes = (permissions.AllowAny,)
@@ -128,25 +214,26 @@ class BrandListView(generics.ListAPIView):
             
         return queryset
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
     def get(self, *args, **kwargs):
         return super().get(*args, **kwargs)
 
 
-class BrandDetailView(generics.RetrieveAPIView):
+class BrandDetailView(CatalogThrottleMixin, generics.RetrieveAPIView):
     queryset = Brand.objects.select_related('category').all()
     serializer_class = BrandSerializer
     permission_classes = (permissions.AllowAny,)
     lookup_field = 'id'
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
     def get(self, *args, **kwargs):
         return super().get(*args, **kwargs)
 
 
-class ProductListView(generics.ListAPIView):
+class ProductListView(CatalogThrottleMixin, ProductUserStateMixin, generics.ListAPIView):
     queryset = Product.objects.select_related('category', 'brand').prefetch_related('images')
     serializer_class = ProductListSerializer
+    user_state_serializer_class = ProductListUserStateSerializer
     permission_classes = (permissions.AllowAny,)
     filterset_class = ProductFilter
     filter_backends = [filters.DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -167,14 +254,15 @@ class ProductListView(generics.ListAPIView):
         context['request'] = self.request
         return context
 
-    @method_decorator(cache_page(60 * 5))  # Cache for 5 minutes
-    def get(self, *args, **kwargs):
-        return super().get(*args, **kwargs)
+    @method_decorator(cache_page(60 * 5, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 5 minutes
+    def cached_get(self, *args, **kwargs):
+        return super(ProductUserStateMixin, self).get(*args, **kwargs)
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(CatalogThrottleMixin, ProductUserStateMixin, generics.RetrieveAPIView):
     queryset = Product.objects.select_related('category', 'brand').prefetch_related('images')
     serializer_class = ProductDetailSerializer
+    user_state_serializer_class = ProductDetailUserStateSerializer
     permission_classes = (permissions.AllowAny,)
     lookup_field = 'id'
 
@@ -183,6 +271,256 @@ class ProductDetailView(generics.RetrieveAPIView):
         context['request'] = self.request
         return context
 
-    @method_decorator(cache_page(60 * 5))  # Cache for 5 minutes
+    @method_decorator(cache_page(60 * 5, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 5 minutes
+    def cached_get(self, *args, **kwargs):
+        return super(ProductUserStateMixin, self).get(*args, **kwargs)
+
+
+class ProductAlternativesView(CatalogThrottleMixin, generics.ListAPIView):
+    """
+    Шины-аналоги для замены отсутствующего типоразмера: товары в наличии,
+    полный диаметр которых отличается не больше чем на tolerance процентов
+    (по умолчанию 3), ближайшие первыми. Полоса диаметров читается одним
+    диапазоном по частичному индексу product_tire_od_in_stock_idx.
+    """
+    serializer_class = ProductAlternativeSerializer
+    permission_classes = (permissions.AllowAny,)
+    pagination_class = None
+    filter_backends = []
+
+    def get_reference(self):
+        if not hasattr(self, '_reference'):
+            product = get_object_or_404(Product.objects.only('id', 'overall_diameter'), id=self.kwargs['id'])
+            if product.overall_diameter is None:
+                raise NotFound('Product has no full tire size')
+            self._reference = product
+        return self._reference
+
+    def get_params(self):
+        serializer = ProductAlternativesParamsSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['tolerance'], serializer.validated_data['limit']
+
+    def get_queryset(self):
+        reference = self.get_reference()
+        tolerance, limit = self.get_params()
+        band = reference.overall_diameter * tolerance / 100
+        return Product.objects.filter(
+            in_stock=True,
+            overall_diameter__gte=reference.overall_diameter - band,
+            overall_diameter__lte=reference.overall_diameter + band,
+            quantity__gt=0,
+        ).exclude(
+            id=reference.id
+        ).select_related('category', 'brand').prefetch_related('images').order_by(
+            Abs(models.F('overall_diameter') - reference.overall_diameter), 'price'
+        )[:limit]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['reference_diameter'] = self.get_reference().overall_diameter
+        return context
+
+    @method_decorator(cache_page(60 * 5, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 5 minutes
+    def get(self, *args, **kwargs):
+        return super().get(*args, **kwargs)
+
+
+class ProductSimilarView(CatalogThrottleMixin, APIView):
+    """
+    Карусели похожих товаров: same_size - тот же типоразмер других брендов,
+    nearby_sizes - ближайшие размеры того же бренда. Списки соседей
+    предрасчитаны (build_product_similarity), товары читаются одним запросом
+    по первичным ключам; закончившиеся на складе пропускаются.
+    """
+    permission_classes = (permissions.AllowAny,)
+    sections = ('same_size', 'nearby_sizes')
+
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
+    def get(self, request, id):
+        neighbors = ProductSimilarity.objects.filter(product_id=id).values(*self.sections).first()
+        if neighbors is None:
+            # Новый товар, еще не попавший в расчет
+            if not Product.objects.filter(id=id).exists():
+                raise NotFound('Product not found')
+            neighbors = {section: [] for section in self.sections}
+
+        ids = {product_id for section in self.sections for product_id in neighbors[section]}
+        products = Product.objects.filter(
+            pk__in=ids, in_stock=True, quantity__gt=0
+        ).select_related('category', 'brand').prefetch_related('images').in_bulk()
+
+        limit = settings.PRODUCT_SIMILARITY_LIMIT
+        context = {'request': request}
+        data = {}
+        for section in self.sections:
+            found = [products[uuid.UUID(product_id)] for product_id in neighbors[section]
+                     if uuid.UUID(product_id) in products][:limit]
+            data[section] = ProductListSerializer(found, many=True, context=context).data
+        return Response(data)
+
+
+class ProductSizesView(CatalogThrottleMixin, APIView):
+    """
+    Доступные типоразмеры товаров в наличии для виджетов подбора:
+    шины - дерево диаметр -> ширина -> профиль, диски - разболтовки, диаметры,
+    ширины, вылеты и DIA; у каждого значения число товаров.
+    ?category=<id> ограничивает категорией. Ответ берется из кэша до
+    следующего изменения товаров.
+    """
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request):
+        category_id = request.query_params.get('category')
+        if category_id:
+            try:
+                category_id = uuid.UUID(category_id)
+            except ValueError:
+                raise NotFound('Category not found')
+            if not Category.objects.filter(id=category_id).exists():
+                raise NotFound('Category not found')
+        return Response(get_size_tree(category_id))
+
+
+class WheelFitmentView(CatalogThrottleMixin, generics.ListAPIView):
+    """
+    Подбор дисков по разболтовке: точные bolt_count и pcd, DIA не меньше
+    ступицы, ET в окне [et_min, et_max], при необходимости диаметр.
+    Параметры можно взять из справочника: ?vehicle=<id>.
+    Запрос идет по составному индексу product_wheel_fitment_idx.
+    """
+    serializer_class = ProductListSerializer
+    permission_classes = (permissions.AllowAny,)
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['price', 'diameter', 'et_offset', 'wheel_width']
+    ordering = ['price']
+
+    def get_fitment(self):
+        serializer = WheelFitmentSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def get_queryset(self):
+        fitment = self.get_fitment()
+        queryset = Product.objects.filter(bolt_count=fitment['bolt_count'], pcd=fitment['pcd'])
+        if fitment.get('diameter') is not None:
+            queryset = queryset.filter(diameter=fitment['diameter'])
+        else:
+            vehicle = fitment.get('vehicle')
+            if vehicle and vehicle.min_diameter:
+                queryset = queryset.filter(diameter__gte=vehicle.min_diameter)
+            if vehicle and vehicle.max_diameter:
+                queryset = queryset.filter(diameter__lte=vehicle.max_diameter)
+        if fitment.get('et_min') is not None:
+            queryset = queryset.filter(et_offset__gte=fitment['et_min'])
+        if fitment.get('et_max') is not None:
+            queryset = queryset.filter(et_offset__lte=fitment['et_max'])
+        if fitment.get('center_bore') is not None:
+            queryset = queryset.filter(center_bore__gte=fitment['center_bore'])
+        if fitment['in_stock']:
+            queryset = queryset.filter(in_stock=True, quantity__gt=0)
+        return queryset.select_related('category', 'brand').prefetch_related('images')
+
+    @method_decorator(cache_page(60 * 5, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 5 minutes
     def get(self, *args, **kwargs):
         return super().get(*args, **kwargs)
+
+
+class VehicleFilter(filters.FilterSet):
+    make = filters.CharFilter(field_name='make', lookup_expr='iexact')
+    model = filters.CharFilter(field_name='model', lookup_expr='iexact')
+    year = filters.NumberFilter(method='filter_year')
+
+    class Meta:
+        model = Vehicle
+        fields = ['make', 'model', 'bolt_count']
+
+    def filter_year(self, queryset, name, value):
+        return queryset.filter(
+            models.Q(year_from__isnull=True) | models.Q(year_from__lte=value),
+            models.Q(year_to__isnull=True) | models.Q(year_to__gte=value),
+        )
+
+
+class VehicleListView(CatalogThrottleMixin, generics.ListAPIView):
+    """Справочник автомобилей для подбора дисков: ?make=&model=&year="""
+    queryset = Vehicle.objects.all()
+    serializer_class = VehicleSerializer
+    permission_classes = (permissions.AllowAny,)
+    filterset_class = VehicleFilter
+    filter_backends = [filters.DjangoFilterBackend, SearchFilter]
+    search_fields = ['make', 'model', 'generation']
+
+    @method_decorator(cache_page(60 * 15, key_prefix=CATALOG_CACHE_PREFIX))  # Cache for 15 minutes
+    def get(self, *args, **kwargs):
+        return super().get(*args, **kwargs)
+
+
+def market_feed_etag(request):
+    try:
+        stat = os.stat(feed_path())
+    except FileNotFoundError:
+        return None
+    # Файл переписывается только при изменениях, поэтому mtime и размер меняются вместе с содержимым
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+@require_safe
+@condition(etag_func=market_feed_etag)
+def market_feed(request):
+    """
+    YML-фид для маркетплейсов, собранный задачей build_market_feed.
+    Роботы с If-None-Match получают 304, пока фид не пересобран.
+    """
+    try:
+        response = FileResponse(open(feed_path(), 'rb'), content_type='application/xml; charset=utf-8')
+    except FileNotFoundError:
+        raise Http404('Market feed has not been generated yet')
+    patch_cache_control(response, public=True, max_age=settings.MARKET_FEED_CACHE_MAX_AGE)
+    return response
+
+
+SITEMAP_INDEX_KEY = 'sitemap:index'
+
+
+def get_sitemap_index():
+    content = cache.get(SITEMAP_INDEX_KEY)
+    if content is None:
+        def page_url(section, page):
+            path = reverse('sitemap-page', kwargs={'section': section, 'page': page})
+            return settings.SITE_URL.rstrip('/') + path
+
+        content = render_index(page_url)
+        cache.set(SITEMAP_INDEX_KEY, content, timeout=settings.SITEMAP_INDEX_TIMEOUT)
+    return content
+
+
+def sitemap_response(content):
+    response = HttpResponse(content, content_type='application/xml; charset=utf-8')
+    patch_cache_control(response, public=True, max_age=settings.SITEMAP_INDEX_TIMEOUT)
+    return response
+
+
+@require_safe
+@condition(etag_func=lambda request: hashlib.md5(get_sitemap_index().encode()).hexdigest())
+def sitemap_index(request):
+    """Индекс карт сайта: страницы товаров, категорий и брендов с lastmod"""
+    return sitemap_response(get_sitemap_index())
+
+
+def sitemap_page_etag(request, section, page):
+    if section not in SITEMAP_SECTIONS:
+        return None
+    signature = SITEMAP_SECTIONS[section].page_signature(page)
+    return signature and signature['etag']
+
+
+@require_safe
+@condition(etag_func=sitemap_page_etag)
+def sitemap_page(request, section, page):
+    """Страница карты сайта; ETag зависит только от состава и updated_at строк страницы"""
+    sitemap = SITEMAP_SECTIONS.get(section)
+    signature = sitemap and sitemap.page_signature(page)
+    if not signature:
+        raise Http404('Sitemap page not found')
+    return sitemap_response(sitemap.render_page(page, signature))
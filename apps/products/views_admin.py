@@ -1,5 +1,7 @@
 from django.db.models import Sum, Count, Avg, F, Q
+from django.db import DatabaseError, DataError, transaction
 from django.utils import timezone
+from django.http import StreamingHttpResponse
 from django.core.exceptions import ValidationError
 from rest_framework import generics, status, filters
 from rest_framework.views import APIView
@@ -7,11 +9,23 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters import rest_framework as django_filters
-from PIL import Image
-import io
+from PIL import UnidentifiedImageError
 import uuid
 import os
-from .models import Product, Category, ProductImage, Brand
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from .images import (
+    rendition_urls,
+    save_image_upload,
+    prepare_image_upload,
+    create_product_image,
+)
+from .models import Product, Category, ProductImage, Brand, ProductImport
+from .bulk import apply_product_updates, bulk_update_products
+from .cache import invalidate_catalog_cache
+from .exports import EXPORT_FORMATS, EXPORT_RENDERERS, iter_export_rows
+from .gc import get_progress as get_gc_progress, is_running as gc_is_running
+from .tasks import collect_orphan_images, run_product_import
 from .serializers_admin import (
     AdminProductDetailSerializer,
     AdminProductImageSerializer,
@@ -19,46 +33,18 @@ from .serializers_admin import (
     AdminCategorySelectSerializer,
     AdminProductCreateSerializer,
     AdminProductUpdateSerializer,
+    AdminProductBulkUpdateSerializer,
+    AdminProductImportSerializer,
+    StockSyncSerializer,
     AdminCategoryUpdateSerializer,
     AdminBrandSerializer
 )
 from apps.ordering.models import Order, OrderItem
 import json
+import logging
 from rest_framework import serializers
 
-
-def validate_image_file(image_file):
-    # Проверяем MIME тип
-    valid_mimes = ['image/jpeg', 'image/png', 'image/gif']
-    if not image_file.content_type in valid_mimes:
-        raise ValidationError('Unsupported file type. Only JPEG, PNG and GIF are allowed.')
-    
-    # Проверяем размер файла (максимум 5MB)
-    if image_file.size > 5 * 1024 * 1024:
-        raise ValidationError('File size too large. Maximum size is 5MB.')
-    
-    # Проверяем, что файл действительно является изображением
-    try:
-        img = Image.open(image_file)
-        img.verify()
-    except:
-        raise ValidationError('Invalid image file')
-
-
-def create_thumbnail(image_file, max_size=(300, 300)):
-    img = Image.open(image_file)
-    
-    # Конвертируем в RGB если изображение в RGBA
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
-    
-    # Сохраняем пропорции
-    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-    
-    # Сохраняем в буфер
-    thumb_io = io.BytesIO()
-    img.save(thumb_io, format='JPEG', quality=85)
-    return thumb_io
+logger = logging.getLogger(__name__)
 
 
 class ImageUploadView(APIView):
@@ -75,14 +61,8 @@ class ImageUploadView(APIView):
         image_file = request.FILES['image']
         
         try:
-            # Валидируем файл
-            validate_image_file(image_file)
-            
-            # Создаем запись в БД
-            product_image = ProductImage.objects.create(
-                image=image_file,
-                alt_text=image_file.name
-            )
+            # Проверяем заголовок и сохраняем файл за один проход
+            product_image = save_image_upload(image_file)
             
             # Сериализуем и возвращаем результат
             serializer = AdminProductImageSerializer(product_image, context={'request': request})
@@ -114,16 +94,10 @@ class CategoryImageUploadView(APIView):
         image_file = request.FILES['image']
         
         try:
-            # Валидируем файл
-            validate_image_file(image_file)
-            
             # Сначала сохраняем изображение напрямую в ProductImage
             # Это позволит сохранить файл с правильным путем через ImageField
             # И вернуть правильный ID для использования в обновлении категории
-            product_image = ProductImage.objects.create(
-                image=image_file,
-                alt_text=image_file.name
-            )
+            product_image = save_image_upload(image_file)
             
             # Получаем URL изображения
             image_url = None
@@ -134,11 +108,13 @@ class CategoryImageUploadView(APIView):
                 
             print(f"Uploaded category image, ID: {product_image.id}, Path: {product_image.image.name}, URL: {image_url}")
             
-            # Формируем ответ
+            # Формируем ответ (варианты генерируются в фоне, пока отдаем оригинал)
+            renditions = rendition_urls(product_image, request)
             response_data = {
                 'id': str(product_image.id),
                 'image': image_url,
-                'thumbnail': image_url,
+                'thumbnail': renditions['thumbnail'],
+                'renditions': renditions,
                 'alt_text': image_file.name,
                 'is_feature': False,
                 'filename': image_file.name
@@ -332,6 +308,167 @@ class AdminProductListView(generics.ListCreateAPIView):
         return response
 
 
+class AdminProductBulkUpdateView(APIView):
+    """
+    Массовое изменение товаров, выбранных фильтром админки (ProductFilter) и/или списком ids:
+    цена, изменение цены в процентах, старая цена, остаток, перенос в категорию или бренд.
+    Выполняется SQL UPDATE в одной транзакции, кэш каталога сбрасывается один раз.
+    С dry_run=true только возвращает число подходящих товаров.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = AdminProductBulkUpdateSerializer(
+            data=request.data, context={'filter_names': ProductFilter.base_filters}
+        )
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        queryset = Product.objects.all()
+        if data.get('filters'):
+            filterset = ProductFilter(data=data['filters'], queryset=queryset, request=request)
+            if not filterset.is_valid():
+                return Response({'filters': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = filterset.qs
+        if data.get('ids'):
+            queryset = queryset.filter(id__in=data['ids'])
+
+        matched = queryset.count()
+        if data['dry_run'] or not matched:
+            return Response({
+                'operation': data['operation'],
+                'dry_run': data['dry_run'],
+                'matched': matched,
+                'updated': 0,
+            })
+
+        try:
+            result = bulk_update_products(queryset, data['operation'], data['params'])
+        except DataError:
+            return Response(
+                {'detail': 'Resulting values are out of range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'operation': data['operation'],
+            'dry_run': False,
+            'matched': matched,
+            **result,
+        })
+
+
+class AdminProductExportView(APIView):
+    """
+    Выгрузка всего каталога (или товаров, выбранных фильтром ProductFilter)
+    в CSV или NDJSON: ?output=csv|ndjson. Ответ отдается потоком,
+    строки читаются из БД серверным курсором.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        # format зарезервирован DRF под суффиксы и рендереры
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'output': [f"Unsupported output, use one of: {', '.join(EXPORT_FORMATS)}"]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        filterset = ProductFilter(data=request.query_params, queryset=Product.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        chunk_size = getattr(settings, 'PRODUCT_EXPORT_CHUNK_SIZE', 2000)
+        rows = iter_export_rows(filterset.qs, chunk_size=chunk_size)
+        response = StreamingHttpResponse(EXPORT_RENDERERS[output](rows), content_type=EXPORT_FORMATS[output])
+        filename = f"products-{timezone.now():%Y%m%d-%H%M}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # Не даем nginx буферизовать выгрузку целиком
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class StockSyncView(APIView):
+    """
+    Синхронизация остатков и цен со складом.
+    Товары ищутся по id или sku одним запросом, изменения применяются
+    UPDATE ... FROM (VALUES ...) по пачкам с пересчетом in_stock,
+    кэш каталога сбрасывается один раз.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        serializer = StockSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+
+        ids = [item['id'] for item in items if 'id' in item]
+        skus = [item['sku'] for item in items if 'sku' in item]
+        found = Product.objects.filter(Q(id__in=ids) | Q(sku__in=skus)).values_list('id', 'sku')
+        id_by_sku = {}
+        known_ids = set()
+        for product_id, sku in found:
+            known_ids.add(product_id)
+            if sku:
+                id_by_sku[sku] = product_id
+
+        # Повтор товара в запросе: побеждает последняя позиция
+        rows = {}
+        not_found = []
+        for item in items:
+            product_id = item['id'] if 'id' in item else id_by_sku.get(item['sku'])
+            if product_id not in known_ids:
+                not_found.append(str(item.get('id') or item.get('sku')))
+                continue
+            row = {'id': product_id}
+            if item['quantity'] is not None:
+                row['quantity'] = item['quantity']
+            if item['price'] is not None:
+                row['price'] = item['price']
+            rows[product_id] = row
+
+        updated = 0
+        if rows:
+            with transaction.atomic():
+                updated = apply_product_updates(rows.values())
+                if updated:
+                    transaction.on_commit(invalidate_catalog_cache)
+
+        return Response({
+            'received': len(items),
+            'matched': len(rows),
+            'updated': updated,
+            'unchanged': len(rows) - updated,
+            'not_found': not_found,
+        })
+
+
+class ProductImportListView(generics.ListCreateAPIView):
+    """
+    Импорт товаров из CSV/XLSX (поле file, опционально dry_run).
+    Файл обрабатывается в фоне; прогресс и ошибки - в ProductImportDetailView.
+    """
+    queryset = ProductImport.objects.all()
+    serializer_class = AdminProductImportSerializer
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def perform_create(self, serializer):
+        job = serializer.save(
+            created_by=self.request.user,
+            original_name=serializer.validated_data['file'].name,
+        )
+        transaction.on_commit(lambda: run_product_import.delay(str(job.id)))
+
+
+class ProductImportDetailView(generics.RetrieveAPIView):
+    queryset = ProductImport.objects.all()
+    serializer_class = AdminProductImportSerializer
+    permission_classes = [IsAdminUser]
+
+
 class AdminProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     permission_classes = [IsAdminUser]
@@ -577,14 +714,8 @@ class ProductImageUploadView(APIView):
         image_file = request.FILES['image']
         
         try:
-            # Валидируем файл
-            validate_image_file(image_file)
-            
-            # Создаем запись в БД напрямую с файлом изображения
-            product_image = ProductImage.objects.create(
-                image=image_file,
-                alt_text=image_file.name
-            )
+            # Проверяем заголовок, сохраняем файл и метаданные за один проход
+            product_image = save_image_upload(image_file)
             
             # Получаем URL изображения
             image_url = None
@@ -595,11 +726,13 @@ class ProductImageUploadView(APIView):
                 
             print(f"Uploaded product image, ID: {product_image.id}, Path: {product_image.image.name}, URL: {image_url}")
             
-            # Формируем ответ
+            # Формируем ответ (варианты генерируются в фоне, пока отдаем оригинал)
+            renditions = rendition_urls(product_image, request)
             response_data = {
                 'id': str(product_image.id),
                 'image': image_url,
-                'thumbnail': image_url,
+                'thumbnail': renditions['thumbnail'],
+                'renditions': renditions,
                 'alt_text': image_file.name,
                 'is_feature': False,
                 'filename': image_file.name
@@ -623,6 +756,80 @@ class ProductImageUploadView(APIView):
             )
 
 
+class BulkProductImageUploadView(APIView):
+    """
+    Загрузка нескольких изображений товара одним multipart-запросом (поле images).
+    Проверка файлов и превью-заглушки считаются в ограниченном пуле потоков,
+    запись в хранилище (с подсчетом хэша) и в БД - в основном потоке.
+    Возвращает результат по каждому файлу и список id, который можно сразу
+    передать в images при создании товара.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        files = request.FILES.getlist('images')
+        if not files:
+            return Response(
+                {'detail': 'No image files provided'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_files = getattr(settings, 'BULK_IMAGE_UPLOAD_MAX_FILES', 20)
+        if len(files) > max_files:
+            return Response(
+                {'detail': f'Too many files. Maximum is {max_files} per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def prepare(image_file):
+            try:
+                return prepare_image_upload(image_file), None
+            except ValidationError as e:
+                return None, ' '.join(e.messages)
+            except (UnidentifiedImageError, OSError):
+                # Ошибки чтения загрузки; прочие исключения - баги, а не плохой файл
+                return None, 'Invalid image file'
+
+        workers = getattr(settings, 'IMAGE_UPLOAD_WORKERS', 4)
+        with ThreadPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            prepared = list(executor.map(prepare, files))
+
+        results = []
+        ids = []
+        for image_file, (info, error) in zip(files, prepared):
+            if error is None:
+                try:
+                    product_image = create_product_image(image_file, info)
+                except (OSError, DatabaseError):
+                    # Ошибки хранилища и БД; файл уже проверен в prepare_image_upload
+                    logger.exception('Could not save uploaded image %s', image_file.name)
+                    error = 'Error processing image'
+
+            if error is not None:
+                results.append({'filename': image_file.name, 'ok': False, 'error': error})
+                continue
+
+            renditions = rendition_urls(product_image, request)
+            ids.append(str(product_image.id))
+            results.append({
+                'filename': image_file.name,
+                'ok': True,
+                'id': str(product_image.id),
+                'image': renditions['original'],
+                'thumbnail': renditions['thumbnail'],
+                'renditions': renditions,
+                'width': product_image.width,
+                'height': product_image.height,
+                'placeholder': product_image.placeholder,
+            })
+
+        return Response(
+            {'results': results, 'ids': ids},
+            status=status.HTTP_201_CREATED if ids else status.HTTP_400_BAD_REQUEST
+        )
+
+
 class AdminBrandListView(generics.ListAPIView):
     """
     Представление для получения списка брендов для админки.
@@ -662,17 +869,13 @@ class ProductImageDeleteView(APIView):
             
             print(f"Deleting image {image_id}, product: {product_id}, path: {image_path}")
             
-            # Удаляем файл с диска
-            if image.image:
-                try:
-                    image.image.delete(save=False)
-                    print(f"Deleted image file: {image_path}")
-                except Exception as e:
-                    print(f"Error deleting image file: {e}")
-            
-            # Удаляем запись из базы данных
+            # Удаляем запись из базы данных; файл освобождается сигналом
+            # (общий файл удаляется только вместе с последней ссылкой)
             image.delete()
             print(f"Deleted image record: {image_id}")
+            if product_id:
+                # Состав изображений - часть товара для выгрузок, которые работают по updated_at
+                Product.objects.filter(id=product_id).update(updated_at=timezone.now())
             
             return Response(
                 {'detail': 'Image deleted successfully'},
@@ -720,62 +923,39 @@ class AdminProductImageListView(generics.ListAPIView):
 
 class CleanupUnusedImagesView(APIView):
     """
-    Представление для очистки неиспользуемых изображений.
-    Удаляет все изображения, которые не привязаны к товарам или категориям.
+    Очистка неиспользуемых изображений.
+    POST ставит сборку мусора в очередь Celery (dry_run, grace_hours в теле запроса),
+    GET возвращает прогресс последнего запуска.
     """
     permission_classes = [IsAdminUser]
-    
+
+    def get(self, request):
+        progress = get_gc_progress()
+        if progress is None:
+            return Response({'detail': 'Image cleanup has not been run yet'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progress)
+
     def post(self, request):
-        try:
-            # Находим все неиспользуемые изображения
-            unused_images = ProductImage.objects.filter(product__isnull=True)
-            
-            # Также проверяем изображения, которые не используются в категориях
-            # (для этого нужно проверить, не используется ли путь изображения в Category.image)
-            from .models import Category
-            used_image_paths = set()
-            
-            # Собираем все пути изображений, используемых в категориях
-            for category in Category.objects.exclude(image='').exclude(image__isnull=True):
-                if category.image:
-                    used_image_paths.add(category.image.name)
-            
-            deleted_count = 0
-            deleted_files = []
-            
-            for image in unused_images:
-                # Проверяем, не используется ли это изображение в категориях
-                if image.image and image.image.name not in used_image_paths:
-                    image_path = image.image.name
-                    image_id = str(image.id)
-                    
-                    print(f"Deleting unused image: {image_id}, path: {image_path}")
-                    
-                    # Удаляем файл с диска
-                    try:
-                        image.image.delete(save=False)
-                        print(f"Deleted image file: {image_path}")
-                    except Exception as e:
-                        print(f"Error deleting image file {image_path}: {e}")
-                    
-                    # Удаляем запись из БД
-                    image.delete()
-                    
-                    deleted_count += 1
-                    deleted_files.append({
-                        'id': image_id,
-                        'path': image_path
-                    })
-            
-            return Response({
-                'detail': f'Successfully deleted {deleted_count} unused images',
-                'deleted_count': deleted_count,
-                'deleted_files': deleted_files
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            print(f"Error during cleanup: {str(e)}")
+        if gc_is_running():
             return Response(
-                {'detail': f'Error during cleanup: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            ) 
\ No newline at end of file
+                {'detail': 'Image cleanup is already running', 'progress': get_gc_progress()},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        grace_hours = request.data.get('grace_hours')
+        if grace_hours is not None:
+            try:
+                grace_hours = int(grace_hours)
+            except (TypeError, ValueError):
+                return Response({'detail': 'grace_hours must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            if grace_hours < 0:
+                return Response({'detail': 'grace_hours must not be negative'}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        task = collect_orphan_images.delay(grace_hours=grace_hours, dry_run=dry_run)
+
+        return Response({
+            'detail': 'Image cleanup queued',
+            'task_id': task.id,
+            'dry_run': dry_run,
+        }, status=status.HTTP_202_ACCEPTED)
@@ -4,7 +4,7 @@ from .models import CartItem
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ('user', 'product', 'quantity', 'total_price', 'created_at')
+    list_display = ('user', 'product', 'quantity', 'price', 'total_price', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('user__email', 'product__name')
     ordering = ('-created_at',)
@@ -0,0 +1,161 @@
+import json
+import re
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from apps.products.models import Product
+from .models import CartItem
+
+CART_TOKEN_HEADER = 'X-Cart-Token'
+CART_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{32,64}$')
+
+
+class GuestCart:
+    """
+    Корзина анонимного покупателя.
+    Хранится в Redis-хэше guest_cart:<token>, где поле - id товара,
+    а значение - JSON с количеством, ценой на момент добавления и датой.
+    """
+    key_prefix = 'guest_cart'
+
+    def __init__(self, token):
+        self.token = token
+        self.key = f'{self.key_prefix}:{token}'
+        self.redis = get_redis_connection('default')
+
+    @classmethod
+    def from_request(cls, request, create=False):
+        """Возвращает корзину по заголовку X-Cart-Token (или новую, если create=True)"""
+        token = request.headers.get(CART_TOKEN_HEADER)
+        if token and CART_TOKEN_RE.match(token):
+            return cls(token)
+        if create:
+            return cls(secrets.token_urlsafe(32))
+        return None
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'GUEST_CART_TTL', 60 * 60 * 24 * 30)
+
+    def lines(self):
+        """Все строки корзины: {product_id: {'quantity', 'price', 'added_at'}}"""
+        raw = self.redis.hgetall(self.key)
+        return {
+            product_id.decode(): json.loads(value)
+            for product_id, value in raw.items()
+        }
+
+    def get(self, product_id):
+        value = self.redis.hget(self.key, str(product_id))
+        return json.loads(value) if value else None
+
+    def set(self, product, quantity, added_at=None):
+        line = {
+            'quantity': quantity,
+            'price': str(product.price),
+            'added_at': added_at or timezone.now().isoformat(),
+        }
+        pipe = self.redis.pipeline()
+        pipe.hset(self.key, str(product.id), json.dumps(line))
+        pipe.expire(self.key, self.ttl)
+        pipe.execute()
+        return line
+
+    def remove(self, product_id):
+        return bool(self.redis.hdel(self.key, str(product_id)))
+
+    def clear(self):
+        self.redis.delete(self.key)
+
+    def summary(self):
+        """Итоги корзины считаются только по данным Redis, без обращения к БД"""
+        lines = self.lines().values()
+        return {
+            'items_count': len(lines),
+            'total_price': sum(
+                (line['quantity'] * Decimal(line['price']) for line in lines),
+                Decimal('0')
+            ),
+        }
+
+    def build_items(self, products=None, lines=None):
+        """
+        Строит несохраненные CartItem для сериализации в том же формате, что и
+        корзина пользователя. id строки совпадает с id товара.
+        """
+        if lines is None:
+            lines = self.lines()
+        if not lines:
+            return []
+        if products is None:
+            products = Product.objects.select_related(
+                'category', 'brand'
+            ).prefetch_related('images').in_bulk(list(lines.keys()))
+
+        items = []
+        for product_id, product in products.items():
+            line = lines.get(str(product_id))
+            if line is None:
+                continue
+            item = CartItem(
+                id=product.id,
+                product=product,
+                quantity=line['quantity'],
+                price=Decimal(line['price']),
+            )
+            item.created_at = line['added_at']
+            items.append(item)
+        items.sort(key=lambda item: item.created_at, reverse=True)
+        return items
+
+    def merge_into(self, user):
+        """
+        Переносит гостевую корзину в CartItem пользователя одним bulk upsert.
+        Количество суммируется с уже лежащим в корзине и ограничивается остатком;
+        у такой строки остается ее цена, гостевая цена берется только для новых строк.
+        """
+        lines = self.lines()
+        if not lines:
+            return 0
+
+        products = Product.objects.in_bulk(list(lines.keys()))
+        existing = dict(
+            CartItem.objects.filter(
+                user=user, product_id__in=list(products.keys())
+            ).values_list('product_id', 'quantity')
+        )
+
+        cart_items = []
+        for product_id, product in products.items():
+            if not product.is_available:
+                continue
+            quantity = lines[str(product_id)]['quantity'] + existing.get(product_id, 0)
+            cart_items.append(CartItem(
+                user=user,
+                product=product,
+                quantity=min(quantity, product.quantity),
+                price=Decimal(lines[str(product_id)]['price']),
+            ))
+
+        with transaction.atomic():
+            CartItem.objects.bulk_create(
+                cart_items,
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['quantity', 'updated_at'],
+            )
+        self.clear()
+        return len(cart_items)
+
+
+def merge_guest_cart(request, user):
+    """Сливает гостевую корзину из запроса (если она есть) в корзину пользователя"""
+    guest_cart = GuestCart.from_request(request)
+    if guest_cart is None:
+        return 0
+    return guest_cart.merge_into(user)
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.10 on 2026-10-19 10:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopping", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                help_text="Product price at the moment it was added to the cart",
+                max_digits=10,
+                null=True,
+                validators=[django.core.validators.MinValueValidator(0)],
+                verbose_name="price",
+            ),
+        ),
+    ]
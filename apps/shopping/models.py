@@ -14,6 +14,9 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(_('quantity'),
                                          validators=[MinValueValidator(1)],
                                          default=1)
+    price = models.DecimalField(_('price'), max_digits=10, decimal_places=2,
+                              validators=[MinValueValidator(0)], null=True, blank=True,
+                              help_text=_('Product price at the moment it was added to the cart'))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
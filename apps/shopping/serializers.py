@@ -45,11 +45,15 @@ class CartItemSerializer(serializers.ModelSerializer):
         cart_item, created = CartItem.objects.get_or_create(
             user=user,
             product=product,
-            defaults={'quantity': validated_data.get('quantity', 1)}
+            defaults={
+                'quantity': validated_data.get('quantity', 1),
+                'price': product.price,
+            }
         )
 
         if not created:
             cart_item.quantity = validated_data.get('quantity', cart_item.quantity)
+            cart_item.price = product.price
             cart_item.save()
 
         return cart_item
@@ -57,4 +61,22 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSummarySerializer(serializers.Serializer):
     items_count = serializers.IntegerField()
-    total_price = serializers.DecimalField(max_digits=10, decimal_places=2) 
\ No newline at end of file
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2) 
+
+
+class CartValidationLineSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    product_id = serializers.UUIDField()
+    name = serializers.CharField(allow_null=True)
+    quantity = serializers.IntegerField()
+    cart_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    current_price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    available_quantity = serializers.IntegerField()
+    suggested_quantity = serializers.IntegerField()
+    issues = serializers.ListField(child=serializers.CharField())
+
+
+class CartValidationSerializer(serializers.Serializer):
+    valid = serializers.BooleanField()
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    items = CartValidationLineSerializer(many=True)
@@ -1,3 +1,194 @@
-from django.test import TestCase
+import secrets
+from decimal import Decimal
 
-# Create your tests here.
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.products.models import Category, Product
+from .guest_cart import CART_TOKEN_HEADER, GuestCart
+from .models import CartItem
+
+
+@pytest.fixture
+def category(db):
+    return Category.objects.create(name='Шины', slug='tires')
+
+
+def make_product(category, **fields):
+    fields.setdefault('name', 'Шина')
+    fields.setdefault('price', Decimal('100.00'))
+    fields.setdefault('quantity', 5)
+    return Product.objects.create(category=category, **fields)
+
+
+@pytest.fixture
+def guest(fake_redis):
+    """Клиент анонимного покупателя с токеном гостевой корзины"""
+    client = APIClient()
+    client.token = secrets.token_urlsafe(32)
+    client.credentials(HTTP_X_CART_TOKEN=client.token)
+    return client
+
+
+def guest_lines(client):
+    return GuestCart(client.token).lines()
+
+
+# Гостевая корзина
+
+
+def test_guest_cart_add_update_remove(guest, category):
+    product = make_product(category, quantity=5)
+    detail_url = reverse('shopping:cart-detail', args=[product.id])
+
+    response = guest.post(reverse('shopping:cart-list'), {'product_id': str(product.id), 'quantity': 2}, format='json')
+    assert response.status_code == 201
+    assert response[CART_TOKEN_HEADER] == guest.token
+    assert guest_lines(guest)[str(product.id)]['quantity'] == 2
+    assert guest_lines(guest)[str(product.id)]['price'] == '100.00'
+
+    response = guest.get(reverse('shopping:cart-list'))
+    assert [item['id'] for item in response.data['results']] == [str(product.id)]
+
+    assert guest.patch(detail_url, {'quantity': 4}, format='json').status_code == 200
+    assert guest_lines(guest)[str(product.id)]['quantity'] == 4
+    assert guest.get(reverse('shopping:cart-summary')).data['total_price'] == '400.00'
+
+    assert guest.delete(detail_url).status_code == 204
+    assert guest_lines(guest) == {}
+    assert guest.delete(detail_url).status_code == 404
+
+
+def test_guest_cart_rejects_quantity_above_stock(guest, category):
+    product = make_product(category, quantity=2)
+
+    response = guest.post(reverse('shopping:cart-list'), {'product_id': str(product.id), 'quantity': 3}, format='json')
+
+    assert response.status_code == 400
+    assert guest_lines(guest) == {}
+
+
+def test_guest_cart_without_token_is_created_on_first_add(fake_redis, category):
+    product = make_product(category)
+    client = APIClient()
+
+    assert client.get(reverse('shopping:cart-summary')).data['items_count'] == 0
+    response = client.post(reverse('shopping:cart-list'), {'product_id': str(product.id)}, format='json')
+
+    assert response.status_code == 201
+    assert GuestCart(response[CART_TOKEN_HEADER]).lines()[str(product.id)]['quantity'] == 1
+
+
+@pytest.fixture
+def shopper(db):
+    return get_user_model().objects.create_user(email='shopper@example.com', password='secret-pass-1')
+
+
+def login(client, user):
+    return client.post(
+        reverse('users:login'), {'email': user.email, 'password': 'secret-pass-1'}, format='json'
+    )
+
+
+def test_login_merges_guest_cart_into_user_cart(guest, shopper, category):
+    in_both = make_product(category, price=Decimal('100.00'), quantity=4)
+    guest_only = make_product(category, price=Decimal('50.00'), quantity=5)
+    sold_out = make_product(category, quantity=0, in_stock=False)
+    CartItem.objects.create(user=shopper, product=in_both, quantity=2, price=Decimal('90.00'))
+    cart = GuestCart(guest.token)
+    cart.set(in_both, 3)
+    cart.set(guest_only, 1)
+    cart.set(sold_out, 1)
+
+    assert login(guest, shopper).status_code == 200
+
+    items = {item.product_id: item for item in CartItem.objects.filter(user=shopper)}
+    assert set(items) == {in_both.id, guest_only.id}
+    # Количества суммируются и ограничиваются остатком, цена строки пользователя сохраняется
+    assert (items[in_both.id].quantity, items[in_both.id].price) == (4, Decimal('90.00'))
+    assert (items[guest_only.id].quantity, items[guest_only.id].price) == (1, Decimal('50.00'))
+    assert cart.lines() == {}
+
+
+def test_login_without_guest_cart_keeps_user_cart(fake_redis, shopper, category):
+    product = make_product(category)
+    CartItem.objects.create(user=shopper, product=product, quantity=2, price=Decimal('100.00'))
+
+    assert login(APIClient(), shopper).status_code == 200
+
+    assert list(CartItem.objects.filter(user=shopper).values_list('quantity', flat=True)) == [2]
+
+
+# Проверка корзины перед оформлением
+
+
+@pytest.fixture
+def shopper_client(fake_redis, shopper):
+    client = APIClient()
+    client.force_authenticate(shopper)
+    return client
+
+
+def validate(client):
+    response = client.get(reverse('shopping:cart-validate'))
+    assert response.status_code == 200
+    return response.data, {line['product_id']: line for line in response.data['items']}
+
+
+def test_validate_reports_price_and_stock_drift(shopper_client, shopper, category):
+    ok, repriced, low_stock, sold_out = (make_product(category) for _index in range(4))
+    for product in (ok, repriced, low_stock, sold_out):
+        CartItem.objects.create(user=shopper, product=product, quantity=2, price=product.price)
+    # Каталог изменился после добавления в корзину
+    Product.objects.filter(pk=repriced.pk).update(price=Decimal('120.00'))
+    Product.objects.filter(pk=low_stock.pk).update(quantity=1)
+    Product.objects.filter(pk=sold_out.pk).update(quantity=0, in_stock=False)
+
+    data, lines = validate(shopper_client)
+
+    assert data['valid'] is False
+    assert lines[str(ok.id)]['issues'] == []
+    assert lines[str(repriced.id)]['issues'] == ['price_changed']
+    assert (lines[str(low_stock.id)]['issues'], lines[str(low_stock.id)]['suggested_quantity']) == (
+        ['quantity_reduced'], 1
+    )
+    assert (lines[str(sold_out.id)]['issues'], lines[str(sold_out.id)]['suggested_quantity']) == (['unavailable'], 0)
+    # Итог по текущим ценам и доступным количествам
+    assert data['total_price'] == '540.00'
+
+
+def test_validate_clean_cart_is_valid(shopper_client, shopper, category):
+    product = make_product(category)
+    CartItem.objects.create(user=shopper, product=product, quantity=2, price=product.price)
+
+    data, _lines = validate(shopper_client)
+
+    assert data['valid'] is True
+    assert data['total_price'] == '200.00'
+
+
+def test_validate_guest_cart_reports_and_drops_deleted_products(guest, category):
+    kept = make_product(category, price=Decimal('110.00'))
+    deleted = make_product(category, price=Decimal('50.00'))
+    cart = GuestCart(guest.token)
+    cart.set(kept, 1)
+    cart.set(deleted, 2)
+    kept.price = Decimal('100.00')
+    kept.save()
+    deleted_id = str(deleted.id)
+    deleted.delete()
+
+    data, lines = validate(guest)
+
+    assert data['valid'] is False
+    assert lines[str(kept.id)]['issues'] == ['price_changed']
+    assert lines[deleted_id]['issues'] == ['removed']
+    assert (lines[deleted_id]['cart_price'], lines[deleted_id]['current_price']) == ('50.00', None)
+    assert data['total_price'] == '100.00'
+    assert set(cart.lines()) == {str(kept.id)}
+
+    # Строка уже убрана из Redis, повторная проверка ее не показывает
+    _data, lines = validate(guest)
+    assert set(lines) == {str(kept.id)}
@@ -3,6 +3,7 @@ from .views import (
     CartItemListCreateView,
     CartItemDetailView,
     CartSummaryView,
+    CartValidateView,
 )
 
 app_name = 'shopping'
@@ -10,5 +11,6 @@ app_name = 'shopping'
 urlpatterns = [
     path('', CartItemListCreateView.as_view(), name='cart-list'),
     path('summary/', CartSummaryView.as_view(), name='cart-summary'),
+    path('validate/', CartValidateView.as_view(), name='cart-validate'),
     path('<uuid:id>/', CartItemDetailView.as_view(), name='cart-detail'),
 ] 
\ No newline at end of file
@@ -1,43 +1,260 @@
+from decimal import Decimal
+
 from django.shortcuts import render
 from django.db.models import Sum, F
 from rest_framework import generics, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny
 from rest_framework.views import APIView
 
+from apps.products.models import Product
+from .guest_cart import GuestCart, CART_TOKEN_HEADER
 from .models import CartItem
-from .serializers import CartItemSerializer, CartSummarySerializer
+from .serializers import (
+    CartItemSerializer,
+    CartSummarySerializer,
+    CartValidationSerializer,
+)
+
+
+class GuestCartMixin:
+    """
+    Анонимные покупатели работают с корзиной в Redis по заголовку X-Cart-Token.
+    Формат ответов совпадает с корзиной авторизованного пользователя.
+    """
+
+    def is_guest(self):
+        return not self.request.user.is_authenticated
+
+    def get_guest_cart(self, create=False):
+        return GuestCart.from_request(self.request, create=create)
+
+    def get_guest_item(self, guest_cart):
+        product_id = str(self.kwargs[self.lookup_field])
+        items = guest_cart.build_items() if guest_cart else []
+        for item in items:
+            if str(item.id) == product_id:
+                return item
+        raise NotFound()
 
+    def validate_guest_quantity(self, product, quantity):
+        if quantity > product.quantity:
+            return Response(
+                {'quantity': ['Requested quantity is not available.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return None
 
-class CartItemListCreateView(generics.ListCreateAPIView):
+    def guest_response(self, guest_cart, data, status_code=status.HTTP_200_OK):
+        response = Response(data, status=status_code)
+        response[CART_TOKEN_HEADER] = guest_cart.token
+        return response
+
+
+class CartItemListCreateView(GuestCartMixin, generics.ListCreateAPIView):
     serializer_class = CartItemSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (AllowAny,)
 
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user).select_related('product')
 
+    def list(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().list(request, *args, **kwargs)
+
+        guest_cart = self.get_guest_cart()
+        items = guest_cart.build_items() if guest_cart else []
+        page = self.paginate_queryset(items)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def create(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product = Product.objects.get(id=serializer.validated_data['product_id'])
+        quantity = serializer.validated_data.get('quantity', 1)
 
-class CartItemDetailView(generics.RetrieveUpdateDestroyAPIView):
+        error_response = self.validate_guest_quantity(product, quantity)
+        if error_response:
+            return error_response
+
+        guest_cart = self.get_guest_cart(create=True)
+        line = guest_cart.get(product.id)
+        guest_cart.set(product, quantity, added_at=line['added_at'] if line else None)
+
+        item = guest_cart.build_items(products={product.id: product})[0]
+        return self.guest_response(
+            guest_cart,
+            self.get_serializer(item).data,
+            status_code=status.HTTP_201_CREATED
+        )
+
+
+class CartItemDetailView(GuestCartMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CartItemSerializer
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (AllowAny,)
     lookup_field = 'id'
 
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().retrieve(request, *args, **kwargs)
+
+        guest_cart = self.get_guest_cart()
+        item = self.get_guest_item(guest_cart)
+        return self.guest_response(guest_cart, self.get_serializer(item).data)
+
+    def update(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().update(request, *args, **kwargs)
+
+        guest_cart = self.get_guest_cart()
+        item = self.get_guest_item(guest_cart)
+        serializer = self.get_serializer(item, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data.get('quantity', item.quantity)
+
+        error_response = self.validate_guest_quantity(item.product, quantity)
+        if error_response:
+            return error_response
+
+        guest_cart.set(item.product, quantity, added_at=item.created_at)
+        item.quantity = quantity
+        return self.guest_response(guest_cart, self.get_serializer(item).data)
+
+    def destroy(self, request, *args, **kwargs):
+        if not self.is_guest():
+            return super().destroy(request, *args, **kwargs)
+
+        guest_cart = self.get_guest_cart()
+        if guest_cart is None or not guest_cart.remove(self.kwargs[self.lookup_field]):
+            raise NotFound()
+        return self.guest_response(guest_cart, None, status_code=status.HTTP_204_NO_CONTENT)
+
 
 class CartSummaryView(APIView):
-    permission_classes = (IsAuthenticated,)
+    permission_classes = (AllowAny,)
 
     def get(self, request):
+        if not request.user.is_authenticated:
+            # Итоги гостевой корзины читаются напрямую из Redis
+            guest_cart = GuestCart.from_request(request)
+            summary = guest_cart.summary() if guest_cart else {'items_count': 0, 'total_price': 0}
+            serializer = CartSummarySerializer(summary)
+            return Response(serializer.data)
+
         cart_items = CartItem.objects.filter(user=request.user)
-        
+
         summary = {
             'items_count': cart_items.count(),
             'total_price': cart_items.aggregate(
                 total=Sum(F('quantity') * F('product__price'))
             )['total'] or 0
         }
-        
+
         serializer = CartSummarySerializer(summary)
         return Response(serializer.data)
+
+
+class CartValidateView(APIView):
+    """
+    Проверка всех строк корзины перед оформлением заказа.
+    Сверяет цену, остаток и наличие одним запросом и возвращает расхождения
+    по каждой строке, чтобы клиент исправил корзину за один раз.
+    Строки гостевой корзины с удаленными товарами возвращаются со статусом
+    removed и удаляются из Redis.
+    """
+    permission_classes = (AllowAny,)
+
+    PRICE_CHANGED = 'price_changed'
+    QUANTITY_REDUCED = 'quantity_reduced'
+    UNAVAILABLE = 'unavailable'
+    REMOVED = 'removed'
+
+    def get_items(self, request):
+        """Строки корзины и строки гостевой корзины, товары которых удалены из каталога"""
+        if request.user.is_authenticated:
+            return list(
+                CartItem.objects.filter(user=request.user).select_related('product')
+            ), []
+
+        guest_cart = GuestCart.from_request(request)
+        if guest_cart is None:
+            return [], []
+        lines = guest_cart.lines()
+        products = Product.objects.only(
+            'id', 'name', 'price', 'quantity', 'in_stock'
+        ).in_bulk(list(lines.keys()))
+
+        # У пользователя такие строки удаляются каскадом вместе с товаром,
+        # в Redis их нужно убрать явно
+        found = {str(product_id) for product_id in products}
+        removed = [
+            self.removed_line(product_id, line)
+            for product_id, line in lines.items() if product_id not in found
+        ]
+        for line in removed:
+            guest_cart.remove(line['product_id'])
+        return guest_cart.build_items(products=products, lines=lines), removed
+
+    def removed_line(self, product_id, line):
+        return {
+            'id': product_id,
+            'product_id': product_id,
+            'name': None,
+            'quantity': line['quantity'],
+            'cart_price': Decimal(line['price']),
+            'current_price': None,
+            'available_quantity': 0,
+            'suggested_quantity': 0,
+            'issues': [self.REMOVED],
+        }
+
+    def validate_item(self, item):
+        product = item.product
+        issues = []
+
+        available_quantity = product.quantity if product.in_stock else 0
+        if available_quantity == 0:
+            issues.append(self.UNAVAILABLE)
+        elif item.quantity > available_quantity:
+            issues.append(self.QUANTITY_REDUCED)
+
+        if item.price is not None and item.price != product.price:
+            issues.append(self.PRICE_CHANGED)
+
+        return {
+            'id': item.id,
+            'product_id': product.id,
+            'name': product.name,
+            'quantity': item.quantity,
+            'cart_price': item.price,
+            'current_price': product.price,
+            'available_quantity': available_quantity,
+            'suggested_quantity': min(item.quantity, available_quantity),
+            'issues': issues,
+        }
+
+    def get(self, request):
+        items, removed = self.get_items(request)
+        lines = [self.validate_item(item) for item in items] + removed
+
+        data = {
+            'valid': not any(line['issues'] for line in lines),
+            'total_price': sum(
+                (
+                    line['suggested_quantity'] * line['current_price']
+                    for line in lines if line['current_price'] is not None
+                ),
+                Decimal('0')
+            ),
+            'items': lines,
+        }
+        serializer = CartValidationSerializer(data)
+        return Response(serializer.data)
@@ -0,0 +1,113 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+GENERATION_KEY = 'auth_user_gen:{user_id}'
+USER_KEY = 'auth_user:{user_id}:{generation}'
+
+# Процессный кэш: user_id -> (истекает_в, пользователь)
+LOCAL_CACHE_MAX_SIZE = 10000
+_local_cache = {}
+_local_lock = threading.Lock()
+
+
+def _local_ttl():
+    return getattr(settings, 'AUTH_USER_LOCAL_CACHE_TTL', 5)
+
+
+def _redis_ttl():
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 300)
+
+
+def get_user_generation(user_id):
+    """
+    Текущее поколение пользователя. Меняется при каждом сохранении User,
+    поэтому старые записи кэша перестают находиться без явного удаления.
+    """
+    return cache.get_or_set(
+        GENERATION_KEY.format(user_id=user_id),
+        time.time_ns,
+        timeout=None
+    )
+
+
+def invalidate_cached_user(user_id):
+    """Сбрасывает кэш пользователя во всех процессах (через новое поколение в Redis)"""
+    cache.set(GENERATION_KEY.format(user_id=user_id), time.time_ns(), timeout=None)
+    with _local_lock:
+        _local_cache.pop(str(user_id), None)
+
+
+def get_cached_user(user_id):
+    """
+    Возвращает пользователя из процессного кэша, затем из Redis и только
+    при промахе из Postgres. Возвращает None, если пользователь не найден.
+    """
+    user_id = str(user_id)
+    now = time.monotonic()
+
+    entry = _local_cache.get(user_id)
+    if entry and entry[0] > now:
+        # Копия, чтобы изменения request.user в одном запросе не видели другие
+        return copy.copy(entry[1])
+
+    generation = get_user_generation(user_id)
+    key = USER_KEY.format(user_id=user_id, generation=generation)
+    user = cache.get(key)
+
+    if user is None:
+        try:
+            user = User.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except (User.DoesNotExist, ValueError):
+            return None
+        cache.set(key, user, timeout=_redis_ttl())
+
+    with _local_lock:
+        if len(_local_cache) >= LOCAL_CACHE_MAX_SIZE:
+            _local_cache.clear()
+        _local_cache[user_id] = (now + _local_ttl(), user)
+    # В процессном кэше лежит общий экземпляр, запросу отдаем копию
+    return copy.copy(user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса пользователя к БД в типичном случае.
+    Пользователь берется из короткого процессного кэша и Redis по ключу
+    user_id + поколение; поколение меняется при сохранении User
+    (в том числе при смене пароля), см. apps.users.signals.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return user
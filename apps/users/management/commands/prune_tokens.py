@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from apps.users.tokens import blacklist_cache, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие JWT-токены пачками и пересобирает кэш черного списка в Redis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--rebuild-cache',
+            action='store_true',
+            help='Полностью пересобрать множество черного списка в Redis'
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
+
+        if options['rebuild_cache']:
+            count = blacklist_cache.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Blacklist cache rebuilt with {count} tokens'))
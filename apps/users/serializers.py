@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from apps.shopping.guest_cart import merge_guest_cart
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -76,11 +78,23 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RefreshToken
+
     def validate(self, attrs):
         # Стандартная валидация
         data = super().validate(attrs)
         
         # Добавление пользовательских данных в токен
         data['user'] = UserSerializer(self.user).data
-        
-        return data 
\ No newline at end of file
+
+        # Переносим гостевую корзину (X-Cart-Token) в корзину пользователя
+        request = self.context.get('request')
+        if request is not None:
+            merge_guest_cart(request, self.user)
+
+        return data 
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Проверка черного списка через Redis, Postgres - запасной путь"""
+    token_class = RefreshToken
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import invalidate_cached_user
+from .tokens import blacklist_cache
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    """Любое изменение пользователя (профиль, пароль, is_active) сбрасывает кэш аутентификации"""
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_token_to_blacklist_cache(sender, instance, created, **kwargs):
+    """
+    Любой путь в черный список (blacklist(), админка, прямой create) попадает
+    в Redis, иначе отозванный токен принимался бы до пересборки множества.
+    """
+    if created:
+        token = instance.token
+        transaction.on_commit(lambda: blacklist_cache.add(token.jti, token.expires_at))
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def remove_token_from_blacklist_cache(sender, instance, **kwargs):
+    """Токен вернули из черного списка; истекшие множество чистит само (prune)"""
+    try:
+        token = instance.token
+    except OutstandingToken.DoesNotExist:
+        return
+    if token.expires_at > timezone.now():
+        transaction.on_commit(lambda: blacklist_cache.discard(token.jti))
@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from .tokens import blacklist_cache, prune_expired_tokens
+
+
+@shared_task
+def prune_expired_tokens_task(batch_size=5000):
+    return prune_expired_tokens(batch_size=batch_size)
+
+
+@shared_task
+def rebuild_token_blacklist_cache():
+    return blacklist_cache.rebuild()
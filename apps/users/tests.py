@@ -1,3 +1,134 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from redis.exceptions import RedisError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import authentication
+from .authentication import get_cached_user, get_user_generation
+from .tokens import RefreshToken, blacklist_cache
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def empty_local_user_cache():
+    authentication._local_cache.clear()
+    yield
+    authentication._local_cache.clear()
+
+
+@pytest.fixture
+def user(fake_redis, db):
+    return User.objects.create_user(email='user@example.com', password='secret-pass-1', name='Иван')
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+# Кэш пользователей для JWT-аутентификации
+
+
+def test_cached_user_is_a_copy_on_miss_and_hit(user):
+    first = get_cached_user(user.id)
+    first.name = 'Изменен в запросе'
+
+    second = get_cached_user(user.id)
+
+    assert second is not first
+    assert second.name == 'Иван'
+    assert get_cached_user(user.id) is not second
+
+
+def test_saving_user_bumps_generation(user):
+    generation = get_user_generation(user.id)
+
+    user.name = 'Петр'
+    user.save()
+
+    assert get_user_generation(user.id) != generation
+    assert get_cached_user(user.id).name == 'Петр'
+
+
+def test_next_request_sees_updated_user(user):
+    client = api_client(user)
+    assert client.get(reverse('users:profile')).data['name'] == 'Иван'
+
+    changed = User.objects.get(pk=user.pk)
+    changed.name = 'Петр'
+    changed.save()
+
+    assert client.get(reverse('users:profile')).data['name'] == 'Петр'
+
+
+def test_inactive_user_is_rejected_after_save(user):
+    client = api_client(user)
+    assert client.get(reverse('users:profile')).status_code == 200
+
+    user.is_active = False
+    user.save()
+
+    assert client.get(reverse('users:profile')).status_code == 401
+
+
+def test_unknown_user_is_not_cached(fake_redis, db):
+    assert get_cached_user('00000000-0000-0000-0000-000000000000') is None
+
+
+# Черный список refresh-токенов в Redis
+
+
+@pytest.fixture
+def refresh_token(user):
+    blacklist_cache.rebuild()
+    return RefreshToken.for_user(user)
+
+
+def refresh(token):
+    return APIClient().post(reverse('users:token_refresh'), {'refresh': str(token)}, format='json')
+
+
+def test_token_blacklisted_outside_blacklist_method_is_rejected(refresh_token, django_capture_on_commit_callbacks):
+    outstanding = OutstandingToken.objects.get(jti=refresh_token['jti'])
+    assert blacklist_cache.is_blacklisted(refresh_token['jti']) is False
+
+    # Как из админки или скрипта: без RefreshToken.blacklist()
+    with django_capture_on_commit_callbacks(execute=True):
+        BlacklistedToken.objects.create(token=outstanding)
+
+    assert blacklist_cache.is_blacklisted(refresh_token['jti']) is True
+    assert refresh(refresh_token).status_code == 401
+
+
+def test_blacklist_method_updates_cache(refresh_token, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        refresh_token.blacklist()
+
+    assert blacklist_cache.is_blacklisted(refresh_token['jti']) is True
+
+
+def test_removing_token_from_blacklist_updates_cache(refresh_token, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        refresh_token.blacklist()
+        BlacklistedToken.objects.filter(token__jti=refresh_token['jti']).delete()
+
+    assert blacklist_cache.is_blacklisted(refresh_token['jti']) is False
+    assert refresh(refresh_token).status_code == 200
+
+
+def test_failed_cache_write_falls_back_to_database(refresh_token, monkeypatch):
+    def broken_zadd(*args, **kwargs):
+        raise RedisError('down')
+    monkeypatch.setattr(type(blacklist_cache.redis), 'zadd', broken_zadd)
+
+    blacklist_cache.add(refresh_token['jti'], timezone.now() + timedelta(days=1))
+
+    assert blacklist_cache.is_blacklisted(refresh_token['jti']) is None
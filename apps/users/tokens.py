@@ -0,0 +1,146 @@
+import logging
+import math
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_KEY = 'token_blacklist:jti'
+# Служебный элемент с бесконечным score: его наличие означает, что
+# множество полностью синхронизировано с Postgres
+READY_MEMBER = '__ready__'
+
+
+class BlacklistCache:
+    """
+    Зеркало черного списка refresh-токенов в Redis (sorted set jti -> exp).
+    Если Redis недоступен или множество не прогрето, проверка идет в Postgres.
+    """
+
+    def __init__(self, key=BLACKLIST_KEY):
+        self.key = key
+
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+
+    def is_blacklisted(self, jti):
+        """True/False по данным Redis или None, если нужно спросить Postgres"""
+        try:
+            ready, score = self.redis.zmscore(self.key, [READY_MEMBER, jti])
+        except RedisError:
+            logger.warning('Token blacklist cache is unavailable, falling back to database')
+            return None
+        if ready is None:
+            return None
+        return score is not None
+
+    def add(self, jti, expires_at):
+        try:
+            self.redis.zadd(self.key, {jti: expires_at.timestamp()})
+        except RedisError:
+            logger.warning('Could not add token %s to blacklist cache', jti)
+            self.invalidate()
+
+    def discard(self, jti):
+        try:
+            self.redis.zrem(self.key, jti)
+        except RedisError:
+            logger.warning('Could not remove token %s from blacklist cache', jti)
+            self.invalidate()
+
+    def invalidate(self):
+        """
+        Снимает признак готовности: без него is_blacklisted возвращает None и
+        проверка идет в Postgres до следующей пересборки.
+        """
+        try:
+            self.redis.zrem(self.key, READY_MEMBER)
+        except RedisError:
+            logger.error('Could not invalidate token blacklist cache, it may miss revoked tokens until rebuild')
+
+    def prune(self, now=None):
+        now = now or timezone.now()
+        try:
+            return self.redis.zremrangebyscore(self.key, '-inf', now.timestamp())
+        except RedisError:
+            return 0
+
+    def rebuild(self, batch_size=5000):
+        """Полная синхронизация из Postgres: собираем новое множество и атомарно подменяем"""
+        tmp_key = f'{self.key}:rebuild'
+        redis = self.redis
+        redis.delete(tmp_key)
+        started_at = timezone.now()
+
+        rows = BlacklistedToken.objects.filter(
+            token__expires_at__gt=started_at
+        ).values_list('token__jti', 'token__expires_at').iterator(chunk_size=batch_size)
+
+        count = 0
+        pipe = redis.pipeline(transaction=False)
+        for jti, expires_at in rows:
+            pipe.zadd(tmp_key, {jti: expires_at.timestamp()})
+            count += 1
+            if count % batch_size == 0:
+                pipe.execute()
+        pipe.zadd(tmp_key, {READY_MEMBER: math.inf})
+        pipe.rename(tmp_key, self.key)
+        pipe.execute()
+
+        # Токены, попавшие в черный список во время пересборки
+        for jti, expires_at in BlacklistedToken.objects.filter(
+            blacklisted_at__gte=started_at
+        ).values_list('token__jti', 'token__expires_at'):
+            self.add(jti, expires_at)
+        return count
+
+
+blacklist_cache = BlacklistCache()
+
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh-токен, проверяющий черный список через Redis.
+    Postgres остается источником истины и используется как запасной путь;
+    множество в Redis пополняют сигналы BlacklistedToken (apps.users.signals).
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        blacklisted = blacklist_cache.is_blacklisted(jti)
+        if blacklisted is None:
+            return super().check_blacklist()
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+def prune_expired_tokens(batch_size=5000):
+    """
+    Удаляет истекшие outstanding/blacklisted токены пачками, чтобы не держать
+    длинные блокировки на больших таблицах. Возвращает число удаленных токенов.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(
+                expires_at__lte=now
+            ).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    blacklist_cache.prune(now)
+    return deleted
@@ -1,7 +1,4 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenRefreshView,
-)
 from .views import (
     UserRegistrationView,
     SimpleUserRegistrationView,
@@ -9,6 +6,7 @@ from .views import (
     ChangePasswordView,
     LogoutView,
     CustomTokenObtainPairView,
+    CustomTokenRefreshView,
 )
 
 app_name = 'users'
@@ -16,7 +14,7 @@ app_name = 'users'
 urlpatterns = [
     # Authentication endpoints
     path('login/', CustomTokenObtainPairView.as_view(), name='login'),
-    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('simple-register/', SimpleUserRegistrationView.as_view(), name='simple_register'),
     path('logout/', LogoutView.as_view(), name='logout'),
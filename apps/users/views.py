@@ -2,15 +2,21 @@ from django.shortcuts import render
 from rest_framework import generics, status, views
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import get_user_model
+from core.throttling import (
+    LoginRateThrottle,
+    LoginAccountRateThrottle,
+    RegistrationRateThrottle,
+)
 from .serializers import (
     UserSerializer,
     UserRegistrationSerializer,
     ChangePasswordSerializer,
     CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
 )
+from .tokens import RefreshToken
 
 User = get_user_model()
 
@@ -19,6 +25,7 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = UserRegistrationSerializer
+    throttle_classes = (RegistrationRateThrottle,)
 
 
 class SimpleUserRegistrationView(generics.CreateAPIView):
@@ -26,6 +33,7 @@ class SimpleUserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = UserRegistrationSerializer
+    throttle_classes = (RegistrationRateThrottle,)
     
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
@@ -84,3 +92,9 @@ class LogoutView(views.APIView):
 class CustomTokenObtainPairView(TokenObtainPairView):
     permission_classes = (AllowAny,)
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = (LoginRateThrottle, LoginAccountRateThrottle)
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    permission_classes = (AllowAny,)
+    serializer_class = CustomTokenRefreshSerializer
@@ -0,0 +1,30 @@
+import fakeredis
+import pytest
+from django_redis import get_redis_connection
+
+# Один сервер на процесс: django_redis кэширует пулы соединений по URL
+FAKE_REDIS_SERVER = fakeredis.FakeServer()
+
+
+@pytest.fixture
+def fake_redis(settings):
+    """Кэш и прямые подключения django_redis на fakeredis (со скриптами Lua) вместо сервера Redis"""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://fakeredis:6379/1',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {
+                    'connection_class': fakeredis.FakeRedisConnection,
+                    'server': FAKE_REDIS_SERVER,
+                },
+            },
+        }
+    }
+    FAKE_REDIS_SERVER.connected = True
+    redis = get_redis_connection('default')
+    redis.flushall()
+    yield redis
+    FAKE_REDIS_SERVER.connected = True
+    redis.flushall()
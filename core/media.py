@@ -0,0 +1,50 @@
+"""
+Отдача медиафайлов.
+
+Файлы с адресацией по содержимому (products/blobs/...) никогда не меняются
+по одному и тому же пути, поэтому отдаются с Cache-Control: immutable на год.
+В production байты отдает nginx: представление только проверяет путь,
+выставляет заголовки и возвращает X-Accel-Redirect на internal-location:
+
+    location /protected-media/ {
+        internal;
+        alias /app/media/;
+    }
+
+В DEBUG без MEDIA_ACCEL_REDIRECT_PREFIX файл отдает django.views.static.serve.
+"""
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.views.static import serve
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def media_cache_control(path):
+    if path.startswith(tuple(settings.MEDIA_IMMUTABLE_PREFIXES)):
+        return IMMUTABLE_CACHE_CONTROL
+    return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def serve_media(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+
+    accel_prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        content_type, encoding = mimetypes.guess_type(path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+
+    response['Cache-Control'] = media_cache_control(path)
+    return response
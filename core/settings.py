@@ -1,3 +1,4 @@
+import json
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -107,6 +108,9 @@ CACHES = {
     }
 }
 
+# Время жизни гостевой корзины в Redis (секунды)
+GUEST_CART_TTL = int(os.getenv('GUEST_CART_TTL', 60 * 60 * 24 * 30))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -148,6 +152,65 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Отдача медиа через nginx (X-Accel-Redirect), например '/protected-media/'.
+# Пустое значение - файлы отдает Django, и только в DEBUG
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '')
+# Пути с адресацией по содержимому: кэшируются клиентами навсегда
+MEDIA_IMMUTABLE_PREFIXES = ('products/blobs/',)
+MEDIA_CACHE_MAX_AGE = int(os.getenv('MEDIA_CACHE_MAX_AGE', 60 * 60))
+
+# Пакетная загрузка изображений: лимит файлов на запрос и размер пула потоков
+BULK_IMAGE_UPLOAD_MAX_FILES = int(os.getenv('BULK_IMAGE_UPLOAD_MAX_FILES', 20))
+IMAGE_UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', 4))
+
+# Сборка мусора изображений: свежие загрузки моложе grace-периода не трогаются
+IMAGE_GC_GRACE_HOURS = int(os.getenv('IMAGE_GC_GRACE_HOURS', 24))
+IMAGE_GC_BATCH_SIZE = int(os.getenv('IMAGE_GC_BATCH_SIZE', 1000))
+
+# Импорт товаров из CSV/XLSX: размер пачки и сколько ошибок строк хранить в отчете
+PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', 500))
+PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv('PRODUCT_IMPORT_MAX_ERRORS', 1000))
+
+# Выгрузка каталога: сколько строк серверный курсор отдает за одно обращение
+PRODUCT_EXPORT_CHUNK_SIZE = int(os.getenv('PRODUCT_EXPORT_CHUNK_SIZE', 2000))
+
+# Максимум позиций в одном запросе синхронизации остатков со склада
+STOCK_SYNC_MAX_ITEMS = int(os.getenv('STOCK_SYNC_MAX_ITEMS', 10000))
+
+# Фиды поставщиков (YML/XML): JSON-список [{"name": ..., "url": ..., "sku_field": "vendorCode"}]
+SUPPLIER_FEEDS = json.loads(os.getenv('SUPPLIER_FEEDS', '[]'))
+
+# Публичные адреса: витрина (ссылки на товары) и API (абсолютные URL медиафайлов)
+STOREFRONT_URL = os.getenv('STOREFRONT_URL', 'https://favorit-116.ru')
+SITE_URL = os.getenv('SITE_URL', 'https://api.favorit-116.ru')
+
+# Шаблоны ссылок на страницы витрины ({id} - UUID объекта)
+STOREFRONT_PRODUCT_URL = os.getenv('STOREFRONT_PRODUCT_URL', STOREFRONT_URL.rstrip('/') + '/product/{id}')
+STOREFRONT_CATEGORY_URL = os.getenv('STOREFRONT_CATEGORY_URL', STOREFRONT_URL.rstrip('/') + '/catalog/{id}')
+STOREFRONT_BRAND_URL = os.getenv('STOREFRONT_BRAND_URL', STOREFRONT_URL.rstrip('/') + '/brand/{id}')
+
+# YML-фид для маркетплейсов: файл в MEDIA_ROOT, шаблон ссылки на товар на витрине
+MARKET_FEED_PATH = os.getenv('MARKET_FEED_PATH', 'feeds/market.yml')
+MARKET_FEED_PRODUCT_URL = os.getenv('MARKET_FEED_PRODUCT_URL', STOREFRONT_PRODUCT_URL)
+MARKET_FEED_SHOP_NAME = os.getenv('MARKET_FEED_SHOP_NAME', 'Фаворит')
+MARKET_FEED_COMPANY = os.getenv('MARKET_FEED_COMPANY', 'Фаворит')
+MARKET_FEED_BATCH_SIZE = int(os.getenv('MARKET_FEED_BATCH_SIZE', 1000))
+MARKET_FEED_CACHE_MAX_AGE = int(os.getenv('MARKET_FEED_CACHE_MAX_AGE', 15 * 60))
+
+# Дерево типоразмеров для подбора: сбрасывается при изменении товаров, таймаут - страховка
+SIZE_TREE_CACHE_TIMEOUT = int(os.getenv('SIZE_TREE_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Похожие товары: сколько показывать в каждой карусели и размер пачки записи
+PRODUCT_SIMILARITY_LIMIT = int(os.getenv('PRODUCT_SIMILARITY_LIMIT', 12))
+PRODUCT_SIMILARITY_BATCH_SIZE = int(os.getenv('PRODUCT_SIMILARITY_BATCH_SIZE', 1000))
+
+# Карты сайта: URL на страницу (не больше 50000), время жизни кэша индекса,
+# границ страниц и готовых страниц (страницы кэшируются по подписи содержимого)
+SITEMAP_PAGE_SIZE = int(os.getenv('SITEMAP_PAGE_SIZE', 50000))
+SITEMAP_INDEX_TIMEOUT = int(os.getenv('SITEMAP_INDEX_TIMEOUT', 15 * 60))
+SITEMAP_BOUNDS_TIMEOUT = int(os.getenv('SITEMAP_BOUNDS_TIMEOUT', 60 * 60))
+SITEMAP_PAGE_TIMEOUT = int(os.getenv('SITEMAP_PAGE_TIMEOUT', 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -156,7 +219,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -168,14 +231,21 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
-    # 'DEFAULT_THROTTLE_CLASSES': [
-    #     'rest_framework.throttling.AnonRateThrottle',
-    #     'rest_framework.throttling.UserRateThrottle'
-    # ],
-    # 'DEFAULT_THROTTLE_RATES': {
-    #     'anon': '100/day',
-    #     'user': '1000/day'
-    # }
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.AnonSlidingWindowRateThrottle',
+        'core.throttling.UserSlidingWindowRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '1000/hour',
+        'user': '5000/hour',
+        'catalog_anon': '120/min',
+        'search': '30/min',
+        'login': '10/min',
+        'login_account': '5/min',
+        'register': '5/hour',
+    },
+    # Количество прокси (nginx) перед Django для определения IP по X-Forwarded-For
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
 }
 
 # JWT settings
@@ -191,6 +261,43 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
 }
 
+# Celery
+CELERY_BROKER_URL = os.getenv(
+    'CELERY_BROKER_URL', f"redis://{os.getenv('REDIS_HOST')}:{os.getenv('REDIS_PORT')}/0"
+)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'prune-expired-tokens': {
+        'task': 'apps.users.tasks.prune_expired_tokens_task',
+        'schedule': timedelta(hours=1),
+    },
+    'rebuild-token-blacklist-cache': {
+        'task': 'apps.users.tasks.rebuild_token_blacklist_cache',
+        'schedule': timedelta(hours=24),
+    },
+    'collect-orphan-images': {
+        'task': 'apps.products.tasks.collect_orphan_images',
+        'schedule': timedelta(hours=24),
+    },
+    'sync-supplier-feeds': {
+        'task': 'apps.products.tasks.sync_supplier_feeds',
+        'schedule': timedelta(hours=int(os.getenv('SUPPLIER_FEED_SYNC_HOURS', 4))),
+    },
+    'build-product-similarity': {
+        'task': 'apps.products.tasks.build_product_similarity',
+        'schedule': timedelta(hours=int(os.getenv('PRODUCT_SIMILARITY_BUILD_HOURS', 6))),
+    },
+    'build-market-feed': {
+        'task': 'apps.products.tasks.build_market_feed',
+        'schedule': timedelta(minutes=int(os.getenv('MARKET_FEED_BUILD_MINUTES', 30))),
+    },
+}
+
+# Кэш пользователей для CachedJWTAuthentication (секунды)
+AUTH_USER_LOCAL_CACHE_TTL = int(os.getenv('AUTH_USER_LOCAL_CACHE_TTL', 5))
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 300))
+
 # CORS settings
 # Отключаем CORS в Django, так как он обрабатывается в Nginx
 CORS_ALLOW_ALL_ORIGINS = False
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from fakeredis.commands_mixins import server_mixin
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from conftest import FAKE_REDIS_SERVER
+from core import throttling
+
+
+class TwoPerMinuteThrottle(throttling.AnonSlidingWindowRateThrottle):
+    rate = '2/min'
+
+
+@pytest.fixture
+def clock(fake_redis, monkeypatch):
+    """Время сервера fakeredis (команда TIME в скрипте Lua), которым управляет тест"""
+    # Скрипт регистрируется на клиенте, поэтому каждый тест начинает с нового
+    monkeypatch.setattr(throttling, '_script', None)
+    now = SimpleNamespace(value=1_700_000_000.0)
+    monkeypatch.setattr(server_mixin, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def anon_request(ip='10.0.0.1'):
+    request = Request(APIRequestFactory().get('/', REMOTE_ADDR=ip))
+    request.user = AnonymousUser()
+    return request
+
+
+def allow(throttle_class=TwoPerMinuteThrottle, ip='10.0.0.1'):
+    throttle = throttle_class()
+    return throttle.allow_request(anon_request(ip), None), throttle
+
+
+def test_sliding_window_denies_over_limit_with_retry_after(clock):
+    assert allow()[0]
+    clock.value += 20
+    assert allow()[0]
+    clock.value += 10
+
+    allowed, throttle = allow()
+
+    assert not allowed
+    # Окно освободится, когда первому запросу исполнится минута
+    assert throttle.wait() == 30
+    # Отказ не занимает место в окне: повторная попытка ждет столько же
+    assert allow()[1].wait() == 30
+
+
+def test_sliding_window_frees_slots_as_requests_age_out(clock):
+    assert allow()[0]
+    clock.value += 30
+    assert allow()[0]
+
+    clock.value += 29.999
+    assert not allow()[0]
+    # Ровно через окно первый запрос выпадает, второй еще внутри
+    clock.value += 0.001
+    assert allow()[0]
+    assert not allow()[0]
+
+
+def test_sliding_window_counts_clients_separately(clock):
+    assert allow(ip='10.0.0.1')[0]
+    assert allow(ip='10.0.0.1')[0]
+    assert not allow(ip='10.0.0.1')[0]
+    assert allow(ip='10.0.0.2')[0]
+
+
+def test_sliding_window_allows_requests_when_redis_is_down(clock):
+    assert allow()[0]
+    assert allow()[0]
+
+    FAKE_REDIS_SERVER.connected = False
+
+    assert allow()[0]
+    assert allow()[0]
+
+
+def test_anon_throttle_skips_authenticated_users(clock, django_user_model, db):
+    request = anon_request()
+    request.user = django_user_model(pk=1, email='user@example.com')
+    throttle = TwoPerMinuteThrottle()
+
+    for _ in range(3):
+        assert throttle.allow_request(request, None)
+    assert throttle.key is None
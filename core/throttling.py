@@ -0,0 +1,149 @@
+"""Sliding-window throttles backed by Redis"""
+import logging
+import uuid
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+from rest_framework.throttling import SimpleRateThrottle
+
+logger = logging.getLogger(__name__)
+
+# Одна проверка = один EVALSHA. Время берется с сервера Redis, чтобы
+# у всех воркеров было общее окно независимо от их часов.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return {1, 0}
+end
+
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+local retry = window
+if oldest[2] then
+    retry = tonumber(oldest[2]) + window - now
+end
+return {0, retry}
+"""
+
+_script = None
+
+
+def get_sliding_window_script():
+    global _script
+    if _script is None:
+        _script = get_redis_connection('default').register_script(SLIDING_WINDOW_SCRIPT)
+    return _script
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Базовый throttle со скользящим окном в Redis (sorted set на ключ).
+    При недоступности Redis запрос пропускается, чтобы не ронять API.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        try:
+            allowed, retry_ms = get_sliding_window_script()(
+                keys=[self.key],
+                args=[self.duration * 1000, self.num_requests, uuid.uuid4().hex],
+            )
+        except RedisError:
+            logger.warning('Rate limiter is unavailable, request %s allowed', self.key)
+            return True
+
+        self.retry_after = max(int(retry_ms), 0) / 1000
+        return bool(allowed)
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
+
+    def get_user_or_ip_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class AnonSlidingWindowRateThrottle(SlidingWindowRateThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UserSlidingWindowRateThrottle(SlidingWindowRateThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+class AnonCatalogRateThrottle(AnonSlidingWindowRateThrottle):
+    """Просмотр каталога анонимными клиентами (по IP)"""
+    scope = 'catalog_anon'
+
+
+class SearchRateThrottle(SlidingWindowRateThrottle):
+    """Полнотекстовый поиск по каталогу (?search=), по пользователю или IP"""
+    scope = 'search'
+
+    def get_cache_key(self, request, view):
+        if not request.query_params.get('search'):
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_user_or_ip_ident(request),
+        }
+
+
+class LoginRateThrottle(SlidingWindowRateThrottle):
+    """Попытки входа с одного IP"""
+    scope = 'login'
+
+    def get_cache_key(self, request, view):
+        if request.method != 'POST':
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class LoginAccountRateThrottle(SlidingWindowRateThrottle):
+    """Попытки входа в одну учетную запись с любых IP (защита от перебора паролей)"""
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        if request.method != 'POST':
+            return None
+        email = request.data.get('email')
+        if not email or not isinstance(email, str):
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': email.strip().lower()}
+
+
+class RegistrationRateThrottle(SlidingWindowRateThrottle):
+    """Регистрации с одного IP"""
+    scope = 'register'
+
+    def get_cache_key(self, request, view):
+        if request.method != 'POST':
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
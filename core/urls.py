@@ -1,8 +1,11 @@
 """core URL Configuration"""
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from core.media import serve_media
+from apps.products.views import sitemap_index, sitemap_page
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -30,6 +33,10 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     
+    # Sitemaps for search engines (products, categories, brands)
+    path('sitemap.xml', sitemap_index, name='sitemap-index'),
+    path('sitemap-<str:section>-<int:page>.xml', sitemap_page, name='sitemap-page'),
+
     # Admin API endpoints
     path('products-admin/', include('apps.products.urls_admin')),
     
@@ -41,6 +48,8 @@ urlpatterns = [
     path('wishlist/', include('apps.wishlist.urls')),
 ]
 
-# Serving media files in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) 
\ No newline at end of file
+# Media files: served by Django in development, handed to nginx via X-Accel-Redirect in production
+if settings.DEBUG or settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+    ]